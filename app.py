@@ -4,25 +4,78 @@ Complete DR to Invoice Generation App
 Delivery Request -> Prompt -> Excel -> XML -> Tally -> Invoice
 """
 
-from flask import Flask, render_template, request, send_file, jsonify, session
+from flask import Flask, render_template, request, send_file, jsonify, session, Response
 import os
-import re
-import pdfplumber
-import pandas as pd
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from io import BytesIO, StringIO
 import json
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
+from dr_pdf_to_excel import PDFDocument, try_tables, ocr_pdf, parse_from_text
+from extraction_cache import cached
+from tally_xml import pretty_xml, import_envelope
+from tally_client import TallyClient
+from excel_export import stream_xlsx, XLSX_MIMETYPE
+import ledger
+import metrics
+from upload_buffer import UploadRequest, upload_buffer, take_upload
+from jobs import JobManager, JobQueueFull, SQLiteJobStore
+from session_store import ServerSideSessionInterface, MemorySessionBackend, SQLiteSessionBackend
 
 app = Flask(__name__)
 app.secret_key = 'dr_invoice_app_secret_2025'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = 'uploads'
+# Processes for page-level work: table parsing of large DRs and OCR of scanned ones
+app.config['PAGE_WORKERS'] = int(os.environ.get('PAGE_WORKERS', os.environ.get('OCR_WORKERS', os.cpu_count() or 1)))
+app.config['EXTRACTION_WORKERS'] = int(os.environ.get('EXTRACTION_WORKERS', 2))
+app.config['MAX_PENDING_JOBS'] = int(os.environ.get('MAX_PENDING_JOBS', 50))
+# 'memory' for a single worker process, 'sqlite' when several workers share sessions
+# (and job status, so /jobs/<id> can be polled from any worker)
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'memory')
+app.config['SESSION_DB'] = os.environ.get('SESSION_DB', os.path.join('cache', 'sessions.db'))
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', os.path.join('cache', 'jobs.db'))
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 8 * 3600))
+# Tally's XML-over-HTTP import port and how vouchers are posted to it
+app.config['TALLY_URL'] = os.environ.get('TALLY_URL', 'http://localhost:9000')
+app.config['TALLY_CONCURRENCY'] = int(os.environ.get('TALLY_CONCURRENCY', 4))
+app.config['TALLY_BATCH_SIZE'] = int(os.environ.get('TALLY_BATCH_SIZE', 50))
+app.config['TALLY_RETRIES'] = int(os.environ.get('TALLY_RETRIES', 3))
+app.config['TALLY_TIMEOUT'] = float(os.environ.get('TALLY_TIMEOUT', 60))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Session data stays on the server; the cookie only carries a signed session id
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    os.makedirs(os.path.dirname(app.config['SESSION_DB']) or '.', exist_ok=True)
+    session_backend = SQLiteSessionBackend(app.config['SESSION_DB'])
+else:
+    session_backend = MemorySessionBackend()
+app.session_interface = ServerSideSessionInterface(session_backend, ttl=app.config['SESSION_TTL'])
+
+class DRUploadRequest(UploadRequest):
+    """Uploads stream into hashed in-memory buffers; large ones spill to UPLOAD_FOLDER"""
+    spool_dir = app.config['UPLOAD_FOLDER']
+
+app.request_class = DRUploadRequest
+
+# Background extraction jobs (/jobs/...)
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    os.makedirs(os.path.dirname(app.config['JOBS_DB']) or '.', exist_ok=True)
+    job_store = SQLiteJobStore(app.config['JOBS_DB'])
+else:
+    job_store = None
+jobs = JobManager(max_workers=app.config['EXTRACTION_WORKERS'],
+                  max_pending=app.config['MAX_PENDING_JOBS'],
+                  store=job_store)
+
+# Keep-alive connections to Tally, shared by all requests
+tally_client = TallyClient(app.config['TALLY_URL'],
+                           concurrency=app.config['TALLY_CONCURRENCY'],
+                           batch_size=app.config['TALLY_BATCH_SIZE'],
+                           max_retries=app.config['TALLY_RETRIES'],
+                           timeout=app.config['TALLY_TIMEOUT'])
+
 # Default mappings
 BRANCH_MAPPING = {
     'Madurai': {'code': 'TAFEMDU', 'name': 'TAFE Madurai'},
@@ -37,8 +90,18 @@ CRATE_DETAILS_TEMPLATE = {
     'LID_NOS': '1'
 }
 
-def extract_dr_details(pdf_path):
-    """Extract DR details from PDF"""
+ITEM_FIELDS = ['Order No', 'Part No', 'Part Name', 'Box Type', 'Quantity', 'Unit Size']
+
+# /generate-excel columns written as numbers rather than text
+EXCEL_NUMERIC_COLUMNS = ['Quantity', 'Unit Size', 'No of Pieces', 'No of Packages', 'Total Nos', 'Total Kgs']
+
+@cached('app.extract_dr_details')
+def extract_dr_details(pdf_path, progress=None):
+    """
+    Extract DR details and every line item, across all pages, from a PDF.
+    The top-level item fields mirror the first item; 'Items' holds all of them.
+    progress, if given, is called as progress(pages_done, pages_total, stage).
+    """
     details = {
         'DR No': '',
         'Buyer Order No': '',
@@ -48,55 +111,260 @@ def extract_dr_details(pdf_path):
         'Order No': '',
         'Part No': '',
         'Box Type': '',
-        'Unit Size': ''
+        'Unit Size': '',
+        'Items': []
     }
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            page = pdf.pages[0]
-            tables = page.extract_tables()
-            
-            if not tables:
-                return None
+        with PDFDocument(pdf_path) as doc:
+            if progress:
+                progress(0, len(doc.pages), 'tables')
+            header, items = try_tables(doc, workers=app.config['PAGE_WORKERS'], progress=progress)
             
-            main_table = tables[0]
-            
-            # Extract header info
-            for row in main_table[:7]:
-                row_text = " ".join([str(c) for c in (row or []) if c])
-                
-                m = re.search(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", row_text, re.I)
-                if m:
-                    details['DR No'] = m.group(1).strip()
-                
-                m = re.search(r"Request\s*[:\-]?\s*([A-Za-z\-\s]+(?:Operations|Plant|Pl)[A-Za-z0-9\s\-]*)", row_text, re.I)
-                if m:
-                    details['Branch'] = m.group(1).strip()
-            
-            # Extract table data
-            header_row_idx = -1
-            for i, row in enumerate(main_table):
-                row_text = " ".join([str(c) for c in (row or []) if c]).upper()
-                if "ORDER NO" in row_text and "PART NO" in row_text:
-                    header_row_idx = i
-                    break
-            
-            if header_row_idx >= 0:
-                row = main_table[header_row_idx + 1]
-                if row:
-                    details['Order No'] = str(row[0]).strip() if row[0] else ""
-                    details['Buyer Order No'] = details['Order No']
-                    details['Part No'] = str(row[1]).strip() if row[1] else ""
-                    details['Part Name'] = str(row[2]).strip().replace('\n', ' ') if row[2] else ""
-                    details['Box Type'] = str(row[3]).strip() if row[3] else ""
-                    details['Quantity'] = str(row[4]).strip() if row[4] else ""
-                    details['Unit Size'] = str(row[9]).strip() if len(row) > 9 and row[9] else ""
-        
-        return details
+            if not header and not items:
+                if doc.text(0).strip():
+                    metrics.record_extraction('app', None)
+                    return None
+                return extract_dr_details_ocr(doc, details, progress)
+        
+        metrics.record_extraction('app', 'table')
+        return fill_dr_details(details, header, items)
     
     except Exception as e:
         print(f"PDF extraction error: {e}")
+        metrics.record_extraction('app', None)
+        return None
+
+def extract_dr_details_ocr(pdf_path, details, progress=None):
+    """Scanned DR fallback: OCR all pages on the page pool and parse the text"""
+    header, items = parse_from_text(ocr_pdf(pdf_path, workers=app.config['PAGE_WORKERS'], progress=progress))
+    if not items:
+        metrics.record_extraction('app', None)
         return None
+    metrics.record_extraction('app', 'ocr')
+    return fill_dr_details(details, header, items)
+
+def fill_dr_details(details, header, items):
+    """Copy header fields and items (dr_pdf_to_excel format) into a DR details dict"""
+    details['DR No'] = header.get('DR No', '')
+    details['Branch'] = header.get('Branch', '')
+    details['Items'] = [
+        {
+            'Order No': item.get('Order No', ''),
+            'Part No': item.get('Part No', ''),
+            'Part Name': item.get('Part Name', ''),
+            'Box Type': item.get('Box Type', ''),
+            'Quantity': item.get('Qty', ''),
+            'Unit Size': item.get('Unit Size', '')
+        }
+        for item in items
+    ]
+    if details['Items']:
+        details.update(details['Items'][0])
+        details['Buyer Order No'] = details['Order No']
+    return details
+
+def dr_items(dr_details):
+    """Line items of a DR; details from before multi-item extraction count as one item"""
+    items = dr_details.get('Items')
+    if items:
+        return items
+    return [{field: dr_details.get(field, '') for field in ITEM_FIELDS}]
+
+def total_quantity(items):
+    """Sum of item quantities, or the first quantity if any of them is not a number"""
+    quantities = [str(item.get('Quantity', '')).strip() for item in items]
+    if len(quantities) > 1 and all(q.isdigit() for q in quantities):
+        return str(sum(int(q) for q in quantities))
+    return quantities[0] if quantities else ''
+
+def invoice_items(prompt_data, dr_details):
+    """
+    Line items for the Excel, XML and invoice steps: from the verified prompt
+    data, else from the DR details. A single item takes the prompt quantity.
+    """
+    items = prompt_data.get('items')
+    if not items:
+        items = [
+            {
+                'order_no': item['Order No'],
+                'part_no': item['Part No'],
+                'part_name': item['Part Name'],
+                'box_type': item['Box Type'],
+                'quantity': item['Quantity'],
+                'unit_size': item['Unit Size']
+            }
+            for item in dr_items(dr_details)
+        ]
+    if len(items) == 1:
+        items = [dict(items[0], quantity=prompt_data['quantity'])]
+    return items
+
+def session_job(job_id):
+    """The extraction job with this id, if the current session started it"""
+    job = jobs.get(job_id)
+    if job is None or job.owner != session.sid:
+        return None
+    return job
+
+def remember_dr_details(details):
+    """Keep DR details in the session; only a change rewrites the session"""
+    if session.get('dr_details') != details:
+        session['dr_details'] = details
+
+def get_dr_details():
+    """
+    DR details for the current step: from a finished extraction job when a
+    job_id is passed (query string or JSON body), otherwise from the session.
+    """
+    job_id = request.args.get('job_id') or (request.get_json(silent=True) or {}).get('job_id')
+    if not job_id:
+        return session.get('dr_details')
+    
+    job = session_job(job_id)
+    if not job or job.status != 'done' or not job.result:
+        return None
+    remember_dr_details(job.result)
+    return job.result
+
+def stream_chunks(first, chunks):
+    """
+    first, then the rest of a chunk generator. A generator rather than
+    itertools.chain, so closing the response closes chunks and its cleanup runs.
+    """
+    yield first
+    yield from chunks
+
+def run_extraction_job(job, upload, filename=None):
+    """Background job body: extract DR details from an upload buffer, then release it"""
+    try:
+        details = extract_dr_details(upload, progress=job.progress)
+    finally:
+        upload.close()
+    if not details:
+        raise ValueError('Could not extract DR data from PDF')
+    ledger.record_dr(details, dr_items(details), 'app', filename)
+    return details
+
+def build_prompt_data(dr_details):
+    """Default prompt data (vehicle, kanban, crate and item details) for a DR"""
+    branch = dr_details.get('Branch', '')
+    branch_code = 'TAFEMDU'
+    
+    for branch_name, mapping in BRANCH_MAPPING.items():
+        if branch_name.lower() in branch.lower():
+            branch_code = mapping['code']
+            break
+    
+    items = dr_items(dr_details)
+    quantity = total_quantity(items)
+    
+    prompt_data = {
+        'dr_no': dr_details.get('DR No', ''),
+        'today_date': datetime.now().strftime('%d-%m-%Y'),
+        'buyers_order_number': dr_details.get('Buyer Order No', ''),
+        'quantity': quantity,
+        'vehicle_number': 'TN13AH0050',
+        'kanban': {
+            'no_of_pieces': quantity,
+            'no_of_packages': '1',
+            'total_nos': '20',
+            'total_kgs': ''
+        },
+        'bill_details': {
+            'party_name': branch_code
+        },
+        'crate_details': {
+            'for_crate': f"{CRATE_DETAILS_TEMPLATE['FOR CRATE']} - {CRATE_DETAILS_TEMPLATE['FOR CRATE_NOS']} NOS",
+            'lid': f"{CRATE_DETAILS_TEMPLATE['LID']} - {CRATE_DETAILS_TEMPLATE['LID_NOS']} NOS",
+            'dr_reference': f"DR {dr_details.get('DR No', '')}"
+        },
+        'part_details': {
+            'part_no': dr_details.get('Part No', ''),
+            'part_name': dr_details.get('Part Name', ''),
+            'order_no': dr_details.get('Order No', ''),
+            'box_type': dr_details.get('Box Type', ''),
+            'unit_size': dr_details.get('Unit Size', '')
+        },
+        'items': [
+            {
+                'order_no': item['Order No'],
+                'part_no': item['Part No'],
+                'part_name': item['Part Name'],
+                'box_type': item['Box Type'],
+                'quantity': item['Quantity'],
+                'unit_size': item['Unit Size']
+            }
+            for item in items
+        ]
+    }
+    
+    return prompt_data
+
+def create_envelope():
+    """Tally voucher import envelope; returns (root, message), vouchers are appended to message"""
+    return import_envelope('TAFE Motors')
+
+def build_voucher(prompt_data, dr_details):
+    """One sales VOUCHER element, with an ITEM per line item"""
+    voucher = ET.Element('VOUCHER')
+    ET.SubElement(voucher, 'VOUCHERNUMBER').text = f"INV-{prompt_data['dr_no']}"
+    ET.SubElement(voucher, 'VOUCHERTYPE').text = 'Sales'
+    ET.SubElement(voucher, 'DATE').text = datetime.now().strftime('%d-%m-%Y')
+    ET.SubElement(voucher, 'REFERENCENUMBER').text = f"DR-{prompt_data['dr_no']}"
+    
+    party = ET.SubElement(voucher, 'PARTYDETAILS')
+    ET.SubElement(party, 'PARTYNAME').text = prompt_data['bill_details']['party_name']
+    ET.SubElement(party, 'BUYERORDERNUMBER').text = prompt_data['buyers_order_number']
+    
+    ledgers = ET.SubElement(voucher, 'LEDGERENTRIES')
+    
+    for line in invoice_items(prompt_data, dr_details):
+        item = ET.SubElement(ledgers, 'ITEM')
+        ET.SubElement(item, 'ITEMNAME').text = line['part_name']
+        ET.SubElement(item, 'ITEMNO').text = line['part_no']
+        ET.SubElement(item, 'QUANTITY').text = str(line['quantity'])
+        ET.SubElement(item, 'RATE').text = prompt_data['kanban'].get('total_kgs', '0')
+        ET.SubElement(item, 'AMOUNT').text = '0'
+    
+    additional = ET.SubElement(voucher, 'ADDITIONALDETAILS')
+    ET.SubElement(additional, 'VEHICLENUMBER').text = prompt_data['vehicle_number']
+    ET.SubElement(additional, 'CRATEDETAILS').text = prompt_data['crate_details']['dr_reference']
+    ET.SubElement(additional, 'NOOFPIECES').text = str(prompt_data['kanban']['no_of_pieces'])
+    ET.SubElement(additional, 'NOOFPACKAGES').text = str(prompt_data['kanban']['no_of_packages'])
+    
+    return voucher
+
+def generate_batch_xml(records):
+    """
+    One ENVELOPE with a voucher per record ({'prompt_data', 'dr_details'}).
+    A record that fails, or already carries an 'error', is left out and
+    reported; it does not stop the batch.
+    Returns (root, results) with one {'index', 'dr_no', 'status', 'error'} per record.
+    """
+    root, message = create_envelope()
+    results = []
+    seen = set()
+    
+    for index, record in enumerate(records):
+        dr_no = ''
+        try:
+            if record.get('error'):
+                raise ValueError(record['error'])
+            prompt_data = record['prompt_data']
+            dr_no = prompt_data.get('dr_no', '')
+            if not dr_no:
+                raise ValueError('Missing DR number')
+            if dr_no in seen:
+                raise ValueError(f"Duplicate DR number {dr_no} in batch")
+            message.append(build_voucher(prompt_data, record['dr_details']))
+            seen.add(dr_no)
+            results.append({'index': index, 'dr_no': dr_no, 'status': 'ok', 'error': ''})
+        except Exception as e:
+            error = f"Missing field {e}" if isinstance(e, KeyError) else str(e)
+            results.append({'index': index, 'dr_no': dr_no, 'status': 'error', 'error': error})
+    
+    return root, results
 
 @app.route('/')
 def index():
@@ -115,19 +383,17 @@ def upload_dr():
             return jsonify({'error': 'Please upload a PDF file'}), 400
         
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
-        details = extract_dr_details(filepath)
+        # Read straight from the upload buffer; no save/re-open/delete round-trip
+        with upload_buffer(file, app.config['UPLOAD_FOLDER']) as upload:
+            details = extract_dr_details(upload)
         
         if not details:
-            os.remove(filepath)
             return jsonify({'error': 'Could not extract DR data from PDF'}), 400
         
         session['dr_details'] = details
         session['pdf_filename'] = filename
-        
-        os.remove(filepath)
+        ledger.record_dr(details, dr_items(details), 'app', filename)
         
         return jsonify({
             'success': True,
@@ -137,53 +403,82 @@ def upload_dr():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/upload-dr', methods=['POST'])
+def upload_dr_async():
+    """Upload DR PDF and start extraction in the background; returns a job id at once"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        
+        if not file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'Please upload a PDF file'}), 400
+        
+        session['pdf_filename'] = secure_filename(file.filename)
+        
+        upload = take_upload(file, app.config['UPLOAD_FOLDER'])
+        try:
+            job = jobs.submit('extract_dr_details', run_extraction_job, upload, session['pdf_filename'],
+                              owner=session.sid)
+        except JobQueueFull as e:
+            upload.close()
+            return jsonify({'error': f'Server busy, try again shortly ({e})'}), 503
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/jobs/{job.id}/events'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Job status and per-page progress; includes the DR details once done"""
+    job = session_job(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    if job.status == 'done':
+        remember_dr_details(job.result)
+    
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: one message per progress update until the job finishes"""
+    job = session_job(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    def stream():
+        version = -1
+        while True:
+            current = job.wait_for_change(version)
+            if current != version:
+                version = current
+                yield f"data: {json.dumps(job.to_dict())}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job.done:
+                break
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/generate-prompt', methods=['GET'])
 def generate_prompt():
     """Generate the prompt interface data"""
     try:
-        dr_details = session.get('dr_details', {})
+        dr_details = get_dr_details()
         
         if not dr_details:
             return jsonify({'error': 'No DR details found'}), 400
         
-        branch = dr_details.get('Branch', '')
-        branch_code = 'TAFEMDU'
-        
-        for branch_name, mapping in BRANCH_MAPPING.items():
-            if branch_name.lower() in branch.lower():
-                branch_code = mapping['code']
-                break
-        
-        quantity = dr_details.get('Quantity', '')
-        
-        prompt_data = {
-            'dr_no': dr_details.get('DR No', ''),
-            'today_date': datetime.now().strftime('%d-%m-%Y'),
-            'buyers_order_number': dr_details.get('Buyer Order No', ''),
-            'quantity': quantity,
-            'vehicle_number': 'TN13AH0050',
-            'kanban': {
-                'no_of_pieces': quantity,
-                'no_of_packages': '1',
-                'total_nos': '20',
-                'total_kgs': ''
-            },
-            'bill_details': {
-                'party_name': branch_code
-            },
-            'crate_details': {
-                'for_crate': f"{CRATE_DETAILS_TEMPLATE['FOR CRATE']} - {CRATE_DETAILS_TEMPLATE['FOR CRATE_NOS']} NOS",
-                'lid': f"{CRATE_DETAILS_TEMPLATE['LID']} - {CRATE_DETAILS_TEMPLATE['LID_NOS']} NOS",
-                'dr_reference': f"DR {dr_details.get('DR No', '')}"
-            },
-            'part_details': {
-                'part_no': dr_details.get('Part No', ''),
-                'part_name': dr_details.get('Part Name', ''),
-                'order_no': dr_details.get('Order No', ''),
-                'box_type': dr_details.get('Box Type', ''),
-                'unit_size': dr_details.get('Unit Size', '')
-            }
-        }
+        prompt_data = build_prompt_data(dr_details)
         
         session['prompt_data'] = prompt_data
         
@@ -219,44 +514,49 @@ def generate_excel():
     """Generate Excel from verified prompt data"""
     try:
         prompt_data = session.get('prompt_data')
-        dr_details = session.get('dr_details')
+        dr_details = get_dr_details()
         
         if not prompt_data or not dr_details:
             return jsonify({'error': 'No data found'}), 400
         
+        # One row per line item; shipment-level columns repeat on every row
+        items = invoice_items(prompt_data, dr_details)
+        n = len(items)
         data = {
-            'DR No': [prompt_data['dr_no']],
-            'Date': [prompt_data['today_date']],
-            'Buyers Order Number': [prompt_data['buyers_order_number']],
-            'Quantity': [prompt_data['quantity']],
-            'Vehicle Number': [prompt_data['vehicle_number']],
-            'Party Name': [prompt_data['bill_details']['party_name']],
-            'Part No': [dr_details.get('Part No', '')],
-            'Part Name': [dr_details.get('Part Name', '')],
-            'Order No': [dr_details.get('Order No', '')],
-            'Box Type': [dr_details.get('Box Type', '')],
-            'Unit Size': [dr_details.get('Unit Size', '')],
-            'No of Pieces': [prompt_data['kanban']['no_of_pieces']],
-            'No of Packages': [prompt_data['kanban']['no_of_packages']],
-            'Total Nos': [prompt_data['kanban']['total_nos']],
-            'Total Kgs': [prompt_data['kanban']['total_kgs']],
-            'Crate Details': [f"{prompt_data['crate_details']['for_crate']}; {prompt_data['crate_details']['lid']}"]
+            'DR No': [prompt_data['dr_no']] * n,
+            'Date': [prompt_data['today_date']] * n,
+            'Buyers Order Number': [prompt_data['buyers_order_number']] * n,
+            'Quantity': [item['quantity'] for item in items],
+            'Vehicle Number': [prompt_data['vehicle_number']] * n,
+            'Party Name': [prompt_data['bill_details']['party_name']] * n,
+            'Part No': [item['part_no'] for item in items],
+            'Part Name': [item['part_name'] for item in items],
+            'Order No': [item['order_no'] for item in items],
+            'Box Type': [item['box_type'] for item in items],
+            'Unit Size': [item['unit_size'] for item in items],
+            'No of Pieces': [prompt_data['kanban']['no_of_pieces']] * n,
+            'No of Packages': [prompt_data['kanban']['no_of_packages']] * n,
+            'Total Nos': [prompt_data['kanban']['total_nos']] * n,
+            'Total Kgs': [prompt_data['kanban']['total_kgs']] * n,
+            'Crate Details': [f"{prompt_data['crate_details']['for_crate']}; {prompt_data['crate_details']['lid']}"] * n
         }
         
-        df = pd.DataFrame(data)
-        
-        output = BytesIO()
-        df.to_excel(output, index=False, sheet_name='DR Invoice', engine='openpyxl')
-        output.seek(0)
-        
         session['excel_data'] = data
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f"DR_{prompt_data['dr_no']}_Invoice.xlsx"
+        # Rows go straight into a write-only workbook that is streamed back in chunks
+        columns = list(data)
+        rows = (dict(zip(columns, values)) for values in zip(*data.values()))
+        chunks = stream_xlsx([('DR Invoice', columns, rows, EXCEL_NUMERIC_COLUMNS)], tmp_dir=app.config['UPLOAD_FOLDER'])
+        first = next(chunks)  # build the workbook now, so errors still get a JSON reply
+        
+        response = Response(
+            stream_chunks(first, chunks),
+            mimetype=XLSX_MIMETYPE,
+            headers={'Content-Disposition': f"attachment; filename=DR_{prompt_data['dr_no']}_Invoice.xlsx"}
         )
+        # Also when the client goes away before the body is started
+        response.call_on_close(chunks.close)
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -266,45 +566,17 @@ def generate_xml():
     """Generate Tally XML from prompt data"""
     try:
         prompt_data = session.get('prompt_data')
-        dr_details = session.get('dr_details')
+        dr_details = get_dr_details()
         
         if not prompt_data or not dr_details:
             return jsonify({'error': 'No data found'}), 400
         
-        root = ET.Element('ENVELOPE')
-        root.set('xmlns:UDF', 'TallyUDF')
-        
-        company = ET.SubElement(root, 'COMPANY')
-        ET.SubElement(company, 'NAME').text = 'TAFE Motors'
-        ET.SubElement(company, 'MNAME').text = 'TAFE Motors'
-        
-        voucher = ET.SubElement(root, 'VOUCHER')
-        ET.SubElement(voucher, 'VOUCHERNUMBER').text = f"INV-{prompt_data['dr_no']}"
-        ET.SubElement(voucher, 'VOUCHERTYPE').text = 'Sales'
-        ET.SubElement(voucher, 'DATE').text = datetime.now().strftime('%d-%m-%Y')
-        ET.SubElement(voucher, 'REFERENCENUMBER').text = f"DR-{prompt_data['dr_no']}"
-        
-        party = ET.SubElement(voucher, 'PARTYDETAILS')
-        ET.SubElement(party, 'PARTYNAME').text = prompt_data['bill_details']['party_name']
-        ET.SubElement(party, 'BUYERORDERNUMBER').text = prompt_data['buyers_order_number']
-        
-        ledgers = ET.SubElement(voucher, 'LEDGERENTRIES')
-        
-        item = ET.SubElement(ledgers, 'ITEM')
-        ET.SubElement(item, 'ITEMNAME').text = dr_details.get('Part Name', '')
-        ET.SubElement(item, 'ITEMNO').text = dr_details.get('Part No', '')
-        ET.SubElement(item, 'QUANTITY').text = str(prompt_data['quantity'])
-        ET.SubElement(item, 'RATE').text = prompt_data['kanban'].get('total_kgs', '0')
-        ET.SubElement(item, 'AMOUNT').text = '0'
-        
-        additional = ET.SubElement(voucher, 'ADDITIONALDETAILS')
-        ET.SubElement(additional, 'VEHICLENUMBER').text = prompt_data['vehicle_number']
-        ET.SubElement(additional, 'CRATEDETAILS').text = prompt_data['crate_details']['dr_reference']
-        ET.SubElement(additional, 'NOOFPIECES').text = str(prompt_data['kanban']['no_of_pieces'])
-        ET.SubElement(additional, 'NOOFPACKAGES').text = str(prompt_data['kanban']['no_of_packages'])
-        
-        xml_string = minidom.parseString(ET.tostring(root)).toprettyxml(indent='  ')
-        xml_string = '\n'.join([line for line in xml_string.split('\n') if line.strip()])
+        with metrics.stage('xml_build'):
+            root, message = create_envelope()
+            voucher = build_voucher(prompt_data, dr_details)
+            message.append(voucher)
+            xml_string = pretty_xml(root)
+        ledger.record_vouchers([voucher], 'app')
         
         session['xml_data'] = xml_string
         
@@ -320,6 +592,80 @@ def generate_xml():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/generate-batch-xml', methods=['POST'])
+def generate_batch_xml_route():
+    """
+    Generate one Tally XML envelope with a voucher per DR.
+    Body: {"records": [{"job_id": "..."} or {"dr_details": {...}}, ...]}
+    Each record may carry its own "prompt_data"; otherwise the defaults are used.
+    Bad records are skipped and reported per voucher; the rest are still generated.
+    """
+    try:
+        records = (request.get_json(silent=True) or {}).get('records') or []
+        
+        if not records:
+            return jsonify({'error': 'No records provided'}), 400
+        
+        # Resolve DR details from finished extraction jobs; unresolved records fail in the batch
+        resolved = []
+        for record in records:
+            record = record or {}
+            dr_details = record.get('dr_details')
+            if not dr_details and record.get('job_id'):
+                job = session_job(record['job_id'])
+                dr_details = job.result if job and job.status == 'done' else None
+            if not dr_details:
+                resolved.append({'error': 'No DR details (unknown or unfinished job?)'})
+                continue
+            resolved.append({
+                'dr_details': dr_details,
+                'prompt_data': record.get('prompt_data') or build_prompt_data(dr_details)
+            })
+        
+        with metrics.stage('xml_build'):
+            root, results = generate_batch_xml(resolved)
+            xml_data = pretty_xml(root)
+        for result, record in zip(results, records):
+            if (record or {}).get('job_id'):
+                result['job_id'] = record['job_id']
+        
+        created = sum(1 for r in results if r['status'] == 'ok')
+        errors = [r for r in results if r['status'] != 'ok']
+        
+        if not created:
+            return jsonify({'error': 'No valid vouchers in batch', 'errors': errors}), 400
+        
+        session['xml_data'] = xml_data
+        ledger.record_vouchers(root.iter('VOUCHER'), 'app')
+        
+        return jsonify({
+            'success': True,
+            'download_url': '/download-xml',
+            'total': len(results),
+            'created': created,
+            'failed': len(errors),
+            'results': results,
+            'errors': errors
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/download-xml', methods=['GET'])
+def download_xml():
+    """Download the last generated XML (single or batch) from the session"""
+    xml_data = session.get('xml_data')
+    
+    if not xml_data:
+        return jsonify({'error': 'No XML generated'}), 400
+    
+    return send_file(
+        BytesIO(xml_data.encode('utf-8')),
+        mimetype='application/xml',
+        as_attachment=True,
+        download_name='Tally_Batch.xml'
+    )
+
 @app.route('/generate-invoice', methods=['POST'])
 def generate_invoice():
     """Generate final invoice"""
@@ -343,6 +689,7 @@ def generate_invoice():
             'unit_size': dr_details.get('Unit Size', ''),
             'box_type': dr_details.get('Box Type', ''),
             'crate_details': prompt_data['crate_details']['dr_reference'],
+            'items': invoice_items(prompt_data, dr_details),
             'status': 'Generated'
         }
         
@@ -359,28 +706,61 @@ def generate_invoice():
 
 @app.route('/upload-to-tally', methods=['POST'])
 def upload_to_tally():
-    """Upload XML to Tally (placeholder for actual Tally integration)"""
+    """Post the generated XML in the session (single or batch) to Tally's import port"""
     try:
         xml_data = session.get('xml_data')
-        invoice_data = session.get('invoice_data')
         
-        if not xml_data or not invoice_data:
-            return jsonify({'error': 'No data to upload'}), 400
+        if not xml_data:
+            return jsonify({'error': 'No XML generated'}), 400
+        
+        voucher_numbers = [v.findtext('VOUCHERNUMBER') or '' for v in ET.fromstring(xml_data).iter('VOUCHER')]
+        if not voucher_numbers:
+            return jsonify({'error': 'The generated XML has no vouchers'}), 400
+        
+        report = tally_client.upload_xml(xml_data)
+        
+        if report['success']:
+            tally_status = 'Imported'
+        elif report['created']:
+            tally_status = 'Partially imported'
+        else:
+            tally_status = 'Failed'
         
         return jsonify({
-            'success': True,
-            'message': 'XML prepared for Tally upload',
-            'invoice_number': invoice_data['invoice_number'],
-            'tally_status': 'Ready for import',
+            'success': report['success'],
+            'message': f"Tally created {report['created']} of {report['vouchers']} vouchers",
+            'voucher_numbers': voucher_numbers,
+            'tally_status': tally_status,
+            'report': report,
             'xml_preview': xml_data[:500] + '...' if len(xml_data) > 500 else xml_data
-        })
+        }), 200 if report['success'] else 502
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ledger/<kind>', methods=['GET'])
+def ledger_query(kind):
+    """
+    Query the DR ledger: kind is drs, items or vouchers.
+    Filters: part_no, dr_no, order_no, month (YYYY-MM or 'this'), from, to, limit
+    """
+    try:
+        rows = ledger.query(kind, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'success': True, 'count': len(rows), kind: rows})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage timings and counters in the Prometheus text format (metrics.py)"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'})
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    # The debugger runs arbitrary code from the browser; only with FLASK_DEBUG=1
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='127.0.0.1', port=5000)
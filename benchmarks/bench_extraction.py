@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+bench_extraction.py
+Stage benchmarks for DR extraction and invoice XML, on synthetic DRs
+(synthetic_dr.py), with stored baselines and regression flags.
+
+Usage:
+  python benchmarks/bench_extraction.py [--pages 5] [--items 60] [--repeat 3]
+  python benchmarks/bench_extraction.py --save-baseline      # record this machine's numbers
+  python benchmarks/bench_extraction.py --threshold 0.25     # flag >25% slower / bigger
+
+Stages:
+  try_tables     table extraction of the text PDF (after one warm-up run,
+                 so the layout template is learned as in steady state)
+  parse_from_text  text parser on the PDF's text layer
+  ocr_pdf        OCR of the scanned variant (skipped without tesseract)
+  generate_xml   TallyInvoiceGenerator.generate_xml for the extracted items
+
+For each stage the median time per call of --repeat runs is reported per
+page and per item, then the stage runs once more under tracemalloc for its peak
+memory (Python allocations only; tesseract's own memory is not seen).
+The extraction cache is off and layout templates go to a temporary
+directory, so runs do not touch the app's cache.
+
+Baselines are kept in benchmarks/baselines.json per stage and corpus size.
+A stage whose time per page or peak memory exceeds its baseline by more
+than the threshold is flagged, and the exit status is 1.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+os.environ['DR_CACHE_DISABLED'] = '1'
+os.environ['LEDGER_DISABLED'] = '1'
+os.environ['DR_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench_cache_')
+atexit.register(shutil.rmtree, os.environ['DR_CACHE_DIR'], True)
+
+import pdfplumber
+import pytesseract
+
+from synthetic_dr import generate, make_scanned
+from dr_pdf_to_excel import try_tables, text_from_pdf, parse_from_text, ocr_pdf
+from tally_invoice import TallyInvoiceGenerator
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+MIN_RUN_SECONDS = 0.05
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def measure(func, repeat):
+    """
+    (median seconds per call over repeat runs, peak traced MiB of one more call).
+    Each run calls func for at least MIN_RUN_SECONDS, so fast stages are not lost in timer noise.
+    """
+    times = []
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_RUN_SECONDS:
+                break
+        times.append(elapsed / calls)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak / (1024 * 1024)
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baselines(baselines):
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DR extraction stages on synthetic DRs")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="regression threshold as a fraction (default: 0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the baselines for this corpus size")
+    parser.add_argument("--no-ocr", action="store_true", help="skip the OCR stage")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_dr_')
+    atexit.register(shutil.rmtree, workdir, True)
+    pdf_path = os.path.join(workdir, 'synthetic.pdf')
+    header, expected = generate(pdf_path, args.pages, args.items, args.seed)
+
+    # Correctness first: a fast extractor that loses items is not an improvement
+    _, rows = try_tables(pdf_path)
+    got = [(r['Order No'], r['Part No'], r['Part Name'], r['Qty']) for r in rows]
+    want = [(i['Order No'], i['Part No'], i['Part Name'], i['Qty']) for i in expected]
+    if got != want:
+        print(f"ERROR: try_tables returned {len(got)} items, expected {len(want)} (or items differ)")
+        sys.exit(1)
+
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = len(pdf.pages)
+    text = text_from_pdf(pdf_path)
+    dr_data = dict(rows[0], **{'DR No': header['DR No'], 'Branch': header['Branch'], 'Items': [
+        dict(r, Quantity=r['Qty']) for r in rows
+    ]})
+
+    stages = [
+        ('try_tables', lambda: try_tables(pdf_path)),
+        ('parse_from_text', lambda: parse_from_text(text)),
+        ('generate_xml', lambda: TallyInvoiceGenerator.generate_xml(dr_data, {})),
+    ]
+    if args.no_ocr:
+        print("ocr_pdf: skipped (--no-ocr)")
+    elif not tesseract_available():
+        print("ocr_pdf: skipped (tesseract is not installed)")
+    else:
+        scanned_path = os.path.join(workdir, 'synthetic_scanned.pdf')
+        make_scanned(pdf_path, scanned_path, seed=args.seed)
+        stages.insert(2, ('ocr_pdf', lambda: ocr_pdf(scanned_path)))
+
+    try_tables(pdf_path)  # warm-up: learn the layout template
+
+    corpus = f"{pages}p_{len(rows)}i"
+    baselines = load_baselines()
+    regressions = []
+
+    print(f"Corpus: {pages} pages, {len(rows)} items (seed {args.seed}); median of {args.repeat} runs")
+    print(f"{'stage':16s} {'total s':>9s} {'ms/page':>9s} {'ms/item':>9s} {'peak MiB':>9s}  vs baseline")
+    for name, func in stages:
+        seconds, peak = measure(func, args.repeat)
+        result = {
+            'seconds': round(seconds, 6),
+            'ms_per_page': round(seconds * 1000 / pages, 4),
+            'ms_per_item': round(seconds * 1000 / len(rows), 4),
+            'peak_mib': round(peak, 3),
+        }
+
+        key = f"{name}@{corpus}"
+        base = baselines.get(key)
+        if base:
+            time_ratio = result['ms_per_page'] / base['ms_per_page'] if base['ms_per_page'] else 1.0
+            mem_ratio = result['peak_mib'] / base['peak_mib'] if base['peak_mib'] else 1.0
+            flags = []
+            if time_ratio > 1 + args.threshold:
+                flags.append("TIME")
+            if mem_ratio > 1 + args.threshold:
+                flags.append("MEMORY")
+            verdict = f"time x{time_ratio:.2f}, mem x{mem_ratio:.2f}"
+            if flags:
+                verdict += f"  REGRESSION ({', '.join(flags)})"
+                regressions.append(name)
+        else:
+            verdict = "no baseline"
+
+        print(f"{name:16s} {seconds:9.4f} {result['ms_per_page']:9.2f} {result['ms_per_item']:9.3f} "
+              f"{peak:9.2f}  {verdict}")
+        if args.save_baseline:
+            baselines[key] = result
+
+    if args.save_baseline:
+        save_baselines(baselines)
+        print(f"Baselines saved to {BASELINE_PATH}")
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
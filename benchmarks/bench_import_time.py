@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+bench_import_time.py
+Startup cost of the CLI and both apps with lazy imports, against the same
+code with the heavy modules preloaded the way the old module headers did.
+
+Usage:
+  python benchmarks/bench_import_time.py [--repeat 5]
+
+Every measurement runs in a fresh interpreter (median of --repeat runs):
+  import <module>      time to import dr_pdf_to_excel, app, tally_invoice_app
+  cli run              dr_pdf_to_excel.py on a one-page synthetic DR, end to end
+Each is also run "eager", with pandas, numpy, OpenCV, pytesseract, PIL,
+openpyxl and minidom imported first. The heavy modules the lazy import
+still loaded are listed for each entry point.
+"""
+
+import os
+import sys
+import json
+import atexit
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_dr import generate
+
+HEAVY_MODULES = ['pandas', 'numpy', 'cv2', 'pytesseract', 'PIL.Image', 'openpyxl', 'xml.dom.minidom']
+EAGER = 'import ' + ', '.join(HEAVY_MODULES) + '\n'
+
+# Run in the child: time the body, report seconds and the heavy modules loaded
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{preload}{body}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def run_child(body, eager, env):
+    code = PROBE.format(preload=EAGER if eager else '', body=body, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(body, eager, env, repeat):
+    runs = [run_child(body, eager, env) for _ in range(repeat)]
+    return statistics.median(seconds for seconds, _ in runs), runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time of the CLI and apps")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_import_')
+    atexit.register(shutil.rmtree, workdir, True)
+    pdf_path = os.path.join(workdir, 'synthetic.pdf')
+    generate(pdf_path, 1, 8, 1)
+
+    env = dict(os.environ, DR_CACHE_DISABLED='1', LEDGER_DISABLED='1', PYTHONDONTWRITEBYTECODE='1')
+    cli = ("import runpy, io, contextlib\n"
+           f"sys.argv = ['dr_pdf_to_excel.py', {pdf_path!r}, {os.path.join(workdir, 'out.xlsx')!r}]\n"
+           "with contextlib.redirect_stdout(io.StringIO()):\n"
+           "    runpy.run_path('dr_pdf_to_excel.py', run_name='__main__')")
+    cases = [
+        ('import dr_pdf_to_excel', 'import dr_pdf_to_excel'),
+        ('import app', 'import app'),
+        ('import tally_invoice_app', 'import tally_invoice_app'),
+        ('cli run (1 page)', cli),
+    ]
+
+    # Warm the OS file cache so the first case is not penalised
+    run_child('import app, tally_invoice_app', True, env)
+
+    print(f"Median of {args.repeat} fresh interpreters")
+    print(f"{'case':26s} {'lazy s':>8s} {'eager s':>8s} {'saved':>7s}  heavy modules loaded (lazy)")
+    for label, body in cases:
+        lazy, loaded = measure(body, False, env, args.repeat)
+        eager, _ = measure(body, True, env, args.repeat)
+        print(f"{label:26s} {lazy:8.3f} {eager:8.3f} {eager - lazy:7.3f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+bench_parse_from_text.py
+Benchmark dr_pdf_to_excel.parse_from_text against the previous per-line regex version.
+
+Usage:
+  python benchmarks/bench_parse_from_text.py [--pages 200] [--rows 30] [--repeat 5]
+
+Builds multi-page OCR-style DR text (header block, item rows with wrapped
+part names, notes and dotted separators per page), checks that both
+parsers return identical header and items, then reports the timings.
+The extraction cache is bypassed so only parsing is measured.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dr_pdf_to_excel import parse_from_text
+
+PART_NAMES = [
+    "ASSY.BREATHER PIPE RH", "ASSY. SUCTION PIPE - STEERING PUMP", "BRACKET LH",
+    "HOSE CLAMP 40/60", "PIPE ASSY (RETURN)", "COVER & GASKET KIT", "SHAFT-PTO",
+]
+BOX_TYPES = ["PP BOX", "CHEP BOX", "BOX", "BIN", "WOOD BOX"]
+
+
+def parse_from_text_reference(full_text):
+    """parse_from_text as it was before the single-pass rewrite"""
+    header = {}
+    items = []
+
+    text = full_text.replace('\r','\n')
+
+    m = re.search(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", text, re.I)
+    if m:
+        header['DR No'] = m.group(1).strip()
+
+    m = re.search(r"Request\s*[:\-]?\s*([A-Za-z\-\s]+(?:Operations|Plant|Pl)[A-Za-z0-9\s\-]*)", text, re.I)
+    if m:
+        header['Branch'] = m.group(1).strip()
+    else:
+        header['Branch'] = ""
+
+    lines = text.splitlines()
+
+    table_start_idx = -1
+    for i, ln in enumerate(lines):
+        if re.search(r"Order\s*No|Part\s*No", ln, re.I):
+            table_start_idx = i
+            break
+
+    if table_start_idx >= 0:
+        for ln in lines[table_start_idx+1:]:
+            ln = ln.strip()
+            if not ln or len(ln) < 5:
+                continue
+
+            if any(skip in ln.lower() for skip in ['note:', 'delivery', 'request', 'bin', 'unit', 'supplier', 'shipping', 'departure']):
+                continue
+            if re.search(r'^\.+$', ln):
+                continue
+
+            order_match = re.search(r'\b(\d{10})\b', ln)
+            part_match = re.search(r'\b([A-Z0-9]{4,20}M\d{1,3})\b', ln)
+
+            if order_match and part_match:
+                order_no = order_match.group(1)
+                part_no = part_match.group(1)
+
+                part_name_match = re.search(part_no + r'\s+([A-Z0-9\.\s\-/&()]+?)\s+(PP BOX|CHEP BOX|BOX|BIN|[A-Z]+\s+BOX)', ln, re.I)
+                part_name = part_name_match.group(1).strip().replace('\n', ' ') if part_name_match else ""
+
+                box_match = re.search(r'(PP BOX|CHEP BOX|BOX|BIN|[A-Z]+\s+BOX)', ln, re.I)
+                box_type = box_match.group(1).strip() if box_match else ""
+
+                numbers = re.findall(r'\b(\d+)\b', ln)
+
+                qty = ""
+                unit_size = ""
+                kanban = ""
+
+                if len(numbers) >= 5:
+                    qty = numbers[2] if len(numbers) > 2 else ""
+                    unit_size = numbers[-2] if len(numbers) >= 2 else ""
+                    kanban = numbers[-1] if len(numbers) >= 1 else ""
+
+                items.append({
+                    "Order No": order_no,
+                    "Part No": part_no,
+                    "Part Name": part_name,
+                    "Box Type": box_type,
+                    "Qty": qty,
+                    "Unit Size": unit_size,
+                    "Kanban": kanban
+                })
+
+    if not items:
+        pattern = re.compile(r"(\d{10})\s+([A-Z0-9\-]{5,20})\s+([A-Z0-9\.\- /&()]+?)\s+(PP BOX|CHEP BOX|BOX|BIN)\s+(\d+)", re.I)
+        for m in pattern.finditer(text):
+            items.append({
+                "Order No": m.group(1).strip(),
+                "Part No": m.group(2).strip(),
+                "Part Name": m.group(3).strip().replace('\n', ' '),
+                "Box Type": m.group(4).strip(),
+                "Qty": m.group(5).strip(),
+                "Unit Size": "",
+                "Kanban": ""
+            })
+
+    header.setdefault('Buyer Order No', items[0].get('Order No', '') if items else '')
+    header.setdefault('Vehicle No', '')
+    header.setdefault('Crate Details', '')
+
+    return header, items
+
+
+def make_text(pages, rows, rng):
+    """OCR-style text for a DR with the given pages and item rows per page"""
+    out = []
+    for page in range(pages):
+        out.append("05/11/2025 21:45 Login By: DS1615 REPRINT")
+        out.append("Delivery Request")
+        out.append("Supplier : Sri Durga Engg Works - DS1615 Request : Madurai Operations- K Patti Pl - 1000")
+        out.append("Shipping Point : Sri Durga Engg Works - DS1615 Receiving Point : Madurai Operations - 1000")
+        out.append("Delivery Request No. : 11559032 Supply chain :")
+        out.append("Order No. Part No. Part Name Remark Qty")
+        out.append("Bin / Box (Unit) (Unit) (Unit) Size")
+        for _ in range(rows):
+            order_no = str(rng.randint(1000000000, 9999999999))
+            part_no = f"{rng.randint(1000000, 9999999)}M{rng.randint(1, 999)}"
+            name = rng.choice(PART_NAMES)
+            box = rng.choice(BOX_TYPES)
+            qty = rng.randint(1, 50)
+            out.append(f"{order_no} {part_no} {name} {box} {qty} {qty} 0 {rng.choice([10, 25])} {qty}")
+            if rng.random() < 0.3:
+                out.append("STEERING PUMP")
+            if rng.random() < 0.1:
+                out.append(f"{order_no} {part_no.lower()} smudged ocr row")
+        out.append("Note:")
+        out.append("1. Delivery to be by Ns of Bin / Box")
+        out.append("." * 120)
+    return "\n".join(out)
+
+
+def best_of(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse_from_text")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    text = make_text(args.pages, args.rows, rng)
+    fast = parse_from_text.__wrapped__
+
+    if fast(text) != parse_from_text_reference(text):
+        print("ERROR: parse_from_text output differs from the reference implementation")
+        sys.exit(1)
+    # The fallback path (no item rows matched line by line) must agree too
+    legacy = text.replace("M", "X")
+    if fast(legacy) != parse_from_text_reference(legacy):
+        print("ERROR: fallback output differs from the reference implementation")
+        sys.exit(1)
+
+    items = len(fast(text)[1])
+    old = best_of(parse_from_text_reference, text, args.repeat)
+    new = best_of(fast, text, args.repeat)
+
+    print(f"Text: {args.pages} pages, {len(text.splitlines())} lines, {items} items")
+    print(f"reference : {old * 1000:8.1f} ms")
+    print(f"single-pass: {new * 1000:8.1f} ms")
+    print(f"speedup   : {old / new:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
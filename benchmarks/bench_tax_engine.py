@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+bench_tax_engine.py
+Benchmark the columnar tax computation (tax_engine.py) against the
+per-line float loop build_voucher used before it.
+
+Usage:
+  python benchmarks/bench_tax_engine.py [--lines 100000] [--items 3]
+
+Both compute taxable value, CGST/SGST or IGST and the per-voucher totals
+for the same synthetic lines. The loop rounds binary floats the way the
+XML used to; the engine rounds decimal-exact in paise, so the report also
+counts the lines where the two disagree (by a paisa or two).
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tax_engine import compute_taxes, format_paise
+
+RATES = [2003.30, 145.5, 87.25, 1299.99, 12.05, 560.0]
+GST_RATES = [5, 12, 18, 28]
+
+
+def make_lines(n_lines, items, rng):
+    quantities = [rng.randint(1, 500) for _ in range(n_lines)]
+    rates = [rng.choice(RATES) for _ in range(n_lines)]
+    gst_rates = [rng.choice(GST_RATES) for _ in range(n_lines)]
+    voucher_ids = [i // items for i in range(n_lines)]
+    intra_by_voucher = [rng.random() < 0.5 for _ in range(voucher_ids[-1] + 1)]
+    intra = [intra_by_voucher[v] for v in voucher_ids]
+    return quantities, rates, gst_rates, intra, voucher_ids
+
+
+def float_loop(quantities, rates, gst_rates, intra, voucher_ids):
+    """The old per-line arithmetic, formatted as it was"""
+    line_tax = []
+    totals = {}
+    for qty, rate, gst, is_intra, v in zip(quantities, rates, gst_rates, intra, voucher_ids):
+        taxable = float(qty) * rate
+        gst_amount = taxable * gst / 100
+        if is_intra:
+            gst_amount = gst_amount / 2 + gst_amount / 2
+        line_tax.append(str(round(gst_amount, 2)))
+        total = totals.setdefault(v, [0.0, 0.0])
+        total[0] += taxable
+        total[1] += gst_amount
+    return line_tax, {v: (str(round(t, 2)), str(round(g, 2))) for v, (t, g) in totals.items()}
+
+
+def vectorized(quantities, rates, gst_rates, intra, voucher_ids):
+    batch = compute_taxes(quantities, rates, gst_rates, intra, voucher_ids)
+    line_tax = [format_paise(t) for t in batch.tax.tolist()]
+    totals = [(format_paise(t), format_paise(g))
+              for t, g in zip(batch.voucher_taxable.tolist(), batch.voucher_tax.tolist())]
+    return batch, line_tax, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar tax engine")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--items", type=int, default=3, help="Lines per voucher")
+    args = parser.parse_args()
+
+    columns = make_lines(args.lines, args.items, random.Random(42))
+    # Warm up NumPy's lazily initialised paths outside the timing
+    vectorized(*make_lines(100, args.items, random.Random(0)))
+
+    start = time.perf_counter()
+    float_loop(*columns)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch, _, _ = vectorized(*columns)
+    engine_time = time.perf_counter() - start
+
+    quantities, rates, gst_rates, intra, _ = columns
+    differ = sum(
+        1 for qty, rate, gst, tax in zip(quantities, rates, gst_rates, batch.tax)
+        if round(float(qty) * rate * gst / 100, 2) != int(tax) / 100
+    )
+
+    print(f"Lines: {args.lines} ({args.items} per voucher)")
+    print(f"float loop          : {loop_time:7.3f} s")
+    print(f"tax engine          : {engine_time:7.3f} s ({loop_time / engine_time:.1f}x)")
+    print(f"Lines whose tax differs from float rounding: {differ}")
+
+
+if __name__ == "__main__":
+    main()
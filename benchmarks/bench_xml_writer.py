@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+bench_xml_writer.py
+Benchmark the streaming Tally XML writer (tally_xml.py) against the
+minidom pretty-print round-trip it replaces.
+
+Usage:
+  python benchmarks/bench_xml_writer.py [--vouchers 10000] [--items 3]
+
+Builds a batch of synthetic DR records and generates one envelope two ways:
+  minidom  : build the whole tree, ET.tostring, minidom.parseString,
+             toprettyxml, drop blank lines
+  streaming: TallyInvoiceGenerator.write_batch_xml, one voucher at a time
+It checks that both produce identical text, then reports the time and
+peak traced memory of each (voucher building included in both).
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+import xml.etree.ElementTree as ET
+import xml.dom.minidom as minidom
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tally_invoice import TallyInvoiceGenerator
+
+PART_NAMES = [
+    "ASSY. SUCTION PIPE - STEERING PUMP", "ASSY.BREATHER PIPE RH", "BRACKET LH",
+    "HOSE CLAMP 40/60", "PIPE ASSY (RETURN)", "COVER & GASKET KIT", "SHAFT-PTO",
+]
+
+
+def make_records(vouchers, items, rng):
+    records = []
+    for n in range(vouchers):
+        dr_items = [
+            {
+                'Order No': str(1210000000 + rng.randrange(10 ** 6)),
+                'Part No': rng.choice(['1816A1810169', f"{rng.randrange(10 ** 8):08d}M1"]),
+                'Part Name': rng.choice(PART_NAMES),
+                'Box Type': 'CHEP BOX',
+                'Quantity': str(rng.randint(1, 50)),
+                'Unit Size': '10',
+            }
+            for _ in range(items)
+        ]
+        dr_data = dict(dr_items[0], **{
+            'DR No': str(11500000 + n),
+            'Buyer Order No': dr_items[0]['Order No'],
+            'Branch': rng.choice(['Madurai Operations- K Patti Pl - 1000', 'Doddaballapur Plant']),
+            'Items': dr_items,
+        })
+        records.append({'dr_data': dr_data, 'prompt_data': {'vehicle_number': 'TN13AH0050'}})
+    return records
+
+
+def minidom_batch(records):
+    root, _ = TallyInvoiceGenerator.generate_batch_xml(records)
+    xml_string = minidom.parseString(ET.tostring(root)).toprettyxml(indent='  ')
+    return '\n'.join([line for line in xml_string.split('\n') if line.strip()])
+
+
+def streaming_batch(records):
+    out = io.StringIO()
+    TallyInvoiceGenerator.write_batch_xml(records, out)
+    return out.getvalue()
+
+
+def streaming_batch_to_file(records):
+    with open(os.devnull, 'w', encoding='utf-8') as f:
+        TallyInvoiceGenerator.write_batch_xml(records, f)
+
+
+def measure(func, records):
+    """(seconds, peak traced MiB); timed untraced, then run again under tracemalloc"""
+    start = time.perf_counter()
+    func(records)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(records)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming Tally XML writer")
+    parser.add_argument("--vouchers", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    records = make_records(args.vouchers, args.items, rng)
+
+    # Equivalence on a slice, so the check itself does not dominate the run
+    sample = records[:500]
+    if minidom_batch(sample) != streaming_batch(sample):
+        print("ERROR: streaming output differs from the minidom pretty-print")
+        sys.exit(1)
+
+    print(f"Batch: {args.vouchers} vouchers x {args.items} items")
+    for label, func in [("minidom", minidom_batch),
+                        ("streaming (StringIO)", streaming_batch),
+                        ("streaming (file)", streaming_batch_to_file)]:
+        elapsed, peak = measure(func, records)
+        print(f"{label:22s}: {elapsed:7.2f} s, peak {peak:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
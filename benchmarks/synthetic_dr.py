@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+synthetic_dr.py
+Synthetic TAFE-style Delivery Request PDFs for benchmarks, made offline.
+
+Pages are laid out like DeliveryRequest_2.pdf: A4 with a ruled header
+block (Supplier / Request / Departure / DR No ...), the ten-column item
+table (Order No, Part No, Part Name, Type of Bin / Box, Request, Shipped,
+Delay, Remark, Unit Size, Qty), long part names wrapped onto two lines,
+and the note and dotted footer. Text is base-14 Helvetica, so no fonts or
+PDF libraries beyond the extractor's own are needed.
+
+The scanned variant renders each page to an image (pypdfium2), adds a
+slight skew and noise, and saves the images as a PDF with no text layer
+(PIL), so only OCR can read it.
+
+Usage:
+  python benchmarks/synthetic_dr.py out.pdf [--pages 5] [--items 40] [--scanned out_scanned.pdf] [--seed 1]
+"""
+
+import zlib
+import random
+import argparse
+
+from pdfminer.fontmetrics import FONT_METRICS
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+# Table geometry of DeliveryRequest_2.pdf (x edges of the ten columns, y from the top)
+COLUMN_EDGES = [15.3, 78.7, 142.5, 269.7, 324.4, 370.0, 415.6, 461.2, 506.9, 543.4, 579.7]
+MIDDLE = 324.4
+TITLE_TOP, TITLE_BOTTOM = 33.5, 58.9
+HEADER_ROWS = [58.9, 75.5, 91.4, 107.2, 123.1, 140.1]
+COLUMNS_BOTTOM = 169.9
+ROW_HEIGHT = 32.8
+NOTE_HEIGHT = 54.7
+TABLE_LIMIT = 760
+ROWS_PER_PAGE = int((TABLE_LIMIT - NOTE_HEIGHT - COLUMNS_BOTTOM) // ROW_HEIGHT)
+
+COLUMN_TITLES = [
+    ["Order No."], ["Part No."], ["Part Name"], ["Type of", "Bin / Box"], ["Request", "(Unit)"],
+    ["Shipped", "(Unit)"], ["Delay", "(Unit)"], ["Remark"], ["Unit", "Size"], ["Qty"],
+]
+
+BRANCHES = ["Madurai Operations- K Patti Pl - 1000", "Doddaballapur Plant - 1030"]
+PART_NAMES = [
+    "ASSY. SUCTION PIPE - STEERING PUMP", "ASSY.BREATHER PIPE RH", "BRACKET LH",
+    "HOSE CLAMP 40/60", "PIPE ASSY (RETURN) - HYDRAULIC LIFT", "COVER & GASKET KIT",
+    "SHAFT-PTO", "ASSY. INJECTION PIPE - FUEL PUMP CYL 3",
+]
+BOX_TYPES = ["CHEP BOX", "PP BOX", "BIN", "WOOD BOX"]
+SUPPLIER = "Sri Durga Engg Works - DS1615"
+
+
+def text_width(text, size, font='Helvetica'):
+    widths = FONT_METRICS[font][1]
+    return sum(widths.get(ch, 556) for ch in text) * size / 1000
+
+
+def wrap(text, width, size):
+    """Greedy word wrap of text to lines no wider than width"""
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and text_width(candidate, size) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class Canvas:
+    """PDF content stream for one page, in top-left coordinates like pdfplumber's"""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, top, text, size=8, bold=False):
+        font = 'F2' if bold else 'F1'
+        y = PAGE_HEIGHT - top - size * 0.8
+        self.ops.append(f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_escape(text)}) Tj ET")
+
+    def centered(self, x0, x1, top, text, size=8, bold=False):
+        width = text_width(text, size, 'Helvetica-Bold' if bold else 'Helvetica')
+        self.text((x0 + x1 - width) / 2, top, text, size, bold)
+
+    def line(self, x0, top0, x1, top1):
+        self.ops.append(f"{x0:.2f} {PAGE_HEIGHT - top0:.2f} m {x1:.2f} {PAGE_HEIGHT - top1:.2f} l S")
+
+    def hline(self, top, x0=COLUMN_EDGES[0], x1=COLUMN_EDGES[-1]):
+        self.line(x0, top, x1, top)
+
+    def vline(self, x, top, bottom):
+        self.line(x, top, x, bottom)
+
+    def stream(self):
+        return ("0.75 w\n" + "\n".join(self.ops)).encode('latin-1')
+
+
+def write_pdf(path, streams):
+    """Write pages (content streams) as a PDF with Helvetica and Helvetica-Bold"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages = add(None)
+    fonts = [add(f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>".encode())
+             for name in ('Helvetica', 'Helvetica-Bold')]
+    page_ids = []
+    for stream in streams:
+        data = zlib.compress(stream)
+        content = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+            f" /Resources << /Font << /F1 {fonts[0]} 0 R /F2 {fonts[1]} 0 R >> >>"
+            f" /Contents {content} 0 R >>".encode()
+        ))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages} 0 R >>".encode()
+    objects[pages - 1] = (f"<< /Type /Pages /Count {len(page_ids)} /Kids ["
+                          + " ".join(f"{p} 0 R" for p in page_ids) + "] >>").encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for n, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % n + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog, xref))
+
+
+def make_items(count, rng):
+    items = []
+    for _ in range(count):
+        request = rng.randint(1, 20)
+        unit_size = rng.choice([1, 5, 10, 25, 50])
+        items.append({
+            "Order No": str(rng.randrange(1210000000, 1210999999)),
+            "Part No": rng.choice([f"{rng.randrange(1000, 9999)}A{rng.randrange(10 ** 7):07d}",
+                                   f"{rng.randrange(10 ** 7):07d}M{rng.randrange(10, 99)}"]),
+            "Part Name": rng.choice(PART_NAMES),
+            "Box Type": rng.choice(BOX_TYPES),
+            "Qty": str(request),
+            "Unit Size": str(unit_size),
+            "Total": str(request * unit_size),
+        })
+    return items
+
+
+def draw_page(canvas, header, items):
+    x = COLUMN_EDGES
+    canvas.text(15, 18, "05/11/2025 21:45 Login By: DS1615", size=8)
+    canvas.text(549, 18, "REPRINT", size=8)
+
+    # Title and header block
+    canvas.centered(x[1], x[8], 39, "Delivery Request", size=15)
+    canvas.hline(TITLE_TOP)
+    canvas.vline(x[1], TITLE_TOP, TITLE_BOTTOM)
+    canvas.vline(x[8], TITLE_TOP, TITLE_BOTTOM)
+    fields = [
+        (f"Supplier : {SUPPLIER}", f"Request : {header['Branch']}"),
+        (f"Shipping Point : {SUPPLIER}", f"Receiving Point : {header['Branch']}"),
+        ("Departure Time : 16:00 28/10/2025", "Arrival Time : 17:00 06/11/2025"),
+        ("Delivery Cycle : 1-1 , TRIP-1", "Issue Time : 06:00 28/10/2025"),
+        (f"Delivery Request No. : {header['DR No']}", "Supply chain :"),
+    ]
+    for (left, right), top, bottom in zip(fields, HEADER_ROWS, HEADER_ROWS[1:]):
+        canvas.hline(top)
+        canvas.vline(MIDDLE, top, bottom)
+        canvas.text(19, top + 3.5, left, size=9)
+        canvas.text(328, top + 3.5, right, size=9)
+
+    # Column titles
+    canvas.hline(HEADER_ROWS[-1])
+    for x0, x1, title in zip(x, x[1:], COLUMN_TITLES):
+        top = HEADER_ROWS[-1] + (9.4 if len(title) == 1 else 3.4)
+        for n, part in enumerate(title):
+            canvas.centered(x0, x1, top + 12 * n, part, size=8, bold=True)
+    canvas.hline(COLUMNS_BOTTOM)
+
+    # Item rows
+    top = COLUMNS_BOTTOM
+    for item in items:
+        bottom = top + ROW_HEIGHT
+        middle = top + ROW_HEIGHT / 2 - 3
+        cells = [item["Order No"], item["Part No"], None, item["Box Type"], item["Qty"],
+                 "", "", "", item["Unit Size"], item["Total"]]
+        for x0, x1, value in zip(x, x[1:], cells):
+            if value:
+                canvas.centered(x0, x1, middle, value)
+        name_lines = wrap(item["Part Name"], x[3] - x[2] - 8, 8)
+        for n, name_line in enumerate(name_lines):
+            canvas.centered(x[2], x[3], middle + (n - (len(name_lines) - 1) / 2) * 8, name_line)
+        canvas.hline(bottom)
+        top = bottom
+    for edge in x:
+        canvas.vline(edge, HEADER_ROWS[-1], top)
+
+    # Note and footer
+    note_bottom = top + NOTE_HEIGHT
+    canvas.vline(x[0], top, note_bottom)
+    canvas.vline(x[8], top, note_bottom)
+    canvas.vline(x[-1], top, note_bottom)
+    canvas.hline(note_bottom)
+    canvas.vline(x[0], TITLE_TOP, HEADER_ROWS[-1])
+    canvas.vline(x[-1], TITLE_TOP, HEADER_ROWS[-1])
+    for n, note in enumerate(["Note:", "1. Delivery to be by Ns of Bin / Box",
+                              "2. Delay to be made-up by next delivery window, otherwise be informed"]):
+        canvas.text(19, top + 4 + n * 10, note, size=8, bold=(n == 0))
+    canvas.text(15, note_bottom + 6, "." * 134, size=7)
+
+
+def generate(path, pages=1, items=1, seed=1, dr_no=None, branch=None):
+    """
+    Write a synthetic DR PDF with items spread over pages (more pages are
+    used if they do not fit). Returns (header, items) as generated.
+    """
+    rng = random.Random(seed)
+    header = {
+        "DR No": dr_no or str(rng.randrange(11500000, 11599999)),
+        "Branch": branch or rng.choice(BRANCHES),
+    }
+    dr_items = make_items(items, rng)
+    pages = max(pages, -(-len(dr_items) // ROWS_PER_PAGE), 1)
+    per_page = -(-len(dr_items) // pages) if dr_items else 0
+
+    streams = []
+    for page in range(pages):
+        canvas = Canvas()
+        draw_page(canvas, header, dr_items[page * per_page:(page + 1) * per_page])
+        streams.append(canvas.stream())
+    write_pdf(path, streams)
+
+    for item in dr_items:
+        item.pop("Total")
+    return header, dr_items
+
+
+def make_scanned(pdf_path, out_path, dpi=200, seed=1):
+    """Rasterize a PDF into an image-only 'scanned' PDF with slight skew and noise"""
+    import pypdfium2 as pdfium
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    doc = pdfium.PdfDocument(pdf_path)
+    images = []
+    try:
+        for page in doc:
+            image = page.render(scale=dpi / 72).to_pil().convert('L')
+            image = image.rotate(rng.uniform(-0.6, 0.6), fillcolor=255, resample=Image.BILINEAR)
+            noise = Image.effect_noise(image.size, 12)
+            image = Image.blend(image, noise, 0.08).filter(ImageFilter.GaussianBlur(0.4))
+            images.append(image)
+    finally:
+        doc.close()
+    images[0].save(out_path, 'PDF', resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic TAFE Delivery Request PDF")
+    parser.add_argument("output_pdf")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--items", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scanned", default=None, help="also write an image-only scanned variant here")
+    args = parser.parse_args()
+
+    header, items = generate(args.output_pdf, args.pages, args.items, args.seed)
+    print(f"DR {header['DR No']} ({header['Branch']}): {len(items)} items -> {args.output_pdf}")
+    if args.scanned:
+        make_scanned(args.output_pdf, args.scanned, seed=args.seed)
+        print(f"Scanned variant -> {args.scanned}")
+
+
+if __name__ == "__main__":
+    main()
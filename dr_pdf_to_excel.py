@@ -1,318 +1,976 @@
-#!/usr/bin/env python3
-"""
-dr_pdf_to_excel.py
-Robust PDF -> Excel extractor for TAFE Delivery Requests.
-
-Usage:
-  python dr_pdf_to_excel.py input_pdf output_xlsx
-
-Notes:
-- Tries: 1) pdfplumber table extraction, 2) pdfplumber text + regex, 3) OCR (pytesseract)
-- Produces Excel with columns:
-  DR No, Order No, Part No, Part Name, Qty, Unit Size, Box Type, Branch, Buyer Order No, Vehicle No, Kanban, Crate Details
-"""
-
-import sys, re
-import pdfplumber
-import pandas as pd
-from PIL import Image
-import numpy as np
-import cv2
-import pytesseract
-
-def try_tables(pdf_path):
-    """Extract table data from PDF and return parsed items"""
-    rows = []
-    header_info = {}
-    
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                tables = page.extract_tables()
-                if not tables:
-                    continue
-                
-                main_table = tables[0] if tables else []
-                
-                if not main_table:
-                    continue
-                
-                # Extract header info from the table metadata rows
-                for row in main_table[:7]:
-                    row_text = " ".join([str(c) for c in (row or []) if c])
-                    
-                    # Extract DR No
-                    m = re.search(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", row_text, re.I)
-                    if m:
-                        header_info['DR No'] = m.group(1).strip()
-                    
-                    # Extract Branch/Request - now supports Operations, Plant, Pl patterns
-                    m = re.search(r"Request\s*[:\-]?\s*([A-Za-z\-\s]+(?:Operations|Plant|Pl)[A-Za-z0-9\s\-]*)", row_text, re.I)
-                    if m:
-                        header_info['Branch'] = m.group(1).strip()
-                
-                # Data rows start after the header row
-                header_row_idx = -1
-                for i, row in enumerate(main_table):
-                    row_text = " ".join([str(c) for c in (row or []) if c]).upper()
-                    if "ORDER NO" in row_text and "PART NO" in row_text:
-                        header_row_idx = i
-                        break
-                
-                # Parse data rows
-                if header_row_idx >= 0:
-                    for row in main_table[header_row_idx+1:]:
-                        if not row or all(not cell for cell in row):
-                            continue
-                        
-                        row_str = " ".join([str(c) for c in (row or []) if c]).strip()
-                        if not row_str or len(row_str) < 10:
-                            continue
-                        
-                        if any(skip in row_str.lower() for skip in ['note:', 'delivery', '......']):
-                            continue
-                        
-                        try:
-                            order_no = str(row[0]).strip() if row[0] else ""
-                            part_no = str(row[1]).strip() if row[1] else ""
-                            # Clean up part names - remove newlines
-                            part_name = str(row[2]).strip().replace('\n', ' ').replace('\r', '') if row[2] else ""
-                            box_type = str(row[3]).strip() if row[3] else ""
-                            qty_request = str(row[4]).strip() if row[4] else ""
-                            unit_size = str(row[9]).strip() if len(row) > 9 and row[9] else ""
-                            kanban = str(row[4]).strip() if row[4] else ""
-                            
-                            if order_no and part_no:
-                                rows.append({
-                                    "Order No": order_no,
-                                    "Part No": part_no,
-                                    "Part Name": part_name,
-                                    "Box Type": box_type,
-                                    "Qty": qty_request,
-                                    "Unit Size": unit_size,
-                                    "Kanban": kanban
-                                })
-                        except (IndexError, ValueError):
-                            continue
-    
-    except Exception as e:
-        print(f"Table extraction error: {e}")
-    
-    return header_info, rows
-
-def text_from_pdf(pdf_path):
-    txt = ""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                t = page.extract_text() or ""
-                txt += "\n" + t
-    except Exception as e:
-        txt = ""
-    return txt
-
-def ocr_pdf(pdf_path):
-    txt = ""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                img = page.to_image(resolution=300).original.convert("RGB")
-                arr = np.array(img)
-                gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-                blur = cv2.medianBlur(gray, 3)
-                _, th = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                pil = Image.fromarray(th)
-                page_text = pytesseract.image_to_string(pil, lang='eng')
-                txt += "\n" + page_text
-    except Exception as e:
-        txt = ""
-    return txt
-
-def parse_from_text(full_text):
-    header = {}
-    items = []
-
-    text = full_text.replace('\r','\n')
-
-    # DR No
-    m = re.search(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", text, re.I)
-    if m:
-        header['DR No'] = m.group(1).strip()
-
-    # Branch / Request - now supports Operations, Plant, Pl patterns
-    m = re.search(r"Request\s*[:\-]?\s*([A-Za-z\-\s]+(?:Operations|Plant|Pl)[A-Za-z0-9\s\-]*)", text, re.I)
-    if m:
-        header['Branch'] = m.group(1).strip()
-    else:
-        header['Branch'] = ""
-
-    lines = text.splitlines()
-    
-    table_start_idx = -1
-    for i, ln in enumerate(lines):
-        if re.search(r"Order\s*No|Part\s*No", ln, re.I):
-            table_start_idx = i
-            break
-    
-    if table_start_idx >= 0:
-        for ln in lines[table_start_idx+1:]:
-            ln = ln.strip()
-            if not ln or len(ln) < 5:
-                continue
-            
-            if any(skip in ln.lower() for skip in ['note:', 'delivery', 'request', 'bin', 'unit', 'supplier', 'shipping', 'departure']):
-                continue
-            if re.search(r'^\.+$', ln):
-                continue
-            
-            order_match = re.search(r'\b(\d{10})\b', ln)
-            part_match = re.search(r'\b([A-Z0-9]{4,20}M\d{1,3})\b', ln)
-            
-            if order_match and part_match:
-                order_no = order_match.group(1)
-                part_no = part_match.group(1)
-                
-                part_name_match = re.search(part_no + r'\s+([A-Z0-9\.\s\-/&()]+?)\s+(PP BOX|CHEP BOX|BOX|BIN|[A-Z]+\s+BOX)', ln, re.I)
-                part_name = part_name_match.group(1).strip().replace('\n', ' ') if part_name_match else ""
-                
-                box_match = re.search(r'(PP BOX|CHEP BOX|BOX|BIN|[A-Z]+\s+BOX)', ln, re.I)
-                box_type = box_match.group(1).strip() if box_match else ""
-                
-                numbers = re.findall(r'\b(\d+)\b', ln)
-                
-                qty = ""
-                unit_size = ""
-                kanban = ""
-                
-                if len(numbers) >= 5:
-                    qty = numbers[2] if len(numbers) > 2 else ""
-                    unit_size = numbers[-2] if len(numbers) >= 2 else ""
-                    kanban = numbers[-1] if len(numbers) >= 1 else ""
-                
-                item = {
-                    "Order No": order_no,
-                    "Part No": part_no,
-                    "Part Name": part_name,
-                    "Box Type": box_type,
-                    "Qty": qty,
-                    "Unit Size": unit_size,
-                    "Kanban": kanban
-                }
-                items.append(item)
-    
-    if not items:
-        pattern = re.compile(r"(\d{10})\s+([A-Z0-9\-]{5,20})\s+([A-Z0-9\.\- /&()]+?)\s+(PP BOX|CHEP BOX|BOX|BIN)\s+(\d+)", re.I)
-        for m in pattern.finditer(text):
-            items.append({
-                "Order No": m.group(1).strip(),
-                "Part No": m.group(2).strip(),
-                "Part Name": m.group(3).strip().replace('\n', ' '),
-                "Box Type": m.group(4).strip(),
-                "Qty": m.group(5).strip(),
-                "Unit Size": "",
-                "Kanban": ""
-            })
-
-    header.setdefault('Buyer Order No', items[0].get('Order No', '') if items else '')
-    header.setdefault('Vehicle No', '')
-    header.setdefault('Crate Details', '')
-
-    return header, items
-
-def make_dataframe(header, items):
-    rows = []
-    if items:
-        for it in items:
-            row = {
-                "DR No": header.get("DR No",""),
-                "Order No": it.get("Order No",""),
-                "Part No": it.get("Part No",""),
-                "Part Name": it.get("Part Name",""),
-                "Qty": it.get("Qty",""),
-                "Unit Size": it.get("Unit Size",""),
-                "Box Type": it.get("Box Type",""),
-                "Branch": header.get("Branch",""),
-                "Buyer Order No": header.get("Buyer Order No",""),
-                "Vehicle No": header.get("Vehicle No",""),
-                "Kanban": it.get("Kanban",""),
-                "Crate Details": header.get("Crate Details","")
-            }
-            rows.append(row)
-    else:
-        rows.append({
-            "DR No": header.get("DR No",""),
-            "Order No": header.get("Buyer Order No",""),
-            "Part No": "",
-            "Part Name": "",
-            "Qty": "",
-            "Unit Size": "",
-            "Box Type": "",
-            "Branch": header.get("Branch",""),
-            "Buyer Order No": header.get("Buyer Order No",""),
-            "Vehicle No": header.get("Vehicle No",""),
-            "Kanban": "",
-            "Crate Details": header.get("Crate Details","")
-        })
-    df = pd.DataFrame(rows, columns=[
-        "DR No","Order No","Part No","Part Name","Qty","Unit Size","Box Type",
-        "Branch","Buyer Order No","Vehicle No","Kanban","Crate Details"
-    ])
-    return df
-
-def main(pdf_path, out_xlsx):
-    print("Attempting table extraction...")
-    header_info, table_rows = try_tables(pdf_path)
-    
-    if table_rows:
-        header = {
-            'DR No': header_info.get('DR No', ''),
-            'Branch': header_info.get('Branch', ''),
-            'Buyer Order No': table_rows[0].get('Order No', '') if table_rows else '',
-            'Vehicle No': '',
-            'Crate Details': ''
-        }
-        df = make_dataframe(header, table_rows)
-        try:
-            df.to_excel(out_xlsx, index=False, engine='openpyxl')
-            print(f"Saved {len(df)} rows from table extraction to {out_xlsx}")
-        except PermissionError:
-            print(f"ERROR: Cannot write to {out_xlsx}. File may be open in Excel. Please close it and try again.")
-            sys.exit(1)
-        return
-
-    print("No useful tables found — trying text extraction...")
-    t = text_from_pdf(pdf_path)
-    if len(t.strip()) < 100:
-        print("Text extraction returned little text — falling back to OCR...")
-        t = ocr_pdf(pdf_path)
-
-    if len(t.strip()) < 50:
-        print("ERROR: Could not extract readable text from PDF. Please try a scanned-high-res PDF or enable better scan quality.")
-        df = pd.DataFrame([{
-            "DR No":"", "Order No":"", "Part No":"", "Part Name":"", "Qty":"", "Unit Size":"",
-            "Box Type":"", "Branch":"", "Buyer Order No":"", "Vehicle No":"", "Kanban":"", "Crate Details":""
-        }])
-        try:
-            df.to_excel(out_xlsx, index=False, engine='openpyxl')
-            print("Saved blank template to help manual fill:", out_xlsx)
-        except PermissionError:
-            print(f"ERROR: Cannot write to {out_xlsx}. File may be open in Excel. Please close it and try again.")
-            sys.exit(1)
-        return
-
-    header, items = parse_from_text(t)
-    df = make_dataframe(header, items)
-    try:
-        df.to_excel(out_xlsx, index=False, engine='openpyxl')
-        print(f"Saved {len(df)} rows to {out_xlsx}")
-    except PermissionError:
-        print(f"ERROR: Cannot write to {out_xlsx}. File may be open in Excel. Please close it and try again.")
-        sys.exit(1)
-
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python dr_pdf_to_excel.py input.pdf output.xlsx")
-        sys.exit(1)
-    pdf_path = sys.argv[1]
-    out_xlsx = sys.argv[2]
-    main(pdf_path, out_xlsx)
+#!/usr/bin/env python3
+"""
+dr_pdf_to_excel.py
+Robust PDF -> Excel extractor for TAFE Delivery Requests.
+
+Usage:
+  python dr_pdf_to_excel.py input_pdf output_xlsx [--ocr-workers N] [--timings]
+  python dr_pdf_to_excel.py --batch "DRs/*.pdf" all_drs.xlsx [--workers N] [--sheet-per-dr] [--report report.csv] [--timings]
+  python dr_pdf_to_excel.py --daemon [--listen /tmp/dr.sock | --listen 127.0.0.1:8765] [--workers N]
+
+Notes:
+- Tries: 1) pdfplumber table extraction, 2) pdfplumber text + regex, 3) OCR (ocr_engine.py)
+  OCR is decided per page: only pages without a usable text layer are OCR'd,
+  and only their DR header and table regions are read
+- The PDF is opened once (PDFDocument); all strategies share its cached pages, tables and text
+- Known DR layouts skip table detection via learned templates (layout_templates.py)
+- Table and text results are cached on disk by file content hash (extraction_cache.py)
+- Extracted DRs are appended to the DR ledger (ledger.py; LEDGER_DISABLED=1 turns it off)
+- Stages are timed into metrics.py; --timings prints the per-stage totals at the end
+- --daemon keeps a warm worker pool and converts JSON-line jobs, {"pdf": ..., "out": ...},
+  read from stdin (or a local socket with --listen); each job gets a JSON-line reply
+  with its status and per-stage timings as soon as it finishes
+- Produces Excel with columns:
+  DR No, Order No, Part No, Part Name, Qty, Unit Size, Box Type, Branch, Buyer Order No, Vehicle No, Kanban, Crate Details
+  Qty, Unit Size and Kanban are numeric cells. Rows are streamed into a write-only
+  workbook (excel_export.py), so batch exports run in constant memory
+- The OCR stack (OpenCV, numpy, pdfium, tesseract) is imported on first use,
+  so DRs read from their tables never load it
+"""
+
+import sys, os, re, io, csv, glob, time, json, atexit
+import argparse
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout, ExitStack
+import pdfplumber
+from extraction_cache import cached, file_sha256, text_sha256
+from layout_templates import first_table
+from excel_export import write_xlsx
+from ledger import record_dr, record_drs
+import metrics
+
+class PDFDocument:
+    """
+    PDF opened once and shared by every extraction strategy.
+    Page objects, chars, tables and text are parsed lazily and cached,
+    so falling back from tables to text to OCR never re-reads the file.
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.pdf = pdfplumber.open(pdf_path)
+        self._pages = None
+        self._chars = {}
+        self._tables = {}
+        self._main_table = {}
+        self._text = {}
+        self._sha256 = None
+        self._pdfium = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pdf.close()
+        if self._pdfium is not None:
+            import ocr_engine
+            ocr_engine.close_pdfium(self._pdfium)
+            self._pdfium = None
+
+    @property
+    def sha256(self):
+        """Content hash of the file, used as the extraction cache key"""
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.pdf_path)
+        return self._sha256
+
+    @property
+    def pages(self):
+        if self._pages is None:
+            self._pages = list(self.pdf.pages)
+        return self._pages
+
+    @property
+    def pdfium(self):
+        """pypdfium2 handle for rendering pages (OCR), opened on first use"""
+        if self._pdfium is None:
+            import ocr_engine
+            source = self.pdf_path
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            self._pdfium = ocr_engine.open_pdfium(source)
+        return self._pdfium
+
+    def chars(self, page_num):
+        if page_num not in self._chars:
+            self._chars[page_num] = self.pages[page_num].chars
+        return self._chars[page_num]
+
+    def tables(self, page_num):
+        if page_num not in self._tables:
+            self._tables[page_num] = self.pages[page_num].extract_tables()
+        return self._tables[page_num]
+
+    def main_table(self, page_num):
+        """First table on the page, read through a learned layout template when possible"""
+        if page_num not in self._main_table:
+            if page_num in self._tables:
+                tables = self._tables[page_num]
+                self._main_table[page_num] = tables[0] if tables else None
+            else:
+                self._main_table[page_num] = first_table(self.pages[page_num])
+        return self._main_table[page_num]
+
+    def text(self, page_num):
+        if page_num not in self._text:
+            with metrics.stage('extract_text'):
+                self._text[page_num] = self.pages[page_num].extract_text() or ""
+            metrics.record_pages('text', 1)
+        return self._text[page_num]
+
+@contextmanager
+def open_document(source):
+    """Yield a PDFDocument for a path, or the document itself if one is passed in"""
+    if isinstance(source, PDFDocument):
+        yield source
+    else:
+        with PDFDocument(source) as doc:
+            yield doc
+
+# Precompiled patterns shared by the table and text parsers
+DR_NO_RE = re.compile(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", re.I)
+BRANCH_RE = re.compile(r"Request\s*[:\-]?\s*([A-Za-z\-\s]+(?:Operations|Plant|Pl)[A-Za-z0-9\s\-]*)", re.I)
+TABLE_START_RE = re.compile(r"Order\s*No|Part\s*No", re.I)
+SKIP_RE = re.compile(r"note:|delivery|request|bin|unit|supplier|shipping|departure")
+ORDER_RE = re.compile(r'\b(\d{10})\b')
+PART_RE = re.compile(r'\b([A-Z0-9]{4,20}M\d{1,3})\b')
+BOX_PATTERN = r'(PP BOX|CHEP BOX|BOX|BIN|[A-Z]+\s+BOX)'
+BOX_RE = re.compile(BOX_PATTERN, re.I)
+PART_NAME_TAIL = r'\s+([A-Z0-9\.\s\-/&()]+?)\s+' + BOX_PATTERN
+PART_NAME_TAIL_RE = re.compile(PART_NAME_TAIL, re.I)
+NUMBER_RE = re.compile(r'\b(\d+)\b')
+FALLBACK_ITEM_RE = re.compile(r"(\d{10})\s+([A-Z0-9\-]{5,20})\s+([A-Z0-9\.\- /&()]+?)\s+(PP BOX|CHEP BOX|BOX|BIN)\s+(\d+)", re.I)
+
+def parse_table(main_table):
+    """
+    Header info and item rows from one page's main table.
+    Returns (header_info, rows, continuation); continuation is part name text
+    from rows at the top of the page that carry on the previous page's last item.
+    """
+    rows = []
+    header_info = {}
+    continuation = []
+    
+    if not main_table:
+        return header_info, rows, ""
+    
+    # Extract header info from the table metadata rows
+    for row in main_table[:7]:
+        row_text = " ".join([str(c) for c in (row or []) if c])
+        
+        # Extract DR No
+        m = DR_NO_RE.search(row_text)
+        if m:
+            header_info['DR No'] = m.group(1).strip()
+        
+        # Extract Branch/Request - now supports Operations, Plant, Pl patterns
+        m = BRANCH_RE.search(row_text)
+        if m:
+            header_info['Branch'] = m.group(1).strip()
+    
+    # Data rows start after the header row
+    header_row_idx = -1
+    for i, row in enumerate(main_table):
+        row_text = " ".join([str(c) for c in (row or []) if c]).upper()
+        if "ORDER NO" in row_text and "PART NO" in row_text:
+            header_row_idx = i
+            break
+    
+    # Parse data rows
+    if header_row_idx >= 0:
+        for row in main_table[header_row_idx+1:]:
+            if not row or all(not cell for cell in row):
+                continue
+            
+            # Part name wrapped onto this page from the previous one:
+            # only the part name column is filled, before any item on this page
+            if not rows and not row[0] and len(row) > 2 and not row[1] and row[2]:
+                continuation.append(str(row[2]).strip().replace('\n', ' ').replace('\r', ''))
+                continue
+            
+            row_str = " ".join([str(c) for c in (row or []) if c]).strip()
+            if not row_str or len(row_str) < 10:
+                continue
+            
+            if any(skip in row_str.lower() for skip in ['note:', 'delivery', '......']):
+                continue
+            
+            try:
+                order_no = str(row[0]).strip() if row[0] else ""
+                part_no = str(row[1]).strip() if row[1] else ""
+                # Clean up part names - remove newlines
+                part_name = str(row[2]).strip().replace('\n', ' ').replace('\r', '') if row[2] else ""
+                box_type = str(row[3]).strip() if row[3] else ""
+                qty_request = str(row[4]).strip() if row[4] else ""
+                unit_size = str(row[9]).strip() if len(row) > 9 and row[9] else ""
+                kanban = str(row[4]).strip() if row[4] else ""
+                
+                if order_no and part_no:
+                    rows.append({
+                        "Order No": order_no,
+                        "Part No": part_no,
+                        "Part Name": part_name,
+                        "Box Type": box_type,
+                        "Qty": qty_request,
+                        "Unit Size": unit_size,
+                        "Kanban": kanban
+                    })
+            except (IndexError, ValueError):
+                continue
+    
+    return header_info, rows, " ".join(continuation)
+
+# Documents with at least this many pages have their tables parsed on the page pool
+PARALLEL_TABLE_PAGES = 8
+
+@cached('try_tables')
+def try_tables(pdf_path, workers=1, progress=None, raise_errors=False):
+    """
+    Extract table data from every page of the PDF and return (header_info, items).
+    Large documents are parsed page-parallel when workers > 1. Rows that
+    continue across a page break are merged into the previous page's last item.
+    progress, if given, is called as progress(pages_done, pages_total, 'tables').
+    Errors are printed and give ({}, []) unless raise_errors is set.
+    """
+    rows = []
+    header_info = {}
+    
+    try:
+        with open_document(pdf_path) as doc, metrics.stage('extract_tables'), ExitStack() as stack:
+            num_pages = len(doc.pages)
+            path = worker_path(doc, workers, num_pages) if num_pages >= PARALLEL_TABLE_PAGES else None
+            if path:
+                pages = stack.enter_context(page_pool(workers)).map(_table_worker_page, [(path, i) for i in range(num_pages)])
+            else:
+                pages = (parse_table(doc.main_table(i)) for i in range(num_pages))
+            
+            for page_num, (page_header, page_rows, continuation) in enumerate(pages):
+                header_info.update(page_header)
+                if continuation and rows:
+                    rows[-1]["Part Name"] = f"{rows[-1]['Part Name']} {continuation}".strip()
+                rows.extend(page_rows)
+                if progress:
+                    progress(page_num + 1, num_pages, 'tables')
+            metrics.record_pages('tables', num_pages)
+    
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Table extraction error: {e}")
+        return {}, []
+    
+    return header_info, rows
+
+def text_from_pdf(pdf_path):
+    txt = ""
+    try:
+        with open_document(pdf_path) as doc:
+            for page_num in range(len(doc.pages)):
+                t = doc.text(page_num)
+                txt += "\n" + t
+    except Exception as e:
+        txt = ""
+    return txt
+
+def ocr_document_page(doc, page_num):
+    """Render one page of a PDFDocument at 300 DPI and OCR it"""
+    import ocr_engine
+    return ocr_engine.ocr_pdfium_page(doc.pdfium, page_num, resolution=300)
+
+# Page process pool (OCR, table parsing of large documents), created on first
+# parallel call and reused across documents and request threads
+_page_pool = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+# Number of page_pool() blocks using each pool; a pool replaced by a resize
+# is shut down when its count drops to zero
+_page_pool_users = {}
+# PDF held open by each page worker process, so its pages are read without re-opening
+_worker_pdf = {}
+
+def _init_page_worker():
+    """Cap tesseract/OpenCV threads so N workers use N cores, not N x cores"""
+    import cv2
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    cv2.setNumThreads(1)
+
+def _worker_doc(pdf_path):
+    if pdf_path not in _worker_pdf:
+        for doc in _worker_pdf.values():
+            doc.close()
+        _worker_pdf.clear()
+        _worker_pdf[pdf_path] = PDFDocument(pdf_path)
+    return _worker_pdf[pdf_path]
+
+def _worker_page(pdf_path, page_num):
+    return _worker_doc(pdf_path).pages[page_num]
+
+def _ocr_worker_page(args):
+    pdf_path, page_num = args
+    return ocr_document_page(_worker_doc(pdf_path), page_num)
+
+def _table_worker_page(args):
+    return parse_table(first_table(_worker_page(*args)))
+
+def _page_pool_context():
+    """
+    Start page workers from a fork server (spawn on Windows), never by forking
+    this process: the apps call from request threads, and a fork taken while
+    another thread holds a lock can deadlock the child.
+    """
+    import multiprocessing
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+@contextmanager
+def page_pool(workers):
+    """
+    The shared page process pool for the with block, resized if the worker
+    count changed. A resize never shuts down a pool another thread is still
+    mapping on; that pool is shut down when its last block exits.
+    """
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_workers != workers:
+            old = _page_pool
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_page_pool_context(),
+                                             initializer=_init_page_worker)
+            _page_pool_workers = workers
+            if old is not None and old not in _page_pool_users:
+                old.shutdown(wait=False)
+        pool = _page_pool
+        _page_pool_users[pool] = _page_pool_users.get(pool, 0) + 1
+    try:
+        yield pool
+    finally:
+        with _page_pool_lock:
+            _page_pool_users[pool] -= 1
+            retired = not _page_pool_users[pool] and pool is not _page_pool
+            if not _page_pool_users[pool]:
+                del _page_pool_users[pool]
+        if retired:
+            pool.shutdown(wait=False)
+
+def shutdown_page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def forget_page_pool():
+    """
+    Drop a pool inherited through fork (server worker processes) without shutting
+    it down: its processes belong to the parent. The next call starts this
+    process's own pool.
+    """
+    global _page_pool, _page_pool_lock
+    _page_pool = None
+    _page_pool_users.clear()
+    _page_pool_lock = threading.Lock()
+
+atexit.register(shutdown_page_pool)
+
+def worker_path(doc, workers, num_pages):
+    """Absolute path page workers can open, or None if the work should stay in-process"""
+    if workers <= 1 or num_pages <= 1:
+        return None
+    path = doc.pdf_path
+    if hasattr(path, 'as_path'):
+        # In-memory upload: workers need a file to open
+        path = path.as_path()
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    return os.path.abspath(path)
+
+def ocr_pages(pdf_path, page_nums, workers=1, progress=None):
+    """
+    OCR the given pages at 300 DPI and return {page_num: text}.
+    With workers > 1, pages are spread over a process pool; each worker
+    renders its own pages and the text is put back in page order.
+    progress, if given, is called as progress(pages_done, pages_total, 'ocr').
+    """
+    with open_document(pdf_path) as doc, metrics.stage('ocr'), ExitStack() as stack:
+        path = worker_path(doc, workers, len(page_nums))
+        if path:
+            results = stack.enter_context(page_pool(workers)).map(_ocr_worker_page, [(path, i) for i in page_nums])
+        else:
+            results = (ocr_document_page(doc, i) for i in page_nums)
+        texts = []
+        for page_text in results:
+            texts.append(page_text)
+            if progress:
+                progress(len(texts), len(page_nums), 'ocr')
+    metrics.record_pages('ocr', len(texts))
+    return dict(zip(page_nums, texts))
+
+def ocr_pdf(pdf_path, workers=1, progress=None, raise_errors=False):
+    """OCR every page, optionally in parallel (see ocr_pages); '' on errors unless raise_errors"""
+    txt = ""
+    try:
+        with open_document(pdf_path) as doc:
+            page_text = ocr_pages(doc, list(range(len(doc.pages))), workers, progress)
+            for page_num in sorted(page_text):
+                txt += "\n" + page_text[page_num]
+    except Exception as e:
+        if raise_errors:
+            raise
+        txt = ""
+    return txt
+
+# Pages with fewer printable chars than this have no usable text layer
+MIN_PAGE_CHARS = 50
+
+def page_needs_ocr(doc, page_num):
+    """True if the page's text layer is missing or too thin to parse"""
+    printable = sum(1 for c in doc.chars(page_num) if not c["text"].isspace())
+    return printable < MIN_PAGE_CHARS
+
+def text_with_page_ocr(pdf_path, workers=1):
+    """
+    Text layer for digital pages, OCR only for pages without one.
+    Returns (text, ocr_page_nums); text is merged in page order the same
+    way text_from_pdf joins pages, ready for parse_from_text.
+    """
+    txt = ""
+    scanned = []
+    try:
+        with open_document(pdf_path) as doc:
+            num_pages = len(doc.pages)
+            scanned = [i for i in range(num_pages) if page_needs_ocr(doc, i)]
+            ocr_text = {}
+            if scanned:
+                try:
+                    ocr_text = ocr_pages(doc, scanned, workers)
+                except Exception as e:
+                    print(f"OCR error: {e}")
+            for page_num in range(num_pages):
+                if page_num in ocr_text:
+                    txt += "\n" + ocr_text[page_num]
+                else:
+                    txt += "\n" + doc.text(page_num)
+    except Exception as e:
+        txt = ""
+    return txt, scanned
+
+def _find_part_name(ln, part_no):
+    """
+    Equivalent of re.search(part_no + PART_NAME_TAIL, ln, re.I) without
+    compiling a new pattern per row: find each case-insensitive occurrence
+    of the part number and try the precompiled tail right after it.
+    """
+    if not ln.isascii():
+        return re.search(re.escape(part_no) + PART_NAME_TAIL, ln, re.I)
+    hay = ln.upper()
+    needle = part_no.upper()
+    pos = hay.find(needle)
+    while pos >= 0:
+        m = PART_NAME_TAIL_RE.match(ln, pos + len(needle))
+        if m:
+            return m
+        pos = hay.find(needle, pos + 1)
+    return None
+
+def _parse_item_line(ln):
+    """Parse one stripped table line into an item dict, or None if it is not an item row"""
+    if len(ln) < 5:
+        return None
+    if SKIP_RE.search(ln.lower()):
+        return None
+    if not ln.strip('.'):
+        return None
+
+    order_match = ORDER_RE.search(ln)
+    if not order_match:
+        return None
+    part_match = PART_RE.search(ln)
+    if not part_match:
+        return None
+
+    order_no = order_match.group(1)
+    part_no = part_match.group(1)
+
+    part_name_match = _find_part_name(ln, part_no)
+    part_name = part_name_match.group(1).strip().replace('\n', ' ') if part_name_match else ""
+
+    box_match = BOX_RE.search(ln)
+    box_type = box_match.group(1).strip() if box_match else ""
+
+    numbers = NUMBER_RE.findall(ln)
+
+    qty = ""
+    unit_size = ""
+    kanban = ""
+
+    if len(numbers) >= 5:
+        qty = numbers[2]
+        unit_size = numbers[-2]
+        kanban = numbers[-1]
+
+    return {
+        "Order No": order_no,
+        "Part No": part_no,
+        "Part Name": part_name,
+        "Box Type": box_type,
+        "Qty": qty,
+        "Unit Size": unit_size,
+        "Kanban": kanban
+    }
+
+@cached('parse_from_text', key_func=text_sha256)
+def parse_from_text(full_text):
+    """
+    Parse header and items from extracted/OCR text in a single pass over
+    the lines: a two-state machine (before / inside the item table) using
+    only module-level precompiled patterns.
+    """
+    header = {}
+    items = []
+
+    text = full_text.replace('\r','\n')
+
+    # DR No
+    m = DR_NO_RE.search(text)
+    if m:
+        header['DR No'] = m.group(1).strip()
+
+    # Branch / Request - now supports Operations, Plant, Pl patterns
+    m = BRANCH_RE.search(text)
+    if m:
+        header['Branch'] = m.group(1).strip()
+    else:
+        header['Branch'] = ""
+
+    in_table = False
+    for ln in text.splitlines():
+        if not in_table:
+            in_table = TABLE_START_RE.search(ln) is not None
+            continue
+        item = _parse_item_line(ln.strip())
+        if item:
+            items.append(item)
+
+    if not items:
+        for m in FALLBACK_ITEM_RE.finditer(text):
+            items.append({
+                "Order No": m.group(1).strip(),
+                "Part No": m.group(2).strip(),
+                "Part Name": m.group(3).strip().replace('\n', ' '),
+                "Box Type": m.group(4).strip(),
+                "Qty": m.group(5).strip(),
+                "Unit Size": "",
+                "Kanban": ""
+            })
+
+    header.setdefault('Buyer Order No', items[0].get('Order No', '') if items else '')
+    header.setdefault('Vehicle No', '')
+    header.setdefault('Crate Details', '')
+
+    return header, items
+
+EXCEL_COLUMNS = [
+    "DR No","Order No","Part No","Part Name","Qty","Unit Size","Box Type",
+    "Branch","Buyer Order No","Vehicle No","Kanban","Crate Details"
+]
+
+# Written as numbers rather than text
+NUMERIC_COLUMNS = ["Qty", "Unit Size", "Kanban"]
+
+def iter_rows(header, items):
+    """Export rows (dicts keyed by EXCEL_COLUMNS) for one DR; a header-only row if it has no items"""
+    if not items:
+        items = [{"Order No": header.get("Buyer Order No", "")}]
+    for it in items:
+        yield {
+            "DR No": header.get("DR No",""),
+            "Order No": it.get("Order No",""),
+            "Part No": it.get("Part No",""),
+            "Part Name": it.get("Part Name",""),
+            "Qty": it.get("Qty",""),
+            "Unit Size": it.get("Unit Size",""),
+            "Box Type": it.get("Box Type",""),
+            "Branch": header.get("Branch",""),
+            "Buyer Order No": header.get("Buyer Order No",""),
+            "Vehicle No": header.get("Vehicle No",""),
+            "Kanban": it.get("Kanban",""),
+            "Crate Details": header.get("Crate Details","")
+        }
+
+def blank_rows():
+    yield {col: "" for col in EXCEL_COLUMNS}
+
+def extract(pdf_path, ocr_workers=1):
+    """
+    Run table -> text -> OCR strategies against one path or open PDFDocument.
+    Returns (header, items, strategy) where strategy is 'table', 'text',
+    'ocr' or None when no readable text was found.
+    """
+    print("Attempting table extraction...")
+    header_info, table_rows = try_tables(pdf_path)
+    
+    if table_rows:
+        header = {
+            'DR No': header_info.get('DR No', ''),
+            'Branch': header_info.get('Branch', ''),
+            'Buyer Order No': table_rows[0].get('Order No', '') if table_rows else '',
+            'Vehicle No': '',
+            'Crate Details': ''
+        }
+        metrics.record_extraction('cli', 'table')
+        return header, table_rows, 'table'
+
+    print("No useful tables found — trying text extraction (OCR for pages without text)...")
+    t, ocr_page_nums = text_with_page_ocr(pdf_path, workers=ocr_workers)
+    if ocr_page_nums:
+        print(f"OCR used for page(s): {', '.join(str(i + 1) for i in ocr_page_nums)}")
+
+    if len(t.strip()) < 50:
+        print("ERROR: Could not extract readable text from PDF. Please try a scanned-high-res PDF or enable better scan quality.")
+        metrics.record_extraction('cli', None)
+        return {}, [], None
+
+    header, items = parse_from_text(t)
+    strategy = 'ocr' if ocr_page_nums else 'text'
+    metrics.record_extraction('cli', strategy)
+    return header, items, strategy
+
+def extract_file(pdf_path, ocr_workers=1):
+    """Open the PDF once, run extract() on it and close it"""
+    try:
+        doc = PDFDocument(pdf_path)
+    except Exception as e:
+        print(f"PDF open error: {e}")
+        doc = None
+    try:
+        return extract(doc if doc is not None else pdf_path, ocr_workers)
+    finally:
+        if doc is not None:
+            doc.close()
+
+def main(pdf_path, out_xlsx, ocr_workers=1):
+    header, items, strategy = extract_file(pdf_path, ocr_workers)
+    rows = blank_rows() if strategy is None else iter_rows(header, items)
+    if strategy is not None:
+        record_dr(header, items, 'cli', pdf_path)
+
+    try:
+        count = write_xlsx(out_xlsx, [("Sheet1", EXCEL_COLUMNS, rows, NUMERIC_COLUMNS)])
+        if strategy is None:
+            print(f"Saved blank template to help manual fill: {out_xlsx}")
+        else:
+            source = " from table extraction" if strategy == 'table' else ""
+            print(f"Saved {count} rows{source} to {out_xlsx}")
+    except PermissionError:
+        print(f"ERROR: Cannot write to {out_xlsx}. File may be open in Excel. Please close it and try again.")
+        sys.exit(1)
+
+# =====================================================
+# BATCH MODE
+# =====================================================
+
+def find_pdfs(source):
+    """PDFs in a directory, or matching a glob pattern, in sorted order"""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "*.pdf")
+    else:
+        pattern = source
+    return sorted(p for p in glob.glob(pattern) if p.lower().endswith(".pdf"))
+
+def _batch_worker(pdf_path):
+    """
+    Extract one file for run_batch; runs in a worker process with its output silenced.
+    The file's metric events go back in result["metrics"] for the parent to replay.
+    """
+    start = time.perf_counter()
+    result = {"file": pdf_path, "header": {}, "items": [], "strategy": None, "error": "", "metrics": []}
+    hook = metrics.add_hook(lambda name, value, labels: result["metrics"].append((name, value, labels)))
+    try:
+        with redirect_stdout(io.StringIO()):
+            result["header"], result["items"], result["strategy"] = extract_file(pdf_path)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        metrics.remove_hook(hook)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def _sheet_name(name, used):
+    """Excel sheet names: max 31 chars, no []:*?/\\ and unique within the workbook"""
+    base = re.sub(r'[\[\]:*?/\\]', '_', name)[:31] or "DR"
+    sheet = base
+    n = 2
+    while sheet.lower() in used:
+        suffix = f"_{n}"
+        sheet = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(sheet.lower())
+    return sheet
+
+def run_batch(source, out_xlsx, workers=None, sheet_per_dr=False, report_path=None):
+    """
+    Extract every PDF in a directory or glob with a process pool and write
+    one combined workbook (or one sheet per DR) plus a CSV status/timing report.
+    Files are processed with single-process OCR; parallelism is across files.
+    """
+    files = find_pdfs(source)
+    if not files:
+        print(f"No PDF files found for {source}")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Processing {len(files)} PDF(s) with {workers} worker(s)...")
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_batch_worker, f): f for f in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            pdf_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"file": pdf_path, "header": {}, "items": [], "strategy": None,
+                          "error": str(e), "seconds": 0.0}
+            results[pdf_path] = result
+            metrics.replay(result.pop("metrics", []))
+            status = "error" if result["error"] else (result["strategy"] or "no text")
+            print(f"[{done}/{len(files)}] {os.path.basename(pdf_path)}: {status} ({result['seconds']:.2f}s)")
+    results = [results[f] for f in files]
+    record_drs([(r["header"], r["items"], r["file"]) for r in results if r["strategy"] is not None], 'cli')
+
+    def result_rows(result):
+        if result["strategy"] is None:
+            return blank_rows()
+        return iter_rows(result["header"], result["items"])
+
+    try:
+        if sheet_per_dr:
+            used = set()
+            sheets = (
+                (_sheet_name(result["header"].get("DR No") or os.path.splitext(os.path.basename(result["file"]))[0], used),
+                 EXCEL_COLUMNS, result_rows(result), NUMERIC_COLUMNS)
+                for result in results
+            )
+        else:
+            sheets = [("Sheet1", EXCEL_COLUMNS,
+                       (row for result in results for row in result_rows(result)), NUMERIC_COLUMNS)]
+        write_xlsx(out_xlsx, sheets)
+    except PermissionError:
+        print(f"ERROR: Cannot write to {out_xlsx}. File may be open in Excel. Please close it and try again.")
+        sys.exit(1)
+
+    if report_path is None:
+        report_path = os.path.splitext(out_xlsx)[0] + "_report.csv"
+    with open(report_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["File", "DR No", "Status", "Strategy", "Rows", "Seconds", "Error"])
+        for result in results:
+            if result["error"]:
+                status = "error"
+            elif result["strategy"] is None:
+                status = "no text"
+            elif not result["items"]:
+                status = "no items"
+            else:
+                status = "ok"
+            writer.writerow([
+                result["file"], result["header"].get("DR No", ""), status,
+                result["strategy"] or "", len(result["items"]),
+                f"{result['seconds']:.3f}", result["error"]
+            ])
+
+    ok = sum(1 for r in results if r["items"])
+    print(f"Saved {ok}/{len(results)} DR(s) to {out_xlsx} in {time.perf_counter() - start:.2f}s")
+    print(f"Report written to {report_path}")
+    return results
+
+# =====================================================
+# DAEMON MODE
+# =====================================================
+
+def _init_daemon_worker():
+    """Daemon workers load the OCR stack once, up front, instead of on their first scanned DR"""
+    _init_page_worker()
+    import ocr_engine
+
+def convert_job(job):
+    """
+    Run one daemon job in a worker process: extract job["pdf"], write
+    job["out"] (default: the PDF name with .xlsx) and record the DR.
+    Returns the reply: id, pdf, out, status, strategy, rows, seconds, stages, pages, error.
+    """
+    start = time.perf_counter()
+    pdf_path = job.get("pdf")
+    out_xlsx = job.get("out") or os.path.splitext(pdf_path)[0] + ".xlsx"
+    reply = {"id": job.get("id"), "pdf": pdf_path, "out": out_xlsx, "status": "error",
+             "strategy": None, "rows": 0, "error": ""}
+    if not os.path.isfile(pdf_path):
+        reply["error"] = f"File not found: {pdf_path}"
+        reply["seconds"] = round(time.perf_counter() - start, 4)
+        return reply
+    stages, pages = {}, {}
+
+    def collect(name, value, labels):
+        if name == metrics.STAGE_SECONDS.name:
+            stages[labels["stage"]] = stages.get(labels["stage"], 0.0) + value
+        elif name == metrics.PAGES.name:
+            pages[labels["stage"]] = pages.get(labels["stage"], 0) + value
+
+    metrics.add_hook(collect)
+    try:
+        with redirect_stdout(io.StringIO()):
+            header, items, strategy = extract_file(pdf_path)
+            if strategy is not None:
+                record_dr(header, items, 'daemon', pdf_path)
+            rows = blank_rows() if strategy is None else iter_rows(header, items)
+            write_xlsx(out_xlsx, [("Sheet1", EXCEL_COLUMNS, rows, NUMERIC_COLUMNS)])
+        reply["strategy"] = strategy
+        reply["rows"] = len(items)
+        reply["status"] = "no text" if strategy is None else ("ok" if items else "no items")
+    except Exception as e:
+        reply["error"] = str(e)
+    finally:
+        metrics.remove_hook(collect)
+    reply["seconds"] = round(time.perf_counter() - start, 4)
+    reply["stages"] = {name: round(seconds, 4) for name, seconds in stages.items()}
+    reply["pages"] = pages
+    return reply
+
+class DRDaemon:
+    """
+    Warm process pool serving conversion jobs given as JSON lines.
+    Workers keep their imports and learned layout templates between jobs.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_daemon_worker)
+
+    def submit(self, line, reply):
+        """
+        Start the job on one JSON line; reply(dict) is called when it finishes
+        (or at once if the line is rejected). Returns an Event set after the reply.
+        """
+        replied = threading.Event()
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or not job.get("pdf"):
+                raise ValueError('expected {"pdf": ..., "out": ...}')
+        except ValueError as e:
+            reply({"id": None, "status": "error", "error": f"Bad job: {e}"})
+            replied.set()
+            return replied
+
+        def done(future):
+            try:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"id": job.get("id"), "pdf": job.get("pdf"), "status": "error", "error": str(e)}
+                reply(result)
+            except Exception as e:
+                print(f"Daemon reply error: {e}", file=sys.stderr)
+            finally:
+                replied.set()
+
+        self.pool.submit(convert_job, job).add_done_callback(done)
+        return replied
+
+    def serve_lines(self, lines, out):
+        """Run every job in lines concurrently, writing each reply to out as a JSON line"""
+        lock = threading.Lock()
+
+        def reply(result):
+            with lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+
+        pending = []
+        for line in lines:
+            if line.strip():
+                pending = [e for e in pending if not e.is_set()]
+                pending.append(self.submit(line, reply))
+        for replied in pending:
+            replied.wait()
+
+    def close(self):
+        self.pool.shutdown()
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """One client connection: JSON-line jobs in, JSON-line replies out"""
+
+    def handle(self):
+        out = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+        self.server.dr_daemon.serve_lines((line.decode("utf-8") for line in self.rfile), out)
+
+def run_daemon(workers=None, listen=None):
+    """
+    Serve jobs from stdin, or from clients of a local socket when listen is
+    given: a Unix socket path, or host:port / port for TCP on this machine.
+    """
+    daemon = DRDaemon(workers)
+    try:
+        if not listen:
+            print(f"DR daemon: {daemon.workers} worker(s), reading jobs from stdin", file=sys.stderr)
+            daemon.serve_lines(sys.stdin, sys.stdout)
+            return
+
+        if ":" in listen or listen.isdigit():
+            host, _, port = listen.rpartition(":")
+            server = socketserver.ThreadingTCPServer((host or "127.0.0.1", int(port)), _JobHandler)
+        else:
+            if os.path.exists(listen):
+                os.remove(listen)  # stale socket from an earlier run
+            server = socketserver.ThreadingUnixStreamServer(listen, _JobHandler)
+        server.daemon_threads = True
+        server.dr_daemon = daemon
+        print(f"DR daemon: {daemon.workers} worker(s), listening on {listen}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if isinstance(server.server_address, str) and os.path.exists(listen):
+                os.remove(listen)
+    finally:
+        daemon.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert TAFE Delivery Request PDFs to Excel")
+    parser.add_argument("input_pdf", nargs="?", help="input PDF, or a directory/glob with --batch")
+    parser.add_argument("output_xlsx", nargs="?")
+    parser.add_argument("--ocr-workers", type=int, default=1,
+                        help="processes used to OCR scanned pages in parallel (default: 1)")
+    parser.add_argument("--batch", action="store_true",
+                        help="treat input_pdf as a directory or glob and convert every PDF in one run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="batch and daemon mode: files processed concurrently (default: CPU count)")
+    parser.add_argument("--sheet-per-dr", action="store_true",
+                        help="batch mode: one sheet per DR instead of one combined sheet")
+    parser.add_argument("--report", default=None,
+                        help="batch mode: status/timing CSV (default: <output>_report.csv)")
+    parser.add_argument("--timings", action="store_true",
+                        help="print time spent per stage (tables, text, OCR, Excel) and page counts")
+    parser.add_argument("--daemon", action="store_true",
+                        help='stay running and convert JSON-line jobs {"pdf": ..., "out": ...} from stdin')
+    parser.add_argument("--listen", default=None,
+                        help="daemon mode: take jobs on a Unix socket path or [host:]port instead of stdin")
+    args = parser.parse_args()
+    if args.daemon:
+        run_daemon(args.workers, args.listen)
+        sys.exit(0)
+    if not args.input_pdf or not args.output_xlsx:
+        parser.error("input_pdf and output_xlsx are required (or use --daemon)")
+    totals = metrics.add_hook(metrics.StageTotals()) if args.timings else None
+    if args.batch:
+        run_batch(args.input_pdf, args.output_xlsx, args.workers, args.sheet_per_dr, args.report)
+    else:
+        main(args.input_pdf, args.output_xlsx, args.ocr_workers)
+    if totals:
+        print(totals.report())
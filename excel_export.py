@@ -0,0 +1,94 @@
+"""
+excel_export.py
+Streaming .xlsx writer for DR exports.
+
+Rows come from any iterable (typically a generator) and go straight into an
+openpyxl write-only workbook, which spools each sheet to a temporary file
+instead of keeping cell objects in memory. Memory stays flat however many
+rows an export has. Numeric columns (Qty, Unit Size, Kanban, ...) are
+written as numbers, so Excel can sum and filter them.
+
+  write_xlsx(out, sheets)   out: path or binary file object
+  stream_xlsx(sheets)       yields the finished file in chunks (HTTP responses)
+
+sheets is an iterable of (sheet name, columns, rows, numeric columns);
+each row is a list in column order or a dict keyed by column name.
+openpyxl is imported on the first export, not with this module.
+"""
+
+import os
+import tempfile
+
+import metrics
+
+CHUNK_SIZE = 64 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def to_number(value):
+    """
+    Cell value for a numeric column: '12' -> 12, '2.5' -> 2.5, '' -> None.
+    Text that is not a number (e.g. '12 NOS') is kept as text.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().replace(',', '')
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return str(value)
+
+
+def _row_values(row, columns, numeric):
+    if isinstance(row, dict):
+        row = [row.get(col, '') for col in columns]
+    return [to_number(v) if i in numeric else v for i, v in enumerate(row)]
+
+
+def write_xlsx(out, sheets):
+    """
+    Write sheets of (name, columns, rows, numeric columns) to out, a path or
+    binary file object. Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+    with metrics.stage('excel_write'):
+        wb = Workbook(write_only=True)
+        count = 0
+        for name, columns, rows, numeric in sheets:
+            ws = wb.create_sheet(title=name)
+            ws.append(list(columns))
+            numeric = {i for i, col in enumerate(columns) if col in set(numeric)}
+            for row in rows:
+                ws.append(_row_values(row, columns, numeric))
+                count += 1
+        if not wb.worksheets:
+            wb.create_sheet()
+        wb.save(out)
+    return count
+
+
+def stream_xlsx(sheets, tmp_dir=None):
+    """
+    Generator of the .xlsx bytes for sheets, in CHUNK_SIZE pieces.
+    The workbook is built in a temporary file that is removed once the
+    last chunk has been sent (or the client goes away).
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx', dir=tmp_dir)
+    os.close(fd)
+    try:
+        write_xlsx(path, sheets)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
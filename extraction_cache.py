@@ -0,0 +1,182 @@
+"""
+extraction_cache.py
+Persistent cache of DR extraction results, shared by the CLI and both Flask apps.
+
+Entries are keyed by the SHA-256 of the input (PDF bytes, or text for
+parse_from_text) plus the extractor name and EXTRACTOR_VERSION, and stored
+as JSON in a SQLite file. When the stored size passes the limit, the least
+recently used entries are evicted.
+
+Environment:
+  DR_CACHE_DIR       directory holding extraction_cache.db (default: cache)
+  DR_CACHE_MAX_MB    size limit before LRU eviction (default: 256)
+  DR_CACHE_DISABLED  set to 1 to turn the cache off
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+import threading
+
+import metrics
+
+# Bump whenever extraction logic changes so stale results are never served
+EXTRACTOR_VERSION = "2"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(source):
+    """
+    SHA-256 of a PDF given as a path, a file-like object, or any object
+    that already knows its hash (PDFDocument, uploaded buffers).
+    """
+    known = getattr(source, 'sha256', None)
+    if known:
+        return known
+
+    h = hashlib.sha256()
+    if hasattr(source, 'read'):
+        pos = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+        source.seek(pos)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """SQLite-backed JSON cache with size-based LRU eviction"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads and processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache configured from the environment, or None if disabled"""
+    global _cache
+    if os.environ.get('DR_CACHE_DISABLED') == '1':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            directory = os.environ.get('DR_CACHE_DIR', 'cache')
+            max_mb = float(os.environ.get('DR_CACHE_MAX_MB', 256))
+            _cache = ExtractionCache(os.path.join(directory, 'extraction_cache.db'),
+                                     int(max_mb * 1024 * 1024))
+    return _cache
+
+
+def is_empty(result):
+    """
+    True for None and for results with nothing in them: ({}, []) from try_tables,
+    a details dict whose fields are all blank. The extractors return these
+    when they fail, so they are never cached.
+    """
+    if isinstance(result, dict):
+        return not any(result.values())
+    if isinstance(result, (tuple, list)):
+        return not any(result)
+    return not result
+
+
+def cached(name, key_func=file_sha256):
+    """
+    Decorator: consult the extraction cache before running an extractor.
+    The key is key_func(first argument) + name + EXTRACTOR_VERSION.
+    Empty results (is_empty) are not cached, so a one-off failure is retried
+    on the next call; tuples round-trip as tuples.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(source, *args, **kwargs):
+            try:
+                cache = get_cache()
+                key = f"{key_func(source)}:{name}:{EXTRACTOR_VERSION}" if cache else None
+            except Exception as e:
+                print(f"Extraction cache unavailable: {e}")
+                cache = None
+
+            if cache:
+                try:
+                    hit = cache.get(key)
+                except Exception as e:
+                    print(f"Extraction cache read error: {e}")
+                    hit = None
+                metrics.CACHE_LOOKUPS.inc(extractor=name, result='miss' if hit is None else 'hit')
+                if hit is not None:
+                    return tuple(hit['value']) if hit['tuple'] else hit['value']
+
+            result = func(source, *args, **kwargs)
+
+            if cache and not is_empty(result):
+                try:
+                    cache.set(key, {'tuple': isinstance(result, tuple), 'value': result})
+                except Exception as e:
+                    print(f"Extraction cache write error: {e}")
+            return result
+        return wrapper
+    return decorator
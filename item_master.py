@@ -0,0 +1,342 @@
+"""
+item_master.py
+Stock item master (part no -> name, HSN, GST rate, rate) for invoice generation.
+
+The source is a CSV or Excel sheet, or a Tally stock-item XML export. It is
+imported once into an indexed SQLite file. Lookups go through a small
+in-process LRU to that file, so no worker holds the whole master (tens of
+thousands of items) in memory. Repeated parts are O(1) dict hits; misses
+are one primary-key lookup.
+
+When the source file's mtime or size changes, the next lookup (checked at
+most every CHECK_INTERVAL seconds) re-imports it into a fresh database file
+named after that version (item_master.<hash>.db). Readers switch to the new
+file on their next lookup; the old one is never replaced while it is open,
+which Windows does not allow. No server restart is needed, and every worker
+process picks up the new file. A failed import keeps the current database
+and is retried on the next check.
+
+Environment:
+  ITEM_MASTER_PATH   CSV/xlsx/xml source (unset: only the built-in items are known)
+  ITEM_MASTER_DB     SQLite file name; versions are stored next to it
+                     (default: DR_CACHE_DIR/item_master.db)
+  ITEM_MASTER_CACHE  LRU size in items (default: 4096)
+"""
+
+import os
+import re
+import csv
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.request import pathname2url
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+
+CHECK_INTERVAL = 2.0
+
+# Accepted column headings (lower-case; spaces, underscores, dots and slashes ignored)
+COLUMN_ALIASES = {
+    'part_no': ['partno', 'partnumber', 'itemcode', 'code', 'stockitem'],
+    'name': ['name', 'partname', 'itemname', 'description', 'stockitemname'],
+    'hsn': ['hsn', 'hsncode', 'hsnsac', 'hsnsaccode'],
+    'gst': ['gst', 'gstrate', 'gst%', 'taxrate', 'igstrate'],
+    'rate': ['rate', 'price', 'standardrate', 'standardprice', 'sellingprice'],
+}
+
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+_MISSING = object()
+
+
+def _number(value):
+    """Leading number of a cell such as '2003.30', '2003.30/NOS' or '18 %'; None if there is none"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = NUMBER_RE.search(str(value).replace(',', ''))
+    return float(m.group()) if m else None
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Numeric part numbers / HSN codes read from Excel
+        return str(int(value))
+    return str(value).strip()
+
+
+def _columns(header):
+    """Map item fields to column positions for a header row"""
+    keys = [re.sub(r'[\s_./]+', '', _text(h).lower()) for h in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for i, key in enumerate(keys):
+            if key in aliases:
+                columns[field] = i
+                break
+    if 'part_no' not in columns:
+        raise ValueError(f"Item master has no part number column (header: {header})")
+    return columns
+
+
+def _rows_from_table(rows):
+    """Item tuples from header + data rows (CSV or Excel)"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = _columns(header)
+    for row in rows:
+        def cell(field):
+            i = columns.get(field)
+            return row[i] if i is not None and i < len(row) else None
+        part_no = _text(cell('part_no'))
+        if part_no:
+            yield (part_no, _text(cell('name')), _text(cell('hsn')),
+                   _number(cell('gst')), _number(cell('rate')))
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from _rows_from_table(csv.reader(f))
+
+
+def _read_excel(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _rows_from_table(wb.active.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def _read_tally_xml(path):
+    """
+    STOCKITEM entries of a Tally export. The part number is PARTNO/PARTNUMBER,
+    else the item's alias, else its name. GST is the integrated tax rate
+    (or the highest GSTRATE), and the rate is the standard selling price.
+    """
+    for _, elem in ET.iterparse(path):
+        if elem.tag != 'STOCKITEM':
+            continue
+        name = elem.get('NAME') or elem.findtext('NAME') or ''
+        names = [n.text.strip() for n in elem.iter('NAME') if n.text and n.text.strip()]
+        aliases = [n for n in names if n != name]
+        part_no = (elem.findtext('.//PARTNO') or elem.findtext('.//PARTNUMBER')
+                   or (aliases[0] if aliases else name))
+        hsn = elem.findtext('.//HSNCODE') or ''
+
+        gst = None
+        for detail in elem.iter('RATEDETAILS.LIST'):
+            rate = _number(detail.findtext('GSTRATE'))
+            head = (detail.findtext('GSTRATEDUTYHEAD') or '').lower()
+            if rate is not None and ('integrated' in head or gst is None or rate > gst):
+                gst = rate
+                if 'integrated' in head:
+                    break
+
+        price = None
+        for price_list in elem.iter('STANDARDPRICELIST.LIST'):
+            price = _number(price_list.findtext('RATE'))
+        if price is None:
+            price = _number(elem.findtext('.//RATE'))
+
+        if part_no.strip():
+            yield (part_no.strip(), name.strip(), hsn.strip(), gst, price)
+        elem.clear()
+
+
+def read_items(path):
+    """Item tuples (part_no, name, hsn, gst, rate) from a CSV, Excel or Tally XML file"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return _read_csv(path)
+    if ext in ('.xlsx', '.xlsm'):
+        return _read_excel(path)
+    if ext == '.xml':
+        return _read_tally_xml(path)
+    raise ValueError(f"Unsupported item master format: {path}")
+
+
+class ItemMaster:
+    """Item master backed by an indexed SQLite import of the source file, with an LRU in front"""
+
+    def __init__(self, source_path, db_path, cache_size=4096, check_interval=CHECK_INTERVAL):
+        self.source_path = source_path
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._signature = None
+        self._db_file = None
+        self._last_check = 0.0
+        # Per-thread read connection, reopened after each reload (the file is replaced)
+        self._local = threading.local()
+        self._generation = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._check_source(force=True)
+
+    def _version_path(self, key):
+        """Database file for one version of the source"""
+        base, ext = os.path.splitext(self.db_path)
+        return f"{base}.{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}{ext or '.db'}"
+
+    @staticmethod
+    def _connect(path):
+        # Read-only, so a version removed by another process fails instead of coming back empty
+        return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, timeout=30)
+
+    def _reader(self):
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            if getattr(local, 'conn', None) is not None:
+                local.conn.close()
+            local.conn = self._connect(self._db_file)
+            local.generation = self._generation
+        return local.conn
+
+    def _source_signature(self):
+        st = os.stat(self.source_path)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    @classmethod
+    def _stored_signature(cls, path):
+        try:
+            conn = cls._connect(path)
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            finally:
+                conn.close()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+
+    def _check_source(self, force=False):
+        """Re-import the source if it changed since the database was built"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            signature = self._source_signature()
+        except OSError as e:
+            print(f"Item master source unavailable: {e}")
+            return
+        if signature == self._signature:
+            return
+
+        with self._reload_lock:
+            if signature == self._signature:
+                return
+            key = f"{os.path.abspath(self.source_path)}|{signature}"
+            path = self._version_path(key)
+            # Another worker process may already have imported this version
+            if self._stored_signature(path) != key and not self._import(key, path):
+                return
+            previous = self._db_file
+            self._db_file = path
+            self._signature = signature
+            with self._lock:
+                self._cache.clear()
+                self._generation += 1
+        if previous and previous != path:
+            try:
+                os.remove(previous)
+            except OSError:
+                pass  # still open elsewhere (Windows); left for a later cleanup
+
+    def _import(self, key, path):
+        """Import the source into path; False (and the error printed) if it failed"""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.execute("CREATE TABLE items (part_no TEXT PRIMARY KEY, name TEXT, hsn TEXT, gst REAL, rate REAL)")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)", read_items(self.source_path))
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (key,))
+            conn.commit()
+            count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        except Exception as e:
+            conn.close()
+            os.remove(tmp)
+            print(f"Item master import error: {e}")
+            return False
+        conn.close()
+        try:
+            os.replace(tmp, path)
+        except OSError as e:
+            os.remove(tmp)
+            # On Windows this fails when another process already put the same version in place
+            if self._stored_signature(path) != key:
+                print(f"Item master import error: {e}")
+                return False
+        print(f"Item master: {count} items loaded from {self.source_path}")
+        return True
+
+    def _lookup(self, part_no):
+        return self._reader().execute(
+            "SELECT name, hsn, gst, rate FROM items WHERE part_no = ?", (part_no,)
+        ).fetchone()
+
+    def get(self, part_no):
+        """
+        {'name', 'hsn', 'gst', 'rate'} for a part number, or None if it is not
+        in the master. Blank cells come back as '' / None.
+        """
+        self._check_source()
+        with self._lock:
+            item = self._cache.get(part_no, _MISSING)
+            if item is not _MISSING:
+                self._cache.move_to_end(part_no)
+                return item
+        if self._db_file is None:
+            return None
+
+        try:
+            row = self._lookup(part_no)
+        except sqlite3.Error:
+            # This version may have been superseded and removed by another process
+            self._check_source(force=True)
+            try:
+                row = self._lookup(part_no)
+            except sqlite3.Error as e:
+                print(f"Item master lookup error: {e}")
+                return None
+
+        item = None
+        if row:
+            gst = row[2]
+            if gst is not None and float(gst).is_integer():
+                gst = int(gst)
+            item = {'name': row[0], 'hsn': row[1], 'gst': gst, 'rate': row[3]}
+
+        with self._lock:
+            self._cache[part_no] = item
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return item
+
+
+_master = None
+_master_lock = threading.Lock()
+
+
+def get_item_master():
+    """Process-wide ItemMaster configured from the environment, or None if ITEM_MASTER_PATH is unset"""
+    global _master
+    path = os.environ.get('ITEM_MASTER_PATH')
+    if not path:
+        return None
+    with _master_lock:
+        if _master is None:
+            db_path = os.environ.get('ITEM_MASTER_DB') or os.path.join(
+                os.environ.get('DR_CACHE_DIR', 'cache'), 'item_master.db')
+            _master = ItemMaster(path, db_path, int(os.environ.get('ITEM_MASTER_CACHE', 4096)))
+    return _master
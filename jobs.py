@@ -0,0 +1,222 @@
+"""
+jobs.py
+Background extraction jobs with progress reporting for the Flask apps.
+
+A JobManager runs submitted functions on a bounded thread pool and keeps
+their status, per-page progress and result in memory until they expire.
+Each job function receives its Job and calls job.progress(done, total)
+as pages are processed; waiters (status polling or server-sent events)
+are woken on every update.
+
+With several server worker processes, the poll or event stream for a job
+may reach a different process than the one running it. A JobManager given
+a SQLiteJobStore also writes every update to that shared file, and get()
+falls back to it for jobs running elsewhere (StoredJob, which polls).
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+class Job:
+    """One background job: status, progress, result and error; owner is who may read it"""
+
+    def __init__(self, name, owner=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.owner = owner
+        self.status = 'queued'
+        self.stage = ''
+        self.pages_done = 0
+        self.pages_total = 0
+        self.result = None
+        self.error = ''
+        self.created = time.time()
+        self.finished = None
+        self.version = 0
+        self.store = None
+        self._cond = threading.Condition()
+
+    def _update(self, **fields):
+        with self._cond:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._cond.notify_all()
+        if self.store is not None:
+            self.store.save(self)
+
+    def progress(self, pages_done, pages_total, stage=None):
+        """Report pages processed so far; called from the job function"""
+        fields = {'pages_done': pages_done, 'pages_total': pages_total}
+        if stage is not None:
+            fields['stage'] = stage
+        self._update(**fields)
+
+    def set_stage(self, stage):
+        self._update(stage=stage)
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def wait_for_change(self, version, timeout=15):
+        """Block until the job changes past version (or timeout); returns the new version"""
+        with self._cond:
+            if self.version == version and not self.done:
+                self._cond.wait(timeout)
+            return self.version
+
+    def to_dict(self, include_result=True):
+        data = {
+            'job_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': {
+                'pages_done': self.pages_done,
+                'pages_total': self.pages_total,
+            },
+            'error': self.error,
+        }
+        if include_result and self.status == 'done':
+            data['result'] = self.result
+        return data
+
+    def state(self):
+        """Every field, for a SQLiteJobStore"""
+        return {key: getattr(self, key) for key in STATE_FIELDS}
+
+
+STATE_FIELDS = ('id', 'name', 'owner', 'status', 'stage', 'pages_done', 'pages_total',
+                'result', 'error', 'created', 'finished', 'version')
+
+
+class StoredJob(Job):
+    """A job running in another worker process, read from the shared store"""
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, store, state):
+        super().__init__(state['name'])
+        self._store = store
+        self.__dict__.update(state)
+
+    def wait_for_change(self, version, timeout=15):
+        deadline = time.time() + timeout
+        while self.version == version and not self.done and time.time() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            state = self._store.load(self.id)
+            if state is not None:
+                self.__dict__.update(state)
+        return self.version
+
+
+class SQLiteJobStore:
+    """Job states in a local SQLite file, shared by all worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " finished REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, job):
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO jobs (id, state, finished) VALUES (?, ?, ?)",
+                             (job.id, json.dumps(job.state()), job.finished))
+        except Exception as e:
+            print(f"Job store error: {e}")
+
+    def load(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self, cutoff):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE finished < ?", (cutoff,))
+
+
+class JobManager:
+    """
+    Bounded pool of background workers plus an in-memory job registry,
+    optionally mirrored to a SQLiteJobStore shared with other processes.
+    max_pending applies per process.
+    """
+
+    def __init__(self, max_workers=2, max_pending=50, ttl=3600, store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args, owner=None, **kwargs):
+        """
+        Queue func(job, *args, **kwargs) on behalf of owner (e.g. a session id);
+        raises JobQueueFull when the queue is at capacity
+        """
+        self._prune()
+        job = Job(name, owner)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.done)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs already pending")
+            self._jobs[job.id] = job
+        if self.store is not None:
+            job.store = self.store
+            self.store.save(job)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        job._update(status='running')
+        try:
+            result = func(job, *args, **kwargs)
+            job._update(status='done', result=result, finished=time.time())
+        except Exception as e:
+            job._update(status='failed', error=str(e), finished=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            state = self.store.load(job_id)
+            if state is not None:
+                job = StoredJob(self.store, state)
+        return job
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [jid for jid, j in self._jobs.items() if j.finished and j.finished < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+        if self.store is not None:
+            try:
+                self.store.prune(cutoff)
+            except Exception as e:
+                print(f"Job store error: {e}")
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
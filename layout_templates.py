@@ -0,0 +1,226 @@
+"""
+layout_templates.py
+Learned layout templates for fast DR table extraction.
+
+All extractors only use the first table on a page. Finding it
+(page.extract_tables) is the most expensive pdfplumber step, yet our DRs
+come from a handful of fixed TAFE layouts. A page is fingerprinted from the
+positions of its header labels, read straight from page.chars (grouping the
+characters is far cheaper than extract_words). The first time a fingerprint
+is seen the table is detected normally and its bounding box, column
+x-positions and cell geometry are remembered. One layout can have several
+table boxes (a short last page), each with its own ruling variants. Later
+pages with the same fingerprint and the same row/column rulings read their
+cells directly, without table detection. Unknown layouts fall back to the
+normal path.
+
+Templates are kept per process and saved to DR_CACHE_DIR/layout_templates.json.
+A save first merges in the templates other processes (server workers, CLI
+runs) have saved since, so concurrent writers do not drop each other's.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from bisect import bisect_left
+
+from pdfplumber import utils
+from pdfplumber.table import Table
+
+# Words that label the fixed parts of a TAFE DR form
+HEADER_LABELS = {
+    "Delivery", "Request", "Supplier", "Shipping", "Receiving", "Departure",
+    "Arrival", "Order", "Part", "Name", "Remark", "Qty", "Shipped", "Delay",
+}
+
+# Characters closer than this (in points) belong to the same word, as in extract_words
+WORD_TOLERANCE = 3
+# Table boxes remembered per layout
+MAX_TABLES = 8
+
+_templates = None
+_lock = threading.Lock()
+
+
+def _templates_path():
+    return os.path.join(os.environ.get('DR_CACHE_DIR', 'cache'), 'layout_templates.json')
+
+
+def _load():
+    global _templates
+    if _templates is None:
+        try:
+            with open(_templates_path(), encoding='utf-8') as f:
+                _templates = json.load(f)
+        except (OSError, ValueError):
+            _templates = {}
+    return _templates
+
+
+def _save():
+    path = _templates_path()
+    try:
+        with open(path, encoding='utf-8') as f:
+            for fingerprint, template in json.load(f).items():
+                _templates.setdefault(fingerprint, template)
+    except (OSError, ValueError):
+        pass
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_templates, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Layout template save error: {e}")
+
+
+def _words(chars):
+    """(text, x0, top) of the words formed by runs of adjacent characters on one line"""
+    text, x0, top, x1 = '', 0, 0, 0
+    for c in chars:
+        if text and not c['text'].isspace() and abs(c['top'] - top) <= WORD_TOLERANCE \
+                and -WORD_TOLERANCE <= c['x0'] - x1 <= WORD_TOLERANCE:
+            text += c['text']
+            x1 = c['x1']
+            continue
+        if text:
+            yield text, x0, top
+        text, x0, top, x1 = ('', 0, 0, 0) if c['text'].isspace() else (c['text'], c['x0'], c['top'], c['x1'])
+    if text:
+        yield text, x0, top
+
+
+def page_fingerprint(page):
+    """
+    Hash of the page size and the header labels down to the first column
+    header row, with their positions. None if the page has no such labels
+    (e.g. scanned pages).
+    """
+    words = [w for w in _words(page.chars) if w[0] in HEADER_LABELS]
+    order_tops = [top for text, _, top in words if text == 'Order']
+    if not order_tops:
+        return None
+    limit = min(order_tops) + 20
+    labels = sorted(
+        (text, round(x0), round(top))
+        for text, x0, top in words if top <= limit
+    )
+    key = repr((round(page.width), round(page.height), labels))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _ruling_signature(page, bbox):
+    """
+    Row and column rulings across the table's span of the page. Only lines
+    covering a large share of the table count, so text-sized highlight boxes
+    do not change the signature, while extra or moved rows anywhere on the
+    page (e.g. a longer item table) do.
+    """
+    x0, top, x1, bottom = bbox
+    rows = {}
+    cols = {}
+    for e in page.edges:
+        if e['x0'] < x0 - 1 or e['x1'] > x1 + 1:
+            continue
+        if e['orientation'] == 'h':
+            y = round(e['top'], 1)
+            rows[y] = rows.get(y, 0) + e['x1'] - e['x0']
+        else:
+            x = round(e['x0'], 1)
+            cols[x] = cols.get(x, 0) + e['bottom'] - e['top']
+    width = x1 - x0
+    height = bottom - top
+    signature = (
+        sorted(y for y, covered in rows.items() if covered >= 0.5 * width),
+        sorted(x for x, covered in cols.items() if covered >= 0.1 * height),
+    )
+    return hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()
+
+
+def _learn(fingerprint, page, table):
+    cells = [list(c) for c in table.cells]
+    columns = sorted({round(c[0], 1) for c in cells} | {round(c[2], 1) for c in cells})
+    signature = _ruling_signature(page, table.bbox)
+    with _lock:
+        templates = _load()
+        template = templates.get(fingerprint)
+        if not template or 'tables' not in template:
+            template = templates[fingerprint] = {'tables': []}
+        tables = template['tables']
+        entry = next((t for t in tables if t['bbox'] == list(table.bbox)), None)
+        if entry is None:
+            # Same header labels, another table box (e.g. fewer rows): keep both
+            entry = {'bbox': list(table.bbox), 'columns': columns, 'variants': {}}
+            tables.append(entry)
+            del tables[:-MAX_TABLES]
+        entry['variants'][signature] = cells
+        _save()
+
+
+def _in_bbox(char, bbox):
+    x0, top, x1, bottom = bbox
+    h_mid = (char['x0'] + char['x1']) / 2
+    v_mid = (char['top'] + char['bottom']) / 2
+    return x0 <= h_mid < x1 and top <= v_mid < bottom
+
+
+def _extract(page, cells):
+    """
+    Same rows as Table(page, cells).extract(), but each row's characters are
+    found by bisecting the page's characters sorted by height instead of a
+    pass over every character of the page per row
+    """
+    chars = page.chars
+    mids = sorted(((c['top'] + c['bottom']) / 2, i) for i, c in enumerate(chars))
+    keys = [mid for mid, _ in mids]
+    rows = []
+    for row in Table(page, cells).rows:
+        x0, top, x1, bottom = row.bbox
+        span = sorted(i for _, i in mids[bisect_left(keys, top):bisect_left(keys, bottom)])
+        row_chars = [chars[i] for i in span if x0 <= (chars[i]['x0'] + chars[i]['x1']) / 2 < x1]
+        texts = []
+        for cell in row.cells:
+            if cell is None:
+                texts.append(None)
+                continue
+            cell_chars = [c for c in row_chars if _in_bbox(c, cell)]
+            texts.append(utils.extract_text(cell_chars) if cell_chars else "")
+        rows.append(texts)
+    return rows
+
+
+def _read_with_template(page, fingerprint):
+    with _lock:
+        template = _load().get(fingerprint)
+    for entry in (template or {}).get('tables', []):
+        cells = entry['variants'].get(_ruling_signature(page, entry['bbox']))
+        if cells:
+            return _extract(page, [tuple(c) for c in cells])
+    return None
+
+
+def first_table(page):
+    """
+    Rows of the first table on the page, same as page.extract_tables()[0],
+    or None if the page has no table.
+    """
+    try:
+        fingerprint = page_fingerprint(page)
+    except Exception as e:
+        print(f"Layout fingerprint error: {e}")
+        fingerprint = None
+
+    if fingerprint:
+        rows = _read_with_template(page, fingerprint)
+        if rows is not None:
+            return rows
+
+    tables = page.find_tables()
+    if not tables:
+        return None
+    table = tables[0]
+    if fingerprint:
+        _learn(fingerprint, page, table)
+    return table.extract()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+ledger.py
+Append-only ledger of extracted DRs and generated vouchers, shared by the
+CLI and both Flask apps.
+
+Every extraction appends the DR and its items, and every generated voucher
+is appended with its XML. Rows are never updated or deleted. A DR or
+voucher is recorded once per DR No + content hash, so re-uploading the
+same PDF or regenerating the same voucher adds nothing, while a changed
+DR (new items, edited quantities) is kept as a new version.
+
+Everything lives in one SQLite file (WAL mode, so several worker processes
+can append), indexed on DR No, Part No, Order No and date. Questions like
+"all DRs for part X this month" are an index range scan instead of a pass
+over thousands of DR_<no>.xlsx / INV_<no>.xml files.
+
+Environment:
+  LEDGER_DB        SQLite file (default: data/ledger.db)
+  LEDGER_DISABLED  set to 1 to stop recording
+
+Usage:
+  python ledger.py drs [--part-no X] [--order-no N] [--month 2026-10] [--from D] [--to D]
+  python ledger.py items [--dr-no N] [--part-no X] [--month 2026-10] [--limit 100]
+  python ledger.py vouchers [--dr-no N] [--month 2026-10]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import date, datetime
+import xml.etree.ElementTree as ET
+
+from excel_export import to_number
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS drs ("
+    " id INTEGER PRIMARY KEY,"
+    " dr_no TEXT NOT NULL,"
+    " content_hash TEXT NOT NULL,"
+    " date TEXT NOT NULL,"
+    " branch TEXT,"
+    " buyer_order_no TEXT,"
+    " source TEXT,"
+    " file TEXT,"
+    " recorded_at REAL NOT NULL,"
+    " UNIQUE (dr_no, content_hash))",
+    "CREATE TABLE IF NOT EXISTS items ("
+    " dr_id INTEGER NOT NULL REFERENCES drs(id),"
+    " line INTEGER NOT NULL,"
+    " dr_no TEXT NOT NULL,"
+    " date TEXT NOT NULL,"
+    " order_no TEXT,"
+    " part_no TEXT,"
+    " part_name TEXT,"
+    " box_type TEXT,"
+    " qty NUMERIC,"
+    " unit_size NUMERIC,"
+    " kanban NUMERIC,"
+    " PRIMARY KEY (dr_id, line))",
+    "CREATE TABLE IF NOT EXISTS vouchers ("
+    " id INTEGER PRIMARY KEY,"
+    " dr_no TEXT NOT NULL,"
+    " voucher_number TEXT,"
+    " content_hash TEXT NOT NULL,"
+    " date TEXT NOT NULL,"
+    " total_amount NUMERIC,"
+    " source TEXT,"
+    " xml TEXT NOT NULL,"
+    " recorded_at REAL NOT NULL,"
+    " UNIQUE (dr_no, content_hash))",
+    "CREATE INDEX IF NOT EXISTS idx_drs_date ON drs(date)",
+    "CREATE INDEX IF NOT EXISTS idx_items_dr_no ON items(dr_no)",
+    "CREATE INDEX IF NOT EXISTS idx_items_part_no_date ON items(part_no, date)",
+    "CREATE INDEX IF NOT EXISTS idx_items_order_no ON items(order_no)",
+    "CREATE INDEX IF NOT EXISTS idx_items_date ON items(date)",
+    "CREATE INDEX IF NOT EXISTS idx_vouchers_date ON vouchers(date)",
+]
+
+ITEM_COLUMNS = ['dr_no', 'date', 'order_no', 'part_no', 'part_name', 'box_type', 'qty', 'unit_size', 'kanban']
+
+
+def content_hash(value):
+    """SHA-256 of a JSON-able value in canonical form"""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def iso_date(value=None):
+    """ISO date for a date/datetime, a 'dd-mm-yyyy' or ISO string; today if empty"""
+    if not value:
+        return date.today().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date: {value}")
+
+
+def date_range(month=None, date_from=None, date_to=None):
+    """
+    (first, last) ISO dates for the filters; month is 'YYYY-MM' (or 'this'),
+    date_from/date_to are inclusive. Either end is None when unbounded.
+    """
+    if month:
+        if month == 'this':
+            month = date.today().strftime('%Y-%m')
+        try:
+            first = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            raise ValueError(f"Month must be YYYY-MM: {month}")
+        next_month = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+        return first.isoformat(), date.fromordinal(next_month.toordinal() - 1).isoformat()
+    return (iso_date(date_from) if date_from else None,
+            iso_date(date_to) if date_to else None)
+
+
+def _item_fields(item):
+    """Ledger item fields from either item shape (CLI 'Qty' or app 'Quantity')"""
+    qty = item.get('Qty', item.get('Quantity', ''))
+    return {
+        'order_no': item.get('Order No', ''),
+        'part_no': item.get('Part No', ''),
+        'part_name': item.get('Part Name', ''),
+        'box_type': item.get('Box Type', ''),
+        'qty': to_number(qty),
+        'unit_size': to_number(item.get('Unit Size', '')),
+        'kanban': to_number(item.get('Kanban', '')),
+    }
+
+
+def _voucher_fields(voucher):
+    """dr_no, voucher number, date and total of a generated VOUCHER element"""
+    reference = voucher.findtext('REFERENCENUMBER') or ''
+    dr_no = reference[3:] if reference[:3] in ('DR_', 'DR-') else reference
+    try:
+        voucher_date = iso_date(voucher.findtext('DATE'))
+    except ValueError:
+        voucher_date = iso_date()
+    return {
+        'dr_no': dr_no,
+        'voucher_number': voucher.findtext('VOUCHERNUMBER') or '',
+        'date': voucher_date,
+        'total_amount': to_number(voucher.findtext('TOTALS/TOTALAMOUNT') or ''),
+    }
+
+
+def voucher_hash(voucher):
+    """
+    Content hash of a VOUCHER element without its DATE (the generation day),
+    so regenerating the same DR on another day is not a new voucher
+    """
+    content = ET.Element(voucher.tag, voucher.attrib)
+    content.extend(child for child in voucher if child.tag != 'DATE')
+    return content_hash(ET.tostring(content, encoding='unicode'))
+
+
+class Ledger:
+    """SQLite ledger: drs + items (one row per DR line) + vouchers"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # -- appending --
+
+    def append_drs(self, entries, source, when=None):
+        """
+        Record DRs given as (header, items, file) tuples, in one transaction.
+        header holds 'DR No', 'Branch', 'Buyer Order No'; items are DR line
+        dicts. Returns the number of DRs that were new.
+        """
+        day = iso_date(when)
+        added = 0
+        with self._connect() as conn:
+            for header, items, file in entries:
+                dr_no = str(header.get('DR No', '') or '')
+                if not dr_no:
+                    continue
+                lines = [_item_fields(item) for item in items or []]
+                branch = header.get('Branch', '')
+                buyer_order_no = header.get('Buyer Order No', '')
+                # Kanban is left out: only the CLI extracts it, and the same DR should match across sources
+                digest = content_hash([branch, buyer_order_no,
+                                       [{k: v for k, v in line.items() if k != 'kanban'} for line in lines]])
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO drs (dr_no, content_hash, date, branch, buyer_order_no,"
+                    " source, file, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (dr_no, digest, day, branch, buyer_order_no, source, file, time.time())
+                )
+                if not cursor.rowcount:
+                    continue
+                conn.executemany(
+                    "INSERT INTO items (dr_id, line, dr_no, date, order_no, part_no, part_name,"
+                    " box_type, qty, unit_size, kanban) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, n, dr_no, day, line['order_no'], line['part_no'],
+                      line['part_name'], line['box_type'], line['qty'], line['unit_size'], line['kanban'])
+                     for n, line in enumerate(lines, 1)]
+                )
+                added += 1
+        return added
+
+    def append_dr(self, header, items, source, file=None, when=None):
+        """Record one DR; True if it was new"""
+        return self.append_drs([(header, items, file)], source, when) == 1
+
+    def append_vouchers(self, vouchers, source):
+        """Record VOUCHER elements, in one transaction; returns the number that were new"""
+        added = 0
+        with self._connect() as conn:
+            for voucher in vouchers:
+                fields = _voucher_fields(voucher)
+                if not fields['dr_no']:
+                    continue
+                xml = ET.tostring(voucher, encoding='unicode')
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO vouchers (dr_no, voucher_number, content_hash, date,"
+                    " total_amount, source, xml, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fields['dr_no'], fields['voucher_number'], voucher_hash(voucher), fields['date'],
+                     fields['total_amount'], source, xml, time.time())
+                )
+                added += cursor.rowcount
+        return added
+
+    # -- queries --
+
+    @staticmethod
+    def _where(filters):
+        clauses = [f"{column} {op} ?" for column, op, value in filters if value not in (None, '')]
+        params = [value for _, _, value in filters if value not in (None, '')]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def items(self, dr_no=None, part_no=None, order_no=None, month=None,
+              date_from=None, date_to=None, limit=DEFAULT_LIMIT):
+        """Item rows (newest first), with their DR's branch and source"""
+        first, last = date_range(month, date_from, date_to)
+        where, params = self._where([
+            ('i.dr_no', '=', dr_no), ('i.part_no', '=', part_no), ('i.order_no', '=', order_no),
+            ('i.date', '>=', first), ('i.date', '<=', last),
+        ])
+        sql = (f"SELECT {', '.join('i.' + c for c in ITEM_COLUMNS)}, d.branch, d.source"
+               f" FROM items i JOIN drs d ON d.id = i.dr_id{where}"
+               f" ORDER BY i.date DESC, i.dr_id DESC, i.line LIMIT ?")
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params + [limit])]
+
+    def drs(self, dr_no=None, part_no=None, order_no=None, month=None,
+            date_from=None, date_to=None, limit=DEFAULT_LIMIT):
+        """
+        DR versions (newest first) with their item count and total quantity.
+        With part_no/order_no: the DRs containing that part/order, and the
+        quantity of just those lines.
+        """
+        first, last = date_range(month, date_from, date_to)
+        # Part/order filters go through the items indexes; otherwise DRs without items are listed too
+        table, join = ('i', 'JOIN') if part_no or order_no else ('d', 'LEFT JOIN')
+        where, params = self._where([
+            (f'{table}.dr_no', '=', dr_no), ('i.part_no', '=', part_no), ('i.order_no', '=', order_no),
+            (f'{table}.date', '>=', first), (f'{table}.date', '<=', last),
+        ])
+        sql = ("SELECT d.dr_no, d.date, d.branch, d.buyer_order_no, d.source, d.file,"
+               " COUNT(i.line) AS items, SUM(i.qty) AS total_qty"
+               f" FROM drs d {join} items i ON i.dr_id = d.id{where}"
+               " GROUP BY d.id ORDER BY d.date DESC, d.id DESC LIMIT ?")
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params + [limit])]
+
+    def vouchers(self, dr_no=None, month=None, date_from=None, date_to=None,
+                 limit=DEFAULT_LIMIT, include_xml=False):
+        """Recorded vouchers (newest first); the XML only when include_xml is set"""
+        first, last = date_range(month, date_from, date_to)
+        where, params = self._where([
+            ('dr_no', '=', dr_no), ('date', '>=', first), ('date', '<=', last),
+        ])
+        columns = "dr_no, voucher_number, date, total_amount, source" + (", xml" if include_xml else "")
+        sql = f"SELECT {columns} FROM vouchers{where} ORDER BY date DESC, id DESC LIMIT ?"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params + [limit])]
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Process-wide ledger configured from the environment, or None if disabled"""
+    global _ledger
+    if os.environ.get('LEDGER_DISABLED') == '1':
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger(os.environ.get('LEDGER_DB') or os.path.join('data', 'ledger.db'))
+    return _ledger
+
+
+def record_dr(header, items, source, file=None):
+    """Append one DR to the ledger; errors are reported, never raised"""
+    try:
+        ledger = get_ledger()
+        if ledger:
+            ledger.append_dr(header, items, source, file)
+    except Exception as e:
+        print(f"Ledger write error: {e}")
+
+
+def record_drs(entries, source):
+    """Append (header, items, file) DRs to the ledger; errors are reported, never raised"""
+    try:
+        ledger = get_ledger()
+        if ledger:
+            ledger.append_drs(entries, source)
+    except Exception as e:
+        print(f"Ledger write error: {e}")
+
+
+def record_vouchers(vouchers, source):
+    """Append VOUCHER elements to the ledger; errors are reported, never raised"""
+    try:
+        ledger = get_ledger()
+        if ledger:
+            ledger.append_vouchers(vouchers, source)
+    except Exception as e:
+        print(f"Ledger write error: {e}")
+
+
+def recording(vouchers, source, batch_size=500):
+    """Pass VOUCHER elements through unchanged, appending them to the ledger batch_size at a time"""
+    pending = []
+    for voucher in vouchers:
+        pending.append(voucher)
+        if len(pending) >= batch_size:
+            record_vouchers(pending, source)
+            pending = []
+        yield voucher
+    if pending:
+        record_vouchers(pending, source)
+
+
+def query(kind, args):
+    """
+    Run a ledger query from request-style args (part_no, dr_no, order_no,
+    month, from, to, limit). kind is 'drs', 'items' or 'vouchers'.
+    Raises ValueError for bad arguments or a disabled ledger.
+    """
+    ledger = get_ledger()
+    if ledger is None:
+        raise ValueError('Ledger is disabled')
+    try:
+        limit = max(1, min(int(args.get('limit') or DEFAULT_LIMIT), MAX_LIMIT))
+    except ValueError:
+        raise ValueError(f"Bad limit: {args.get('limit')}")
+    filters = {
+        'dr_no': args.get('dr_no'),
+        'month': args.get('month'),
+        'date_from': args.get('from'),
+        'date_to': args.get('to'),
+        'limit': limit,
+    }
+    if kind == 'vouchers':
+        return ledger.vouchers(include_xml=args.get('xml') in ('1', 'true'), **filters)
+    if kind not in ('drs', 'items'):
+        raise ValueError(f"Unknown ledger query: {kind}")
+    filters.update(part_no=args.get('part_no'), order_no=args.get('order_no'))
+    return getattr(ledger, kind)(**filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the DR ledger")
+    parser.add_argument("kind", choices=['drs', 'items', 'vouchers'])
+    parser.add_argument("--dr-no")
+    parser.add_argument("--part-no")
+    parser.add_argument("--order-no")
+    parser.add_argument("--month", help="YYYY-MM, or 'this'")
+    parser.add_argument("--from", dest="date_from", help="first date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="last date (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        rows = query(args.kind, {
+            'dr_no': args.dr_no, 'part_no': args.part_no, 'order_no': args.order_no,
+            'month': args.month, 'from': args.date_from, 'to': args.date_to, 'limit': args.limit,
+        })
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+    print(f"{len(rows)} row(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+metrics.py
+Stage timings and counters for DR processing, shared by the CLI and both Flask apps.
+
+Each stage of an upload is timed into the dr_stage_seconds histogram:
+
+  file_save       upload body parsed into its UploadBuffer (upload_buffer.py)
+  extract_tables  try_tables over the whole document
+  extract_text    one page's text layer (observed per page)
+  ocr             OCR of a document's scanned pages
+  xml_build       Tally XML built and serialised
+  excel_write     .xlsx workbook written (excel_export.py)
+
+Counters record which extraction strategy succeeded, pages processed per
+stage, upload bytes and extraction cache hits. The apps serve everything in
+the Prometheus text format on GET /metrics; CLI runs register a callback
+with add_hook() instead (dr_pdf_to_excel.py --timings).
+
+Metrics are kept per process and reset on restart. Under serve.py with
+several worker processes, each worker calls share(directory): it writes a
+snapshot of its metrics there every SNAPSHOT_INTERVAL seconds, and /metrics
+on any worker adds up the snapshots of all of them (including workers that
+have since exited, so totals never go down).
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; DR stages range from a few ms (text layer) to minutes (OCR of long scans)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+SNAPSHOT_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_hooks = []
+_registry = {}
+# (directory, pid, snapshot path) once share() was called in this process
+_shared = None
+_dirty = threading.Event()
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {list(labelnames)}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _fire(name, value, labels):
+    for hook in list(_hooks):
+        try:
+            hook(name, value, labels)
+        except Exception as e:
+            print(f"Metrics hook error: {e}")
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _dirty.set()
+        _fire(self.name, amount, labels)
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def empty(self):
+        return {} if self.labelnames else {(): 0}
+
+    def merge(self, values, key, value):
+        values[key] = values.get(key, 0) + value
+
+    def render(self, values=None):
+        if values is None:
+            with _lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+        _dirty.set()
+        _fire(self.name, value, labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(_label_key(self.labelnames, labels), ([0], 0.0))
+        return counts[-1]
+
+    def sum(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), ([0], 0.0))[1]
+
+    def empty(self):
+        return {}
+
+    def merge(self, values, key, value):
+        counts, total = values.get(key, ([0] * len(self.buckets), 0.0))
+        values[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+
+    def render(self, values=None):
+        if values is None:
+            with _lock:
+                values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {count}"
+            yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(pairs)} {counts[-1]}"
+
+
+STAGE_SECONDS = Histogram('dr_stage_seconds', 'Time spent in each DR processing stage', ['stage'])
+EXTRACTIONS = Counter('dr_extractions_total', 'DR extractions by the strategy that succeeded (none = nothing found)',
+                      ['app', 'strategy'])
+PAGES = Counter('dr_pages_processed_total', 'PDF pages processed, by stage', ['stage'])
+UPLOADS = Counter('dr_uploads_total', 'PDF uploads received')
+UPLOAD_BYTES = Counter('dr_upload_bytes_total', 'Bytes of PDF uploads received')
+CACHE_LOOKUPS = Counter('dr_cache_lookups_total', 'Extraction cache lookups', ['extractor', 'result'])
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (summed over processes when shared)"""
+    merged = _merged_snapshots() if _sharing() else {}
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(merged.get(metric.name)))
+    return '\n'.join(lines) + '\n'
+
+
+def _sharing():
+    # Processes forked from a sharing worker (page pools) report through it, not on their own
+    return _shared is not None and _shared[1] == os.getpid()
+
+
+def _write_snapshot():
+    _dirty.clear()
+    with _lock:
+        snapshot = {name: [[list(key), value] for key, value in metric._values.items()]
+                    for name, metric in _registry.items()}
+    path = _shared[2]
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Metrics snapshot error: {e}")
+
+
+def _merged_snapshots():
+    _write_snapshot()
+    merged = {name: metric.empty() for name, metric in _registry.items()}
+    directory = _shared[0]
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, entries in snapshot.items():
+            metric = _registry.get(name)
+            if metric is not None:
+                for key, value in entries:
+                    metric.merge(merged[name], tuple(key), value)
+    return merged
+
+
+def _snapshot_loop():
+    while True:
+        _dirty.wait()
+        time.sleep(SNAPSHOT_INTERVAL)
+        _write_snapshot()
+
+
+def _final_snapshot():
+    if _sharing():
+        _write_snapshot()
+
+
+def share(directory):
+    """
+    Publish this process's metrics to directory for /metrics in sibling processes.
+    Called once per server worker process, after fork.
+    """
+    global _shared
+    os.makedirs(directory, exist_ok=True)
+    _shared = (directory, os.getpid(), os.path.join(directory, f"{os.getpid()}_{time.time_ns()}.json"))
+    _write_snapshot()
+    threading.Thread(target=_snapshot_loop, name='metrics-snapshot', daemon=True).start()
+    atexit.register(_final_snapshot)
+
+
+def add_hook(callback):
+    """
+    Call callback(metric_name, value, labels) on every observation and increment,
+    in the thread that made it. Used by CLI runs to report stage timings.
+    """
+    _hooks.append(callback)
+    return callback
+
+
+def remove_hook(callback):
+    if callback in _hooks:
+        _hooks.remove(callback)
+
+
+def replay(events):
+    """Apply (metric_name, value, labels) events collected in another process"""
+    for name, value, labels in events:
+        metric = _registry.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+        elif isinstance(metric, Counter):
+            metric.inc(value, **labels)
+
+
+@contextmanager
+def stage(name):
+    """Time the block into dr_stage_seconds{stage=name}, also when it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def record_extraction(app, strategy):
+    EXTRACTIONS.inc(app=app, strategy=strategy or 'none')
+
+
+def record_pages(stage_name, count):
+    if count:
+        PAGES.inc(count, stage=stage_name)
+
+
+def record_upload(size):
+    UPLOADS.inc()
+    UPLOAD_BYTES.inc(size)
+
+
+class StageTotals:
+    """Hook that adds up stage seconds and counters, for a CLI timing summary"""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    def __call__(self, name, value, labels):
+        if name == STAGE_SECONDS.name:
+            self.seconds[labels['stage']] = self.seconds.get(labels['stage'], 0.0) + value
+            self.calls[labels['stage']] = self.calls.get(labels['stage'], 0) + 1
+        else:
+            key = name + _format_labels(sorted(labels.items()))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self):
+        lines = [f"{'stage':16s} {'seconds':>9s} {'calls':>6s}"]
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            lines.append(f"{name:16s} {self.seconds[name]:9.3f} {self.calls[name]:6d}")
+        lines.extend(f"{key} {_format_value(value)}" for key, value in sorted(self.counters.items()))
+        return '\n'.join(lines)
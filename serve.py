@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+serve.py
+Production server for the web app (app.py) and the desktop app (tally_invoice_app.py).
+
+`python app.py` runs werkzeug's development server (the debugger and
+reloader only with FLASK_DEBUG=1); requests there are handled one at a
+time, so one OCR upload blocks every other user. This entry point serves the same Flask app with
+several worker processes and threads:
+
+  gunicorn  Linux/macOS, when installed: --workers processes with --threads
+            threads each (gthread worker class)
+  waitress  Windows, or without gunicorn: one process with --threads threads
+  werkzeug  when neither is installed: one process, a thread per request,
+            debugger and reloader off
+
+The app and the heavy modules (pdfplumber, pdfium, OpenCV, numpy, openpyxl)
+are imported once before the workers are forked, so workers start warm and
+share those pages with the master. After the fork each worker drops any
+page pool it inherited and starts its own on first use, with PAGE_WORKERS
+processes (default: CPUs / workers, so the workers' pools together use
+every core once).
+
+With more than one worker process:
+  - sessions and extraction job status go to SQLite (SESSION_BACKEND=sqlite),
+    so any worker can answer the next step of a session or a /jobs/<id> poll
+  - /metrics adds up the metrics of all workers (metrics.share)
+Uploads are spooled to uniquely named temporary files, and files in the
+output folder are written under a temporary name and renamed into place,
+so concurrent workers never see each other's partial files.
+
+Usage:
+  python serve.py app [--bind 127.0.0.1:5000] [--workers 2] [--threads 4]
+  python serve.py tally --bind 0.0.0.0:5000 --workers 4
+"""
+
+import os
+import atexit
+import shutil
+import argparse
+import tempfile
+import importlib
+import importlib.util
+
+APPS = {'app': 'app', 'tally': 'tally_invoice_app'}
+
+# Imported in the master before forking; each is optional
+PRELOAD_MODULES = ['pdfplumber', 'pypdfium2', 'numpy', 'cv2', 'PIL.Image', 'ocr_engine',
+                   'openpyxl', 'xml.dom.minidom']
+
+
+def choose_server(requested):
+    """'gunicorn', 'waitress' or 'werkzeug': the requested one, else the best installed"""
+    if requested != 'auto':
+        return requested
+    if os.name != 'nt' and importlib.util.find_spec('gunicorn'):
+        return 'gunicorn'
+    if importlib.util.find_spec('waitress'):
+        return 'waitress'
+    return 'werkzeug'
+
+
+def configure(workers):
+    """Environment for the app modules; must run before they are imported"""
+    if 'PAGE_WORKERS' not in os.environ:
+        os.environ['PAGE_WORKERS'] = os.environ.get('OCR_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+    metrics_dir = None
+    if workers > 1:
+        if os.environ.get('SESSION_BACKEND', 'memory') == 'memory':
+            os.environ['SESSION_BACKEND'] = 'sqlite'
+        metrics_dir = tempfile.mkdtemp(prefix='dr_metrics_')
+        atexit.register(_remove_dir, metrics_dir, os.getpid())
+    return metrics_dir
+
+
+def _remove_dir(path, owner_pid):
+    # atexit handlers also run in forked workers; only the master cleans up
+    if os.getpid() == owner_pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def preload():
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Preload skipped {name}: {e}")
+
+
+def post_fork(metrics_dir):
+    """Per-worker setup after the fork: own page pool, shared metrics"""
+    import dr_pdf_to_excel
+    import metrics
+    dr_pdf_to_excel.forget_page_pool()
+    if metrics_dir:
+        metrics.share(metrics_dir)
+
+
+def serve_gunicorn(flask_app, args, metrics_dir):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', [args.bind])
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', args.timeout)
+            self.cfg.set('preload_app', True)
+            self.cfg.set('post_fork', lambda server, worker: post_fork(metrics_dir))
+
+        def load(self):
+            return flask_app
+
+    Server().run()
+
+
+def serve_waitress(flask_app, args):
+    import waitress
+    waitress.serve(flask_app, listen=args.bind, threads=args.threads)
+
+
+def serve_werkzeug(flask_app, args):
+    host, _, port = args.bind.rpartition(':')
+    if args.server == 'auto':
+        print("gunicorn/waitress not installed: using werkzeug's threaded server "
+              "(pip install gunicorn, or waitress on Windows)")
+    flask_app.run(host=host or '127.0.0.1', port=int(port), threaded=True,
+                  debug=False, use_reloader=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the DR apps with several workers and threads")
+    parser.add_argument("app", choices=sorted(APPS), help="app = app.py, tally = tally_invoice_app.py")
+    parser.add_argument("--bind", default="127.0.0.1:5000", help="host:port (default: 127.0.0.1:5000)")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (gunicorn only; default: 2)")
+    parser.add_argument("--threads", type=int, default=4, help="request threads per worker (default: 4)")
+    parser.add_argument("--timeout", type=int, default=120,
+                        help="seconds before a silent gunicorn worker is restarted (default: 120)")
+    parser.add_argument("--server", choices=['auto', 'gunicorn', 'waitress', 'werkzeug'], default='auto')
+    args = parser.parse_args()
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    server = choose_server(args.server)
+    if server != 'gunicorn' and args.workers > 1:
+        print(f"{server} runs a single process: --workers {args.workers} ignored")
+        args.workers = 1
+
+    metrics_dir = configure(args.workers)
+    preload()
+    flask_app = importlib.import_module(APPS[args.app]).app
+    print(f"Serving {APPS[args.app]}.py on {args.bind} with {server}: "
+          f"{args.workers} worker(s) x {args.threads} thread(s), "
+          f"PAGE_WORKERS={os.environ['PAGE_WORKERS']}")
+
+    if server == 'gunicorn':
+        serve_gunicorn(flask_app, args, metrics_dir)
+    elif server == 'waitress':
+        serve_waitress(flask_app, args)
+    else:
+        serve_werkzeug(flask_app, args)
+
+
+if __name__ == "__main__":
+    main()
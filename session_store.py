@@ -0,0 +1,174 @@
+"""
+session_store.py
+Server-side Flask sessions: only a signed session id travels in the cookie.
+
+Session data (DR details, prompt data, generated XML, ...) stays on the
+server in one of two backends:
+  MemorySessionBackend  in-process dict, for a single worker process
+  SQLiteSessionBackend  shared SQLite file, for several worker processes
+
+Sessions expire after a sliding TTL; expired entries are evicted lazily.
+"""
+
+import time
+import uuid
+import sqlite3
+import threading
+
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it changed"""
+
+    def __init__(self, initial=None, sid=None, new=False, saved_at=0.0):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.saved_at = saved_at
+        self.modified = False
+
+
+class MemorySessionBackend:
+    """In-process session store; fine for one worker, lost on restart"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        """(payload, expires) for a live session, else None"""
+        with self._lock:
+            entry = self._data.get(sid)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry
+
+    def save(self, sid, payload, expires):
+        with self._lock:
+            self._data[sid] = (payload, expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def prune(self):
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, (_, expires) in self._data.items() if expires < now]:
+                del self._data[sid]
+
+
+class SQLiteSessionBackend:
+    """Session store in a local SQLite file, shared by all worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load(self, sid):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, expires FROM sessions WHERE sid = ? AND expires >= ?", (sid, time.time())
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid, payload, expires):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, payload, expires) VALUES (?, ?, ?)",
+                (sid, payload, expires)
+            )
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def prune(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface storing data in a backend and a signed id in the cookie"""
+
+    serializer = session_json_serializer
+
+    def __init__(self, backend, ttl=8 * 3600, prune_interval=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._last_prune >= self.prune_interval:
+            self._last_prune = now
+            try:
+                self.backend.prune()
+            except Exception as e:
+                print(f"Session prune error: {e}")
+
+    def open_session(self, app, request):
+        self._maybe_prune()
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+            if sid:
+                entry = self.backend.load(sid)
+                if entry is not None:
+                    # Saved one TTL before it expires
+                    payload, expires = entry
+                    return ServerSideSession(self.serializer.loads(payload), sid=sid,
+                                             saved_at=expires - self.ttl)
+        return ServerSideSession(sid=uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Sliding expiry: rewrite unchanged sessions only once a tenth of the TTL has passed
+        stale = time.time() - session.saved_at > self.ttl / 10
+        if not (session.modified or session.new or stale):
+            return
+
+        self.backend.save(session.sid, self.serializer.dumps(dict(session)), time.time() + self.ttl)
+        if session.new:
+            response.vary.add('Cookie')
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode('utf-8'),
+            max_age=self.ttl,
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path,
+        )
@@ -28,7 +28,7 @@ REM Check if Flask is installed
 python -c "import flask" >nul 2>&1
 if errorlevel 1 (
     echo Installing required packages...
-    python -m pip install flask pandas openpyxl pdfplumber pillow opencv-python pytesseract -q
+    python -m pip install flask pandas openpyxl pdfplumber pillow opencv-python pytesseract waitress -q
 )
 
 REM Start the Flask app
@@ -40,6 +40,6 @@ echo.
 echo Press Ctrl+C to stop the server
 echo.
 
-python app.py
+python serve.py app
 
 pause
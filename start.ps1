@@ -24,7 +24,7 @@ try {
 $flaskCheck = python -c "import flask" 2>&1
 if ($LASTEXITCODE -ne 0) {
     Write-Host "Installing required packages..." -ForegroundColor Yellow
-    python -m pip install flask pandas openpyxl pdfplumber pillow opencv-python pytesseract -q
+    python -m pip install flask pandas openpyxl pdfplumber pillow opencv-python pytesseract waitress -q
 }
 
 Write-Host ""
@@ -35,5 +35,5 @@ Write-Host ""
 Write-Host "Press Ctrl+C to stop the server"
 Write-Host ""
 
-# Start Flask app
-python app.py
+# Start Flask app (threaded server; gunicorn/waitress when installed)
+python serve.py app
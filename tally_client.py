@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+tally_client.py
+Client for Tally's XML-over-HTTP import port.
+
+Vouchers are posted in batches (several VOUCHERs per ENVELOPE) over a pool
+of keep-alive connections, with a bounded number of posts in flight.
+Failed posts (connection errors, timeouts, 5xx) are retried with
+exponential backoff. Tally's reply is parsed for its CREATED, ALTERED,
+ERRORS and EXCEPTIONS counts and LINEERROR messages. The upload report
+includes per-voucher latency and throughput.
+
+A retried post may have reached Tally before the connection failed, so
+Tally can see a batch twice. Tally rejects a voucher number it already has,
+which shows up as an error in the report.
+
+Usage:
+  python tally_client.py vouchers.xml [--url http://localhost:9000] [--batch-size 50] [--concurrency 4]
+
+For offline testing run the stub server first: python tally_stub.py --port 9000
+"""
+
+import re
+import sys
+import time
+import queue
+import random
+import argparse
+import threading
+import http.client
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from tally_xml import iter_pretty_xml
+
+COUNT_TAGS = ['CREATED', 'ALTERED', 'DELETED', 'ERRORS', 'EXCEPTIONS', 'CANCELLED']
+COUNT_RES = {tag: re.compile(rf"<{tag}>\s*(\d+)\s*</{tag}>", re.I) for tag in COUNT_TAGS}
+LINEERROR_RE = re.compile(r"<LINEERROR>(.*?)</LINEERROR>", re.I | re.S)
+
+
+class TallyError(Exception):
+    """A post to Tally failed after all retries; attempts is how many posts were made"""
+
+    def __init__(self, message, attempts=1):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def parse_import_response(text):
+    """
+    Counts and line errors from a Tally import reply, e.g.
+    <RESPONSE><CREATED>1</CREATED><ERRORS>0</ERRORS>...</RESPONSE>.
+    Counts Tally did not send are 0.
+    """
+    result = {}
+    for tag, pattern in COUNT_RES.items():
+        result[tag.lower()] = sum(int(n) for n in pattern.findall(text))
+    result['line_errors'] = [m.strip() for m in LINEERROR_RE.findall(text)]
+    return result
+
+
+def split_envelope(xml_text):
+    """
+    Parse a generated envelope and take its vouchers out of it.
+    Returns (root, container, vouchers); root and container are the
+    voucher-less envelope, ready for iter_pretty_xml batches.
+    """
+    root = ET.fromstring(xml_text)
+    for parent in root.iter():
+        vouchers = [child for child in parent if child.tag == 'VOUCHER']
+        if vouchers:
+            for voucher in vouchers:
+                parent.remove(voucher)
+            return root, parent, vouchers
+    return root, root, []
+
+
+def _voucher_number(voucher):
+    return voucher.findtext('VOUCHERNUMBER') or ''
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class TallyClient:
+    """Pooled, batched, retrying poster for Tally's HTTP import port"""
+
+    def __init__(self, url='http://localhost:9000', concurrency=4, batch_size=50,
+                 max_retries=3, backoff=0.5, timeout=60):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 9000
+        self.path = parts.path or '/'
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    # -- connection pool --
+
+    def _get_conn(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _put_conn(self, conn):
+        if self._idle.qsize() < self.concurrency:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix='tally')
+            return self._executor
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- posting --
+
+    def _post_once(self, body):
+        conn = self._get_conn()
+        try:
+            conn.request('POST', self.path, body=body,
+                         headers={'Content-Type': 'text/xml; charset=utf-8'})
+            response = conn.getresponse()
+            text = response.read().decode('utf-8', errors='replace')
+        except Exception:
+            # Broken or timed-out connection: never reuse it
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_conn(conn)
+        return response.status, text
+
+    def post(self, body):
+        """
+        POST one XML body, retrying connection errors, timeouts and 5xx
+        replies with exponential backoff. Returns (reply text, attempts).
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                status, text = self._post_once(body)
+                if status < 500:
+                    if status >= 400:
+                        raise TallyError(f"HTTP {status}: {text[:200]}", attempt)
+                    return text, attempt
+                error = f"HTTP {status}"
+            except TallyError:
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt > self.max_retries:
+                raise TallyError(f"{error} (after {attempt} attempts)", attempt)
+            time.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    def _post_batch(self, root, container, batch):
+        numbers = [_voucher_number(v) for v in batch]
+        body = ''.join(iter_pretty_xml(root, container, batch)).encode('utf-8')
+        start = time.perf_counter()
+        try:
+            text, attempts = self.post(body)
+        except TallyError as e:
+            return {
+                'vouchers': numbers, 'status': 'failed', 'error': str(e),
+                'attempts': e.attempts, 'latency': time.perf_counter() - start,
+                **{tag.lower(): 0 for tag in COUNT_TAGS}, 'line_errors': [],
+            }
+        counts = parse_import_response(text)
+        ok = counts['errors'] == 0 and counts['exceptions'] == 0
+        return {
+            'vouchers': numbers, 'status': 'ok' if ok else 'errors', 'error': '',
+            'attempts': attempts, 'latency': time.perf_counter() - start, **counts,
+        }
+
+    def upload(self, root, container, vouchers):
+        """
+        Post vouchers to Tally in batches of batch_size, each wrapped in a copy
+        of the (voucher-less) envelope root/container. Returns the upload report.
+        """
+        vouchers = list(vouchers)
+        batches = [vouchers[i:i + self.batch_size] for i in range(0, len(vouchers), self.batch_size)]
+
+        start = time.perf_counter()
+        executor = self._get_executor()
+        results = list(executor.map(lambda batch: self._post_batch(root, container, batch), batches))
+        elapsed = time.perf_counter() - start
+
+        per_voucher = [r['latency'] / len(r['vouchers']) for r in results for _ in r['vouchers']]
+        report = {
+            'url': self.url,
+            'vouchers': len(vouchers),
+            'batches': len(batches),
+            'failed_batches': sum(1 for r in results if r['status'] == 'failed'),
+            'elapsed': round(elapsed, 4),
+            'throughput': round(len(vouchers) / elapsed, 2) if elapsed > 0 else 0.0,
+            'latency_per_voucher': {
+                'mean': round(sum(per_voucher) / len(per_voucher), 6) if per_voucher else 0.0,
+                'p50': round(_percentile(per_voucher, 50), 6),
+                'p95': round(_percentile(per_voucher, 95), 6),
+            },
+            'results': [dict(r, latency=round(r['latency'], 4)) for r in results],
+        }
+        for tag in COUNT_TAGS:
+            report[tag.lower()] = sum(r[tag.lower()] for r in results)
+        report['line_errors'] = [e for r in results for e in r['line_errors']]
+        report['success'] = (report['failed_batches'] == 0 and report['errors'] == 0
+                             and report['exceptions'] == 0)
+        return report
+
+    def upload_xml(self, xml_text):
+        """Upload every voucher of a generated envelope (single or batch)"""
+        root, container, vouchers = split_envelope(xml_text)
+        return self.upload(root, container, vouchers)
+
+
+def print_report(report):
+    print(f"Tally: {report['url']}")
+    print(f"Vouchers: {report['vouchers']} in {report['batches']} batches "
+          f"({report['failed_batches']} failed)")
+    print(f"Created: {report['created']}  Altered: {report['altered']}  "
+          f"Errors: {report['errors']}  Exceptions: {report['exceptions']}")
+    for line in report['line_errors']:
+        print(f"  {line}")
+    latency = report['latency_per_voucher']
+    print(f"Latency per voucher: mean {latency['mean'] * 1000:.2f} ms, "
+          f"p50 {latency['p50'] * 1000:.2f} ms, p95 {latency['p95'] * 1000:.2f} ms")
+    print(f"Throughput: {report['throughput']:.1f} vouchers/s ({report['elapsed']:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload a generated Tally XML file to Tally")
+    parser.add_argument("xml_file", help="Envelope written by either app (single or batch)")
+    parser.add_argument("--url", default="http://localhost:9000", help="Tally HTTP import port")
+    parser.add_argument("--batch-size", type=int, default=50, help="Vouchers per request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.xml_file, encoding='utf-8') as f:
+        xml_text = f.read()
+
+    with TallyClient(args.url, concurrency=args.concurrency, batch_size=args.batch_size,
+                     max_retries=args.retries) as client:
+        report = client.upload_xml(xml_text)
+    print_report(report)
+    sys.exit(0 if report['success'] else 1)
+
+
+if __name__ == "__main__":
+    main()
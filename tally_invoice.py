@@ -0,0 +1,418 @@
+"""
+tally_invoice.py
+DR extraction and Tally invoice XML generation shared by the desktop app
+(tally_invoice_app.py) and the watch-folder ingester (watch_folder.py).
+
+Importing it creates no Flask app and no folders, so worker processes and
+command-line tools get the pipeline without the web app.
+"""
+
+import os
+import re
+from datetime import datetime
+import xml.etree.ElementTree as ET
+from dr_pdf_to_excel import PDFDocument, try_tables, ocr_pdf, parse_from_text
+from extraction_cache import cached
+from tally_xml import write_pretty_xml, import_envelope
+from item_master import get_item_master
+from tax_engine import compute_taxes, format_paise
+import ledger
+import metrics
+
+# Default folder for generated XML files
+OUTPUT_FOLDER = 'output_xml'
+# Records per tax computation pass when generating batches
+BATCH_CHUNK = 1000
+# Processes for page-level work: table parsing of large DRs and OCR of scanned ones
+PAGE_WORKERS = int(os.environ.get('PAGE_WORKERS', os.environ.get('OCR_WORKERS', os.cpu_count() or 1)))
+
+# =====================================================
+# EXTRACTION LOGIC
+# =====================================================
+
+class PDFExtractor:
+    """Extract DR data from PDF with multiple fallback methods"""
+    
+    @staticmethod
+    @cached('tally.extract_dr_details')
+    def extract_dr_details(pdf_path, workers=None, raise_errors=False):
+        """
+        Priority 1: pdfplumber table extraction (all pages, every item)
+        Priority 2: pdfplumber text extraction
+        Priority 3: Fallback regex patterns
+        Priority 4: OCR (parallel across workers, default PAGE_WORKERS) for scanned PDFs
+        Errors are printed and give blank details, unless raise_errors is set.
+        """
+        workers = workers or PAGE_WORKERS
+        details = {
+            'DR No': '',
+            'Buyer Order No': '',
+            'Quantity': '',
+            'Branch': '',
+            'Part Name': '',
+            'Order No': '',
+            'Part No': '',
+            'Box Type': '',
+            'Unit Size': '',
+            'Item Description': '',
+            'HSN Code': '',
+            'Rate': '',
+            'Items': [],
+        }
+        
+        try:
+            with PDFDocument(pdf_path) as doc:
+                # PRIORITY 1: Table extraction
+                header, items = try_tables(doc, workers=workers, raise_errors=raise_errors)
+                details = PDFExtractor._extract_from_items(header, items, details)
+                
+                # PRIORITY 2: Text extraction (for fields not in table)
+                text = doc.text(0)
+                if text:
+                    details = PDFExtractor._extract_from_text(text, details)
+                
+                # PRIORITY 4: OCR when there is no table and no text layer
+                strategy = 'table' if header or items else 'text' if text.strip() else None
+                if strategy is None:
+                    text = ocr_pdf(doc, workers=workers, raise_errors=raise_errors)
+                    if text:
+                        header, items = parse_from_text(text)
+                        details = PDFExtractor._extract_from_items(header, items, details)
+                        details = PDFExtractor._extract_from_text(text, details)
+                        strategy = 'ocr'
+                
+                metrics.record_extraction('tally_app', strategy if details.get('DR No') else None)
+                return details
+        
+        except Exception as e:
+            metrics.record_extraction('tally_app', None)
+            if raise_errors:
+                raise
+            print(f"PDF extraction error: {e}")
+            return details
+    
+    @staticmethod
+    def _extract_from_items(header, items, details):
+        """Fill details from try_tables/parse_from_text output; top-level item fields mirror the first item"""
+        if header.get('DR No'):
+            details['DR No'] = header['DR No']
+        if header.get('Branch'):
+            details['Branch'] = header['Branch']
+        
+        details['Items'] = [
+            {
+                'Order No': item.get('Order No', ''),
+                'Part No': item.get('Part No', ''),
+                'Part Name': item.get('Part Name', ''),
+                'Box Type': item.get('Box Type', ''),
+                'Quantity': item.get('Qty') or "1",
+                'Unit Size': item.get('Unit Size', ''),
+            }
+            for item in items
+        ]
+        if details['Items']:
+            details.update(details['Items'][0])
+            details['Buyer Order No'] = details['Order No']
+        
+        return details
+    
+    @staticmethod
+    def _extract_from_text(text, details):
+        """Extract from raw text"""
+        try:
+            # DR Number
+            m = re.search(r"Delivery\s*Request\s*No\.?\s*[:\-]?\s*(\d{5,12})", text, re.I)
+            if m and not details['DR No']:
+                details['DR No'] = m.group(1).strip()
+            
+            # Quantity
+            m = re.search(r"Qty|Quantity\s*[:\-]?\s*(\d+)", text, re.I)
+            if m and not details['Quantity']:
+                details['Quantity'] = m.group(1).strip()
+            
+            # Buyer Order
+            m = re.search(r"Buyer.*Order.*[:\-]?\s*(\d+)", text, re.I)
+            if m and not details['Buyer Order No']:
+                details['Buyer Order No'] = m.group(1).strip()
+        
+        except Exception as e:
+            print(f"Text extraction error: {e}")
+        
+        return details
+
+
+# =====================================================
+# TALLY INVOICE GENERATOR
+# =====================================================
+
+class TallyInvoiceGenerator:
+    """Generate Tally-compliant invoice XML"""
+    
+    # Built-in item master data, used when a part is not in the imported master
+    ITEM_MASTER = {
+        '1816A1810169': {
+            'name': 'ASSY. SUCTION PIPE - STEERING PUMP',
+            'hsn': '8409991090',
+            'gst': 5,
+            'rate': 2003.30,
+        }
+    }
+    
+    @staticmethod
+    def lookup_item(part_no, part_name):
+        """
+        Item data for a part: the imported item master (ITEM_MASTER_PATH),
+        then ITEM_MASTER, with defaults for anything they leave blank
+        """
+        item_data = {
+            'name': part_name,
+            'hsn': '8409991090',
+            'gst': 5,
+            'rate': 2003.30,
+        }
+        master = get_item_master()
+        for found in (TallyInvoiceGenerator.ITEM_MASTER.get(part_no),
+                      master.get(part_no) if master else None):
+            if found:
+                item_data.update({k: v for k, v in found.items() if v not in ('', None)})
+        return item_data
+    
+    @staticmethod
+    def determine_tax_type(branch):
+        """Determine tax type based on branch"""
+        if 'Madurai' in branch:
+            return 'CGST_SGST', 'TN'
+        else:
+            return 'IGST', 'KA'
+    
+    @staticmethod
+    def line_items(dr_data, prompt_data):
+        """
+        DR items with their invoice quantities. Quantities come from
+        prompt_data['items'] when given; a single item uses prompt_data['quantity'].
+        """
+        items = dr_data.get('Items') or []
+        if len(items) <= 1:
+            # Single item: the top-level fields win, so edits to them are kept
+            items = [dict(items[0] if items else {},
+                          **{'Part No': dr_data.get('Part No', ''), 'Part Name': dr_data.get('Part Name', '')})]
+        prompt_items = prompt_data.get('items') or []
+        
+        lines = []
+        for i, item in enumerate(items):
+            if i < len(prompt_items) and prompt_items[i].get('quantity') not in (None, ''):
+                quantity = prompt_items[i]['quantity']
+            elif len(items) == 1:
+                quantity = prompt_data.get('quantity', 1)
+            else:
+                quantity = item.get('Quantity') or 1
+            lines.append((item, float(quantity)))
+        return lines
+    
+    @staticmethod
+    def create_envelope():
+        """Empty Tally voucher import envelope; returns (root, list_elem) where vouchers are appended"""
+        return import_envelope('TAFE Motors')
+    
+    @staticmethod
+    def generate_xml(dr_data, prompt_data):
+        """Generate Tally invoice XML (one voucher) with one line item per DR item"""
+        root, list_elem = TallyInvoiceGenerator.create_envelope()
+        list_elem.append(TallyInvoiceGenerator.build_voucher(dr_data, prompt_data))
+        return root
+    
+    @staticmethod
+    def generate_batch_xml(records):
+        """
+        Generate one ENVELOPE holding a voucher per record ({'dr_data', 'prompt_data'}).
+        A record that fails is left out and reported; it does not stop the batch.
+        Returns (root, results) with one {'index', 'dr_no', 'status', 'error'} per record.
+        """
+        root, list_elem = TallyInvoiceGenerator.create_envelope()
+        results = []
+        for voucher in TallyInvoiceGenerator.iter_vouchers(records, results):
+            list_elem.append(voucher)
+        return root, results
+    
+    @staticmethod
+    def write_batch_xml(records, out, ledger_source=None):
+        """
+        Stream the batch envelope to a text file object, one voucher at a
+        time, so memory stays bounded however many records there are.
+        With ledger_source, the vouchers are also appended to the DR ledger.
+        Returns the per-record results, as generate_batch_xml does.
+        """
+        root, list_elem = TallyInvoiceGenerator.create_envelope()
+        results = []
+        vouchers = TallyInvoiceGenerator.iter_vouchers(records, results)
+        if ledger_source:
+            vouchers = ledger.recording(vouchers, ledger_source)
+        write_pretty_xml(root, out, list_elem, vouchers)
+        return results
+    
+    @staticmethod
+    def iter_vouchers(records, results):
+        """
+        Yield a VOUCHER per usable record, appending each record's result to results.
+        Records are taken BATCH_CHUNK at a time and their taxes computed in one pass.
+        """
+        seen = set()
+        records = iter(enumerate(records))
+        
+        while True:
+            chunk = []
+            for index, record in records:
+                dr_data = (record or {}).get('dr_data') or {}
+                prompt_data = (record or {}).get('prompt_data') or {}
+                dr_no = dr_data.get('DR No', '')
+                try:
+                    if not dr_no:
+                        raise ValueError('Missing DR number')
+                    if dr_no in seen:
+                        raise ValueError(f"Duplicate DR number {dr_no} in batch")
+                    lines = TallyInvoiceGenerator.prepare_lines(dr_data, prompt_data)
+                except Exception as e:
+                    results.append({'index': index, 'dr_no': dr_no, 'status': 'error', 'error': str(e)})
+                    continue
+                seen.add(dr_no)
+                results.append({'index': index, 'dr_no': dr_no, 'status': 'ok', 'error': ''})
+                chunk.append((dr_data, prompt_data, lines))
+                if len(chunk) >= BATCH_CHUNK:
+                    break
+            
+            if not chunk:
+                return
+            yield from TallyInvoiceGenerator.build_vouchers(chunk)
+    
+    @staticmethod
+    def prepare_lines(dr_data, prompt_data):
+        """Invoice lines of a DR: item master data, quantity, rate and GST rate per item"""
+        lines = []
+        for item, quantity in TallyInvoiceGenerator.line_items(dr_data, prompt_data):
+            part_no = item.get('Part No', '')
+            item_data = TallyInvoiceGenerator.lookup_item(part_no, item.get('Part Name', 'Unknown Part'))
+            lines.append({
+                'part_no': part_no,
+                'item_data': item_data,
+                'quantity': quantity,
+                'rate': float(item_data.get('rate', 0)),
+                'gst_rate': item_data.get('gst', 5),
+            })
+        return lines
+    
+    @staticmethod
+    def intra_state(branches):
+        """Per branch: True where determine_tax_type bills CGST+SGST"""
+        return [TallyInvoiceGenerator.determine_tax_type(branch)[0] == 'CGST_SGST' for branch in branches]
+    
+    @staticmethod
+    def build_vouchers(chunk):
+        """VOUCHER elements for (dr_data, prompt_data, lines) tuples, taxes computed as one batch"""
+        voucher_ids = [v for v, (_, _, lines) in enumerate(chunk) for _ in lines]
+        intra = TallyInvoiceGenerator.intra_state([dr_data.get('Branch', '') for dr_data, _, _ in chunk])
+        all_lines = [line for _, _, lines in chunk for line in lines]
+        amounts = compute_taxes(
+            [line['quantity'] for line in all_lines],
+            [line['rate'] for line in all_lines],
+            [line['gst_rate'] for line in all_lines],
+            [intra[v] for v in voucher_ids],
+            voucher_ids,
+        )
+        
+        first_line = 0
+        for v, (dr_data, prompt_data, lines) in enumerate(chunk):
+            yield TallyInvoiceGenerator.format_voucher(dr_data, prompt_data, lines, amounts, v, first_line)
+            first_line += len(lines)
+    
+    @staticmethod
+    def build_voucher(dr_data, prompt_data):
+        """Build one sales VOUCHER element for a DR"""
+        lines = TallyInvoiceGenerator.prepare_lines(dr_data, prompt_data)
+        return next(TallyInvoiceGenerator.build_vouchers([(dr_data, prompt_data, lines)]))
+    
+    @staticmethod
+    def format_voucher(dr_data, prompt_data, lines, amounts, v, first_line):
+        """
+        VOUCHER element from precomputed amounts (a tax_engine.TaxBatch):
+        voucher v of the batch, whose lines start at first_line
+        """
+        total_quantity = sum(line['quantity'] for line in lines)
+        tax_type, state = TallyInvoiceGenerator.determine_tax_type(dr_data.get('Branch', ''))
+        
+        # Voucher
+        voucher = ET.Element('VOUCHER')
+        
+        # Basic Details
+        ET.SubElement(voucher, 'VOUCHERNUMBER').text = f"INV_{dr_data['DR No']}"
+        ET.SubElement(voucher, 'REFERENCENUMBER').text = f"DR_{dr_data['DR No']}"
+        ET.SubElement(voucher, 'VOUCHERTYPE').text = 'Sales'
+        ET.SubElement(voucher, 'VOUCHERTYPENAME').text = 'Sales'
+        ET.SubElement(voucher, 'DATE').text = datetime.now().strftime('%d-%m-%Y')
+        ET.SubElement(voucher, 'ORDERREFERENCE').text = dr_data.get('Order No', '')
+        
+        # Party Details
+        party = ET.SubElement(voucher, 'PARTYDETAILS')
+        ET.SubElement(party, 'PARTYNAME').text = prompt_data.get('party_name', 'TAFEMDU')
+        ET.SubElement(party, 'BUYERORDERNUMBER').text = dr_data.get('Buyer Order No', '')
+        
+        # Line Items
+        items = ET.SubElement(voucher, 'LINEITEMSLIST')
+        
+        for i, line in enumerate(lines, first_line):
+            item_data = line['item_data']
+            lineitem = ET.SubElement(items, 'LINEITEM')
+            ET.SubElement(lineitem, 'ITEMNAME').text = item_data.get('name', '')
+            ET.SubElement(lineitem, 'ITEMNO').text = line['part_no']
+            ET.SubElement(lineitem, 'HSNCODE').text = item_data.get('hsn', '')
+            ET.SubElement(lineitem, 'QUANTITY').text = str(int(line['quantity']))
+            ET.SubElement(lineitem, 'UNIT').text = 'NOS'
+            ET.SubElement(lineitem, 'RATE').text = str(line['rate'])
+            ET.SubElement(lineitem, 'AMOUNT').text = format_paise(amounts.taxable[i])
+            ET.SubElement(lineitem, 'TAXRATE').text = str(line['gst_rate'])
+            ET.SubElement(lineitem, 'TAXTYPE').text = tax_type
+            ET.SubElement(lineitem, 'TAXAMOUNT').text = format_paise(amounts.tax[i])
+            ET.SubElement(lineitem, 'GROSSAMOUNT').text = format_paise(amounts.gross[i])
+        
+        # Tax Details, one set per GST rate
+        taxes = ET.SubElement(voucher, 'TAXDETAILS')
+        
+        for line_index, cgst, sgst, igst in amounts.groups(v):
+            gst_rate = lines[line_index - first_line]['gst_rate']
+            if tax_type == 'CGST_SGST':
+                cgst_tax = ET.SubElement(taxes, 'TAX')
+                ET.SubElement(cgst_tax, 'TAXNAME').text = 'CGST'
+                ET.SubElement(cgst_tax, 'TAXRATE').text = str(gst_rate / 2)
+                ET.SubElement(cgst_tax, 'TAXAMOUNT').text = format_paise(cgst)
+                
+                sgst_tax = ET.SubElement(taxes, 'TAX')
+                ET.SubElement(sgst_tax, 'TAXNAME').text = 'SGST'
+                ET.SubElement(sgst_tax, 'TAXRATE').text = str(gst_rate / 2)
+                ET.SubElement(sgst_tax, 'TAXAMOUNT').text = format_paise(sgst)
+            
+            else:  # IGST
+                igst_tax = ET.SubElement(taxes, 'TAX')
+                ET.SubElement(igst_tax, 'TAXNAME').text = 'IGST'
+                ET.SubElement(igst_tax, 'TAXRATE').text = str(gst_rate)
+                ET.SubElement(igst_tax, 'TAXAMOUNT').text = format_paise(igst)
+        
+        # Totals
+        totals = ET.SubElement(voucher, 'TOTALS')
+        ET.SubElement(totals, 'TAXABLEAMOUNT').text = format_paise(amounts.voucher_taxable[v])
+        ET.SubElement(totals, 'TAXAMOUNT').text = format_paise(amounts.voucher_tax[v])
+        ET.SubElement(totals, 'ROUNDOFF').text = '0.00'
+        ET.SubElement(totals, 'TOTALAMOUNT').text = format_paise(amounts.voucher_gross[v])
+        
+        # Additional Details
+        additional = ET.SubElement(voucher, 'ADDITIONALDETAILS')
+        ET.SubElement(additional, 'VEHICLENUMBER').text = prompt_data.get('vehicle_number', 'TN13AH0050')
+        ET.SubElement(additional, 'CRATEDETAILS').text = f"DR_{dr_data['DR No']}"
+        ET.SubElement(additional, 'NOOFPIECES').text = str(prompt_data.get('no_of_pieces', total_quantity))
+        ET.SubElement(additional, 'NOOFPACKAGES').text = str(prompt_data.get('no_of_packages', 1))
+        ET.SubElement(additional, 'TOTALKGS').text = prompt_data.get('total_kgs', '0')
+        
+        # Narration
+        narration = ET.SubElement(voucher, 'NARRATION')
+        more = f" and {len(lines) - 1} more items" if len(lines) > 1 else ""
+        ET.SubElement(narration, 'TEXT').text = f"DR {dr_data['DR No']} - {dr_data.get('Part Name', '')}{more}"
+        
+        return voucher
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+tally_stub.py
+Local stand-in for Tally's XML-over-HTTP import port, for offline testing.
+
+Accepts POSTed envelopes on HTTP/1.1 keep-alive connections and answers
+like Tally: a RESPONSE with CREATED/ERRORS counts. Only voucher imports
+are accepted: TALLYREQUEST "Import Data", REPORTNAME "Vouchers" and the
+vouchers in REQUESTDATA/TALLYMESSAGE. Anything else is answered as an
+unknown request and nothing is created. A voucher is created unless it has
+no VOUCHERNUMBER or its number was already imported, in which case it
+counts as an error with a LINEERROR message.
+Latency and transient 503 failures can be simulated.
+
+Usage:
+  python tally_stub.py [--port 9000] [--latency 0.02] [--fail-rate 0.0]
+"""
+
+import time
+import random
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def is_voucher_import(root):
+    """True for an ENVELOPE that is an Import Data request for Vouchers"""
+    return (root.tag == 'ENVELOPE'
+            and (root.findtext('HEADER/TALLYREQUEST') or '').strip().lower() == 'import data'
+            and (root.findtext('BODY/IMPORTDATA/REQUESTDESC/REPORTNAME') or '').strip().lower() == 'vouchers')
+
+
+class TallyStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, text):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            self._reply(503, 'Tally busy')
+            return
+
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError as e:
+            self._reply(200, f"<RESPONSE><ERRORS>1</ERRORS><LINEERROR>{escape(str(e))}</LINEERROR></RESPONSE>")
+            return
+        if not is_voucher_import(root):
+            self._reply(200, "<RESPONSE><CREATED>0</CREATED><ERRORS>1</ERRORS>"
+                             "<LINEERROR>Unknown Request, cannot be processed</LINEERROR></RESPONSE>")
+            return
+        vouchers = root.iterfind('BODY/IMPORTDATA/REQUESTDATA/TALLYMESSAGE/VOUCHER')
+
+        created = 0
+        line_errors = []
+        with server.lock:
+            for voucher in vouchers:
+                number = voucher.findtext('VOUCHERNUMBER') or ''
+                if not number:
+                    line_errors.append('Voucher has no VOUCHERNUMBER')
+                elif number in server.vouchers:
+                    line_errors.append(f"Voucher {number} already exists")
+                else:
+                    server.vouchers.add(number)
+                    created += 1
+
+        errors = ''.join(f"<LINEERROR>{escape(e)}</LINEERROR>" for e in line_errors)
+        self._reply(200, f"<RESPONSE><CREATED>{created}</CREATED><ALTERED>0</ALTERED>"
+                         f"<DELETED>0</DELETED><ERRORS>{len(line_errors)}</ERRORS>"
+                         f"<EXCEPTIONS>0</EXCEPTIONS>{errors}</RESPONSE>")
+
+
+class TallyStubServer(ThreadingHTTPServer):
+    """Threaded stub server that remembers imported voucher numbers"""
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 9000), latency=0.0, fail_rate=0.0, verbose=False):
+        super().__init__(address, TallyStubHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.vouchers = set()
+        self.requests = 0
+        self.connections = set()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub(port=0, latency=0.0, fail_rate=0.0):
+    """Start a stub server on a background thread (port 0 picks a free port)"""
+    server = TallyStubServer(('127.0.0.1', port), latency=latency, fail_rate=fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tally XML import stub server")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered 503")
+    args = parser.parse_args()
+
+    server = TallyStubServer(('127.0.0.1', args.port), latency=args.latency,
+                             fail_rate=args.fail_rate, verbose=True)
+    print(f"Tally stub listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
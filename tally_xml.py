@@ -0,0 +1,177 @@
+"""
+tally_xml.py
+Streaming, indented XML serializer for Tally envelopes.
+
+Both apps used to pretty-print with
+    minidom.parseString(ET.tostring(root)).toprettyxml(indent='  ')
+and then drop blank lines. That keeps several full copies of the document
+in memory. This module writes the same text (byte for byte) straight from
+the ElementTree, line by line, to a file or as chunks for an HTTP response.
+
+Vouchers can be supplied lazily: pass the envelope root, the element the
+vouchers belong in (container) and an iterable of voucher elements. Each
+voucher is serialized as soon as it is produced, so a batch of any size
+is written with bounded memory.
+"""
+
+import os
+import tempfile
+import functools
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+INDENT = '  '
+# Lines are grouped into chunks of about this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _minidom_escapes():
+    """
+    Which characters this Python's minidom escapes in text and attribute values.
+    Checked on first use, so importing this module does not load minidom.
+    """
+    import xml.dom.minidom as minidom
+    text = minidom.parseString('<a>"</a>').documentElement.toxml()
+    attr = minidom.parseString('<a b="&#10;"/>').documentElement.toxml()
+    return '&quot;' in text, '&#10;' in attr
+
+
+def _parsed(value):
+    # An XML parser turns \r\n and lone \r into \n
+    return value.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _escape_text(value):
+    value = _parsed(value).replace('&', '&amp;').replace('<', '&lt;')
+    if _minidom_escapes()[0]:
+        value = value.replace('"', '&quot;')
+    return value.replace('>', '&gt;')
+
+
+def _escape_attrib(value):
+    value = value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+    if _minidom_escapes()[1]:
+        value = value.replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#9;')
+    return value
+
+
+def _open_tag(elem):
+    attrs = ''.join(f' {name}="{_escape_attrib(value)}"' for name, value in elem.attrib.items())
+    return f'<{elem.tag}{attrs}'
+
+
+def _lines(elem, indent, container=None, extra_children=None):
+    """
+    Yield the pretty-printed lines of elem, as minidom's writexml would
+    write them. A yielded string may hold newlines from text content.
+    """
+    # Child nodes as minidom sees them: text, then each element and its tail
+    nodes = []
+    if elem.text:
+        nodes.append(elem.text)
+    for child in elem:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
+
+    extra = None
+    if elem is container and extra_children is not None:
+        # Peek so an element with only streamed children is still written open/close
+        extra = iter(extra_children)
+        first = next(extra, None)
+        if first is not None:
+            nodes.append(first)
+        else:
+            extra = None
+
+    if not nodes:
+        yield f'{indent}{_open_tag(elem)}/>'
+    elif len(nodes) == 1 and isinstance(nodes[0], str):
+        yield f'{indent}{_open_tag(elem)}>{_escape_text(nodes[0])}</{elem.tag}>'
+    else:
+        yield f'{indent}{_open_tag(elem)}>'
+        child_indent = indent + INDENT
+        for node in nodes:
+            if isinstance(node, str):
+                yield child_indent + _escape_text(node)
+            else:
+                yield from _lines(node, child_indent, container, extra_children)
+        if extra is not None:
+            for node in extra:
+                yield from _lines(node, child_indent)
+        yield f'{indent}</{elem.tag}>'
+
+
+def iter_pretty_xml(root, container=None, extra_children=None):
+    """
+    Yield the indented document in text chunks of about CHUNK_SIZE characters.
+    extra_children (e.g. a generator of vouchers) are written after the
+    existing children of container.
+    """
+    chunk = ['<?xml version="1.0" ?>']
+    size = len(chunk[0])
+    for line in _lines(root, '', container, extra_children):
+        # Same result as dropping blank lines from the whole document
+        for part in line.split('\n'):
+            if part.strip():
+                chunk.append('\n')
+                chunk.append(part)
+                size += len(part) + 1
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_pretty_xml(root, out, container=None, extra_children=None):
+    """Write the indented document to a text file object"""
+    for chunk in iter_pretty_xml(root, container, extra_children):
+        out.write(chunk)
+
+
+def import_envelope(company):
+    """
+    Empty Tally "Import Data" request for vouchers into company:
+    ENVELOPE/HEADER/TALLYREQUEST = Import Data,
+    BODY/IMPORTDATA/REQUESTDESC with REPORTNAME Vouchers and SVCURRENTCOMPANY,
+    BODY/IMPORTDATA/REQUESTDATA/TALLYMESSAGE holding the vouchers.
+    Returns (root, message); VOUCHER elements are appended to message.
+    """
+    root = ET.Element('ENVELOPE')
+    header = ET.SubElement(root, 'HEADER')
+    ET.SubElement(header, 'TALLYREQUEST').text = 'Import Data'
+
+    import_data = ET.SubElement(ET.SubElement(root, 'BODY'), 'IMPORTDATA')
+    desc = ET.SubElement(import_data, 'REQUESTDESC')
+    ET.SubElement(desc, 'REPORTNAME').text = 'Vouchers'
+    static = ET.SubElement(desc, 'STATICVARIABLES')
+    ET.SubElement(static, 'SVCURRENTCOMPANY').text = company
+
+    message = ET.SubElement(ET.SubElement(import_data, 'REQUESTDATA'), 'TALLYMESSAGE')
+    message.set('xmlns:UDF', 'TallyUDF')
+    return root, message
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    Text file for writing path: written under a temporary name in the same
+    folder and renamed over path on success, so readers in other threads or
+    worker processes never see a half-written file. Removed on error.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def pretty_xml(root):
+    """Indented XML text for an ElementTree root, without blank lines"""
+    return ''.join(iter_pretty_xml(root))
@@ -0,0 +1,143 @@
+"""
+tax_engine.py
+Columnar GST computation for invoice lines, in integer paise.
+
+A whole batch of line items (many vouchers) goes through as NumPy arrays.
+The batch covers quantity x rate, the CGST/SGST or IGST split by voucher,
+per-voucher totals and per-rate tax groups. The XML writer then only
+formats the precomputed amounts.
+
+Rounding is decimal-exact, like Tally's:
+- Inputs are converted from their decimal text. Rates and amounts go to
+  paise, quantities to thousandths and GST rates to basis points. No
+  binary floats are involved. Each distinct value is converted once; a
+  batch has few distinct rates and quantities.
+- Each step rounds half away from zero to the paisa.
+- The taxable value of a line is quantity x rate.
+- For intra-state sales, CGST and SGST are each computed on the taxable
+  value at half the GST rate. Otherwise IGST is computed at the full rate.
+- Totals are exact integer sums of the line amounts.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Products above this could overflow int64; such batches use Python ints instead
+_INT64_SAFE = 2 ** 61
+
+# Decimal digits of 0..99 paise as the invoices show them: 50 -> '5', 5 -> '05', 0 -> '0'
+_PAISE_TEXT = [f"{n:02d}".rstrip('0') or '0' for n in range(100)]
+
+
+def to_units(values, places):
+    """
+    Integer array of values scaled by 10**places, rounded half up from their
+    decimal text (2003.3 -> 200330 paise with places=2)
+    """
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    distinct, inverse = np.unique(values.reshape(-1), return_inverse=True)
+    scale = Decimal(1).scaleb(-places)
+    units = np.array([
+        int(Decimal(str(value)).quantize(scale, rounding=ROUND_HALF_UP).scaleb(places))
+        for value in distinct.tolist()
+    ], dtype=np.int64)
+    return units[inverse.reshape(-1)]
+
+
+def div_half_up(num, den):
+    """num / den rounded half away from zero, elementwise, for integer arrays"""
+    sign = np.where(num < 0, -1, 1)
+    return sign * ((2 * np.abs(num) + den) // (2 * den))
+
+
+def format_paise(paise):
+    """Amount text as the invoices show it: 400660 -> '4006.6', 0 -> '0.0'"""
+    paise = int(paise)
+    if paise < 0:
+        return '-' + format_paise(-paise)
+    rupees, rest = divmod(paise, 100)
+    return f"{rupees}.{_PAISE_TEXT[rest]}"
+
+
+class TaxBatch:
+    """
+    Amounts (int paise) for a batch of lines grouped into vouchers.
+    Line arrays: taxable, cgst, sgst, igst, tax, gross.
+    Voucher arrays: voucher_taxable, voucher_tax, voucher_gross.
+    groups(v) lists voucher v's (first line index, cgst, sgst, igst) per GST rate.
+    """
+
+    def __init__(self, voucher_ids, n_vouchers, taxable, cgst, sgst, igst, gst_bp):
+        self.taxable = taxable
+        self.cgst = cgst
+        self.sgst = sgst
+        self.igst = igst
+        self.tax = cgst + sgst + igst
+        self.gross = taxable + self.tax
+
+        self.voucher_taxable = np.zeros(n_vouchers, dtype=taxable.dtype)
+        self.voucher_tax = np.zeros(n_vouchers, dtype=taxable.dtype)
+        np.add.at(self.voucher_taxable, voucher_ids, taxable)
+        np.add.at(self.voucher_tax, voucher_ids, self.tax)
+        self.voucher_gross = self.voucher_taxable + self.voucher_tax
+
+        # One group per (voucher, GST rate), in order of first appearance
+        if len(voucher_ids):
+            _, rate_index = np.unique(gst_bp, return_inverse=True)
+            keys = voucher_ids * (int(rate_index.max()) + 1) + rate_index
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            sums = []
+            for amounts in (cgst, sgst, igst):
+                total = np.zeros(len(first), dtype=amounts.dtype)
+                np.add.at(total, inverse, amounts)
+                sums.append(total)
+            order = np.argsort(first, kind='stable')
+            self._group_first = first[order]
+            self._group_cgst, self._group_sgst, self._group_igst = (s[order] for s in sums)
+            group_vouchers = voucher_ids[self._group_first]
+            self._group_start = np.searchsorted(group_vouchers, np.arange(n_vouchers + 1))
+        else:
+            self._group_start = np.zeros(n_vouchers + 1, dtype=np.int64)
+
+    def groups(self, voucher):
+        start, end = self._group_start[voucher], self._group_start[voucher + 1]
+        return [
+            (int(self._group_first[i]), self._group_cgst[i], self._group_sgst[i], self._group_igst[i])
+            for i in range(start, end)
+        ]
+
+
+def compute_taxes(quantities, rates, gst_rates, intra_state, voucher_ids=None):
+    """
+    GST amounts for a batch of lines.
+    quantities, rates, gst_rates: per line (numbers or numeric strings).
+    intra_state: per line bool (CGST+SGST if true, else IGST).
+    voucher_ids: per line voucher number 0..n-1, non-decreasing (default: one voucher).
+    """
+    n = len(quantities)
+    qty_milli = to_units(quantities, 3)
+    rate_paise = to_units(rates, 2)
+    gst_bp = to_units(gst_rates, 2)
+    intra = np.asarray(intra_state, dtype=bool).reshape(n)
+    if voucher_ids is None:
+        voucher_ids = np.zeros(n, dtype=np.int64)
+    voucher_ids = np.asarray(voucher_ids, dtype=np.int64).reshape(n)
+    n_vouchers = int(voucher_ids.max()) + 1 if n else 0
+
+    if n and int(np.abs(qty_milli).max()) * int(np.abs(rate_paise).max()) >= _INT64_SAFE:
+        qty_milli = qty_milli.astype(object)
+        rate_paise = rate_paise.astype(object)
+        gst_bp = gst_bp.astype(object)
+
+    taxable = div_half_up(qty_milli * rate_paise, 1000)
+    half = div_half_up(taxable * gst_bp, 20000)
+    full = div_half_up(taxable * gst_bp, 10000)
+    zero = taxable * 0
+    cgst = np.where(intra, half, zero)
+    sgst = cgst.copy()
+    igst = np.where(intra, zero, full)
+
+    return TaxBatch(voucher_ids, n_vouchers, taxable, cgst, sgst, igst, gst_bp)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep test runs out of the app's cache and ledger
+os.environ.setdefault('DR_CACHE_DISABLED', '1')
+os.environ.setdefault('LEDGER_DISABLED', '1')
@@ -0,0 +1,37 @@
+import pytest
+
+import app as web
+
+ITEMS = [
+    {'Order No': f'O{i}', 'Part No': f'P{i}', 'Part Name': f'Part {i}', 'Box Type': 'BOX',
+     'Quantity': str(i + 1), 'Unit Size': '10'}
+    for i in range(3000)
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    client = web.app.test_client()
+    dr_details = {'DR No': '1001', 'Branch': 'Madurai', 'Items': ITEMS}
+    with client.session_transaction() as session:
+        session['dr_details'] = dr_details
+        session['prompt_data'] = web.build_prompt_data(dr_details)
+    return client
+
+
+def test_closing_a_partly_sent_download_removes_the_workbook(client, tmp_path):
+    response = client.post('/generate-excel', buffered=False)
+    assert response.status_code == 200
+    assert len(list(tmp_path.iterdir())) == 1
+    body = iter(response.response)
+    next(body)
+    next(body)  # more chunks are still to come
+    response.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_closing_an_unstarted_download_removes_the_workbook(client, tmp_path):
+    response = client.post('/generate-excel', buffered=False)
+    response.close()
+    assert list(tmp_path.iterdir()) == []
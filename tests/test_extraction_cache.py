@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import extraction_cache
+import dr_pdf_to_excel
+from extraction_cache import cached, is_empty
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(REPO_DIR, 'DeliveryRequest_2.pdf')
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.delenv('DR_CACHE_DISABLED', raising=False)
+    monkeypatch.setenv('DR_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(extraction_cache, '_cache', None)
+    yield extraction_cache.get_cache()
+
+
+def test_is_empty():
+    assert is_empty(None)
+    assert is_empty(({}, []))
+    assert is_empty({'DR No': '', 'Items': []})
+    assert not is_empty(({'DR No': '1'}, []))
+    assert not is_empty({'DR No': '1', 'Items': []})
+
+
+def test_results_are_cached(cache):
+    calls = []
+
+    @cached('test.extract', key_func=lambda source: source)
+    def extract(source):
+        calls.append(source)
+        return {'DR No': '1'}, [{'Qty': '2'}]
+
+    assert extract('doc') == extract('doc') == ({'DR No': '1'}, [{'Qty': '2'}])
+    assert calls == ['doc']
+
+
+def cache_entries(cache):
+    with cache._connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def test_failed_extraction_is_not_cached(cache, monkeypatch):
+    def broken(source):
+        raise MemoryError("page pool crashed")
+
+    open_document = dr_pdf_to_excel.open_document
+    monkeypatch.setattr(dr_pdf_to_excel, 'open_document', broken)
+    assert dr_pdf_to_excel.try_tables(SAMPLE_PDF) == ({}, [])
+    assert cache_entries(cache) == 0
+
+    monkeypatch.setattr(dr_pdf_to_excel, 'open_document', open_document)
+    header, rows = dr_pdf_to_excel.try_tables(SAMPLE_PDF)
+    assert header.get('DR No') and rows
+    assert cache_entries(cache) == 1
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import item_master
+from item_master import ItemMaster
+
+
+def write_master(path, rate):
+    path.write_text(f"Part No,Item Name,GST %,Rate\nP1,Piston,18,{rate}\n")
+
+
+def test_failed_import_is_retried(tmp_path, monkeypatch):
+    source = tmp_path / 'items.csv'
+    write_master(source, '10.00')
+    read_items = item_master.read_items
+
+    def broken(path):
+        raise OSError('file is locked')
+
+    monkeypatch.setattr(item_master, 'read_items', broken)
+    master = ItemMaster(str(source), str(tmp_path / 'item_master.db'), check_interval=0)
+    assert master.get('P1') is None
+
+    monkeypatch.setattr(item_master, 'read_items', read_items)
+    assert master.get('P1')['rate'] == 10.0
+
+
+def test_reload_does_not_replace_an_open_database(tmp_path, monkeypatch):
+    source = tmp_path / 'items.csv'
+    write_master(source, '10.00')
+    master = ItemMaster(str(source), str(tmp_path / 'item_master.db'), check_interval=0)
+
+    # Another thread holds a reader on the current version
+    reader = threading.Thread(target=master.get, args=('P2',))
+    reader.start()
+    reader.join()
+    first = master._db_file
+
+    replaced = []
+    monkeypatch.setattr(item_master.os, 'replace',
+                        lambda src, dst: (replaced.append(dst), os.rename(src, dst)))
+    write_master(source, '12.50')
+    os.utime(source, ns=(1, 1))
+    assert master.get('P1') == {'name': 'Piston', 'hsn': '', 'gst': 18, 'rate': 12.5}
+    assert replaced == [master._db_file] and first not in replaced
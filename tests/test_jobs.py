@@ -0,0 +1,53 @@
+import pytest
+
+import app as web
+
+DETAILS = {'DR No': '1001', 'Branch': 'Madurai', 'Items': []}
+
+
+def start_session(client):
+    with client.session_transaction() as session:
+        session['pdf_filename'] = 'dr.pdf'
+        return session.sid
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    calls = []
+    backend = web.app.session_interface.backend
+    save = backend.save
+    monkeypatch.setattr(backend, 'save', lambda sid, *args: (calls.append(sid), save(sid, *args)))
+    return calls
+
+
+def finished_job(owner):
+    job = web.jobs.submit('test', lambda job: DETAILS, owner=owner)
+    while not job.done:
+        job.wait_for_change(job.version, timeout=1)
+    return job
+
+
+def test_session_is_written_once_when_the_job_completes(saves):
+    client = web.app.test_client()
+    sid = start_session(client)
+    job = finished_job(sid)
+    del saves[:]
+
+    for _ in range(3):
+        response = client.get(f'/jobs/{job.id}')
+        assert response.get_json()['result'] == DETAILS
+    assert saves == [sid]
+    with client.session_transaction() as session:
+        assert session['dr_details'] == DETAILS
+
+
+def test_jobs_are_private_to_their_session():
+    owner = web.app.test_client()
+    job = finished_job(start_session(owner))
+
+    other = web.app.test_client()
+    start_session(other)
+    assert other.get(f'/jobs/{job.id}').status_code == 404
+    assert other.get(f'/jobs/{job.id}/events').status_code == 404
+    assert other.get(f'/generate-prompt?job_id={job.id}').status_code == 400
+    assert owner.get(f'/jobs/{job.id}').status_code == 200
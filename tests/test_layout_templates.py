@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+pdfplumber = pytest.importorskip('pdfplumber')
+
+import layout_templates
+from synthetic_dr import generate
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    monkeypatch.setenv('DR_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(layout_templates, '_templates', None)
+
+
+def test_every_page_reads_from_its_template(templates, tmp_path):
+    path = str(tmp_path / 'dr.pdf')
+    generate(path, pages=4, items=50, seed=5)  # the last page has fewer rows
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            layout_templates.first_table(page)
+
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            fingerprint = layout_templates.page_fingerprint(page)
+            assert fingerprint
+            assert layout_templates._read_with_template(page, fingerprint) == page.extract_tables()[0]
+
+
+def test_fingerprint_labels_match_extract_words(tmp_path):
+    path = str(tmp_path / 'dr.pdf')
+    generate(path, pages=1, items=5, seed=2)
+    with pdfplumber.open(path) as pdf:
+        page = pdf.pages[0]
+        words = sorted((w['text'], round(w['x0']), round(w['top'])) for w in page.extract_words())
+        assert sorted((text, round(x0), round(top)) for text, x0, top in layout_templates._words(page.chars)) == words
@@ -0,0 +1,37 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import ledger
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.delenv('LEDGER_DISABLED', raising=False)
+    monkeypatch.setenv('LEDGER_DB', str(tmp_path / 'ledger.db'))
+    monkeypatch.setattr(ledger, '_ledger', None)
+    yield ledger.get_ledger()
+
+
+def make_voucher(day, amount='100.00'):
+    voucher = ET.Element('VOUCHER', VCHTYPE='Sales')
+    ET.SubElement(voucher, 'DATE').text = day
+    ET.SubElement(voucher, 'VOUCHERNUMBER').text = 'INV_1'
+    ET.SubElement(voucher, 'REFERENCENUMBER').text = 'DR_1'
+    ET.SubElement(ET.SubElement(voucher, 'TOTALS'), 'TOTALAMOUNT').text = amount
+    return voucher
+
+
+def test_limit_is_at_least_one(db):
+    db.append_vouchers([make_voucher('01-10-2026'), make_voucher('01-10-2026', '200.00')], 'test')
+    assert len(ledger.query('vouchers', {'limit': '-1'})) == 1
+    assert len(ledger.query('vouchers', {'limit': '0'})) == 1
+    assert len(ledger.query('vouchers', {})) == 2
+    with pytest.raises(ValueError):
+        ledger.query('vouchers', {'limit': 'x'})
+
+
+def test_same_voucher_on_another_day_is_not_new(db):
+    assert db.append_vouchers([make_voucher('01-10-2026')], 'test') == 1
+    assert db.append_vouchers([make_voucher('02-10-2026')], 'test') == 0
+    assert db.append_vouchers([make_voucher('02-10-2026', '200.00')], 'test') == 1
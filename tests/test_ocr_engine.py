@@ -0,0 +1,85 @@
+import os
+import sys
+import types
+import threading
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+np = pytest.importorskip('numpy')
+ocr_engine = pytest.importorskip('ocr_engine')
+
+from synthetic_dr import generate, make_scanned
+from dr_pdf_to_excel import PDFDocument, ocr_pages
+
+
+def tesseract_available():
+    try:
+        import tesserocr  # noqa: F401
+        return True
+    except ImportError:
+        pass
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+@pytest.fixture(scope='module')
+def scanned_dr(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('ocr')
+    pdf_path = str(workdir / 'dr.pdf')
+    scanned_path = str(workdir / 'dr_scanned.pdf')
+    header, items = generate(pdf_path, pages=4, items=20, seed=3)
+    make_scanned(pdf_path, scanned_path, seed=3)
+    return scanned_path, header, items
+
+
+def test_renders_from_many_threads_match_serial(scanned_dr):
+    path = scanned_dr[0]
+    pdf = ocr_engine.open_pdfium(path)
+    try:
+        pages = list(range(len(pdf))) * 3
+        serial = [ocr_engine.render_binary(pdf, i, 100) for i in pages]
+        threaded = [None] * len(pages)
+
+        def render(slot):
+            threaded[slot] = ocr_engine.render_binary(pdf, pages[slot], 100)
+
+        threads = [threading.Thread(target=render, args=(slot,)) for slot in range(len(pages))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        ocr_engine.close_pdfium(pdf)
+
+    assert all(np.array_equal(a, b) for a, b in zip(serial, threaded))
+
+
+def test_pytesseract_blanks_only_the_rows_outside_regions(monkeypatch):
+    seen = []
+    monkeypatch.setitem(sys.modules, 'pytesseract', types.SimpleNamespace(
+        image_to_string=lambda image, lang=None: seen.append(image.copy()) or 'text'))
+    binary = np.zeros((700, 50), dtype=np.uint8)
+    regions = [(0, 0, 50, 500), (0, 100, 50, 50), (0, 200, 50, 100), (10, 600, 30, 50)]
+
+    assert ocr_engine.PytesseractEngine().read(binary, regions) == 'text'
+    image = seen[0]
+    assert image.shape == (650, 50)
+    assert (image[:500] == 0).all()  # rows 150-200 lie inside the tall region
+    assert (image[500:600] == 255).all()
+    assert (image[600:] == 0).all()
+
+
+@pytest.mark.skipif(not tesseract_available(), reason="tesseract is not installed")
+def test_ocr_reads_the_dr_number_and_parts(scanned_dr):
+    path, header, items = scanned_dr
+    with PDFDocument(path) as doc:
+        text = "\n".join(ocr_pages(doc, list(range(len(doc.pages)))).values())
+    assert header['DR No'] in text
+    assert sum(item['Part No'] in text for item in items) >= len(items) * 0.8
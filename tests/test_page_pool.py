@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+import dr_pdf_to_excel
+from dr_pdf_to_excel import page_pool
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    dr_pdf_to_excel.shutdown_page_pool()
+    yield
+    dr_pdf_to_excel.shutdown_page_pool()
+
+
+def test_concurrent_first_calls_share_one_pool():
+    pools = []
+    start = threading.Barrier(8)
+
+    def use():
+        start.wait()
+        with page_pool(2) as pool:
+            pools.append(pool)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(map(id, pools))) == 1
+
+
+def test_resize_keeps_a_pool_in_use_until_released():
+    with page_pool(2) as old:
+        with page_pool(3) as new:
+            assert new is not old
+            assert not old._shutdown_thread
+        assert old.submit(abs, -1).result(timeout=60) == 1
+    assert old._shutdown_thread
+    assert not new._shutdown_thread
+
+
+def test_workers_are_not_forked_from_this_process():
+    with page_pool(2) as pool:
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
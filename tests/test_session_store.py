@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from flask import Flask, session
+
+from session_store import ServerSideSessionInterface, MemorySessionBackend, SQLiteSessionBackend
+
+TTL = 100
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteSessionBackend(str(tmp_path / 'sessions.db'))
+    return MemorySessionBackend()
+
+
+def make_app(backend):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSideSessionInterface(backend, ttl=TTL)
+
+    @app.route('/set')
+    def set_value():
+        session['value'] = 'x'
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    return app
+
+
+def only_expiry(backend):
+    if isinstance(backend, MemorySessionBackend):
+        return next(iter(backend._data.values()))[1]
+    with backend._connect() as conn:
+        return conn.execute("SELECT expires FROM sessions").fetchone()[0]
+
+
+def test_reads_extend_expiry_after_a_tenth_of_the_ttl(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    client = make_app(backend).test_client()
+
+    client.get('/set')
+    assert only_expiry(backend) == 1000 + TTL
+
+    # Reads within ttl/10 of the last save do not rewrite the session
+    now[0] += TTL / 20
+    assert client.get('/get').data == b'x'
+    assert only_expiry(backend) == 1000 + TTL
+
+    # Read repeatedly past ttl/10: the expiry slides forward each time
+    for _ in range(3):
+        now[0] += TTL / 5
+        assert client.get('/get').data == b'x'
+        assert only_expiry(backend) == now[0] + TTL
+
+    # Past the first save's expiry, the session is still alive
+    now[0] += TTL * 0.9
+    assert now[0] > 1000 + TTL
+    assert client.get('/get').data == b'x'
@@ -0,0 +1,67 @@
+import pytest
+
+import app as web
+import tally_client
+from tally_stub import start_stub
+from tally_xml import pretty_xml
+from tally_invoice import TallyInvoiceGenerator
+
+RECORDS = [
+    {'dr_data': {'DR No': '1001', 'Branch': 'Madurai', 'Items': [{'Part No': 'P1', 'Quantity': '2'}]}},
+    {'dr_data': {'DR No': '1002', 'Branch': 'Madurai', 'Items': [{'Part No': 'P2', 'Quantity': '3'}]}},
+]
+
+
+@pytest.fixture
+def stub():
+    server = start_stub()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_envelope_is_a_voucher_import(stub):
+    root, results = TallyInvoiceGenerator.generate_batch_xml(RECORDS)
+    assert [r['status'] for r in results] == ['ok', 'ok']
+    assert root.findtext('HEADER/TALLYREQUEST') == 'Import Data'
+    assert root.findtext('BODY/IMPORTDATA/REQUESTDESC/REPORTNAME') == 'Vouchers'
+
+    with tally_client.TallyClient(stub.url) as client:
+        report = client.upload_xml(pretty_xml(root))
+    assert report['success']
+    assert report['created'] == 2
+
+
+def test_stub_rejects_export_requests(stub):
+    xml = ("<ENVELOPE><HEADER><TALLYREQUEST>Export</TALLYREQUEST></HEADER>"
+           "<BODY><TALLYLIST><VOUCHER><VOUCHERNUMBER>INV-1</VOUCHERNUMBER></VOUCHER></TALLYLIST></BODY></ENVELOPE>")
+    with tally_client.TallyClient(stub.url, max_retries=0) as client:
+        report = client.upload_xml(xml)
+    assert not report['success']
+    assert report['created'] == 0
+    assert stub.vouchers == set()
+
+
+def test_failed_batch_reports_the_attempts_made(monkeypatch):
+    posts = []
+
+    def reject(self, body):
+        posts.append(body)
+        return 400, 'Bad request'
+
+    monkeypatch.setattr(tally_client.TallyClient, '_post_once', reject)
+    root, _ = TallyInvoiceGenerator.generate_batch_xml(RECORDS[:1])
+    with tally_client.TallyClient('http://127.0.0.1:9', max_retries=3, backoff=0) as client:
+        report = client.upload_xml(pretty_xml(root))
+    assert report['failed_batches'] == 1
+    assert report['results'][0]['attempts'] == len(posts) == 1
+
+
+def test_upload_route_rejects_an_envelope_without_vouchers():
+    root, _ = web.create_envelope()
+    client = web.app.test_client()
+    with client.session_transaction() as session:
+        session['xml_data'] = pretty_xml(root)
+    response = client.post('/upload-to-tally')
+    assert response.status_code == 400
+    assert 'no vouchers' in response.get_json()['error']
@@ -0,0 +1,26 @@
+from tax_engine import compute_taxes, format_paise, to_units
+from tally_invoice import TallyInvoiceGenerator
+
+
+def test_format_paise():
+    assert format_paise(400660) == '4006.6'
+    assert format_paise(400605) == '4006.05'
+    assert format_paise(0) == '0.0'
+    assert format_paise(-5) == '-0.05'
+    assert format_paise(10 ** 20 + 1) == '1000000000000000000.01'
+
+
+def test_intra_state_follows_determine_tax_type():
+    assert TallyInvoiceGenerator.intra_state(['Madurai', 'Hosur', '']) == [True, False, False]
+
+
+def test_tax_split_by_branch():
+    amounts = compute_taxes(['2', '2'], ['100.00', '100.00'], [18, 18], [True, False], [0, 1])
+    assert [format_paise(a) for a in amounts.cgst] == ['18.0', '0.0']
+    assert [format_paise(a) for a in amounts.igst] == ['0.0', '36.0']
+    assert [format_paise(a) for a in amounts.voucher_gross] == ['236.0', '236.0']
+
+
+def test_to_units_rounds_each_distinct_value_half_up():
+    assert to_units(['2003.30', 2003.3, 0.125, '1.005', 2003.3], 2).tolist() == [200330, 200330, 13, 101, 200330]
+    assert to_units([], 3).tolist() == []
@@ -0,0 +1,30 @@
+import io
+import hashlib
+
+from upload_buffer import UploadBuffer
+
+DATA = bytes(range(256)) * 52
+
+
+def spilled_buffer():
+    buf = UploadBuffer.from_stream(io.BytesIO(DATA), max_memory=1000)
+    assert not buf.in_memory
+    return buf
+
+
+def test_seek_before_first_read_on_disk():
+    with spilled_buffer() as buf:
+        assert buf.seek(0, 2) == len(DATA)
+        assert buf.tell() == len(DATA)
+        buf.seek(100)
+        assert buf.read(10) == DATA[100:110]
+        assert buf.tell() == 110
+
+
+def test_seek_then_read_in_memory():
+    with UploadBuffer.from_stream(io.BytesIO(DATA)) as buf:
+        assert buf.in_memory
+        buf.seek(100)
+        assert buf.read(10) == DATA[100:110]
+        assert buf.getvalue() == DATA
+        assert buf.sha256 == hashlib.sha256(DATA).hexdigest()
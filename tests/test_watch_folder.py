@@ -0,0 +1,37 @@
+import os
+import sys
+import subprocess
+
+import dr_pdf_to_excel
+from watch_folder import process_pdf, DONE_STATUSES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(REPO_DIR, 'DeliveryRequest_2.pdf')
+
+
+def test_process_pdf_writes_invoice_xml(tmp_path):
+    entry = process_pdf(SAMPLE_PDF, str(tmp_path))
+    assert entry['status'] == 'ok'
+    assert entry['xml'] == str(tmp_path / f"INV_{entry['dr_no']}.xml")
+    assert os.listdir(tmp_path) == [os.path.basename(entry['xml'])]
+
+
+def test_extraction_error_is_retried_not_no_dr(tmp_path, monkeypatch):
+    def broken(source):
+        raise MemoryError("page pool crashed")
+
+    monkeypatch.setattr(dr_pdf_to_excel, 'open_document', broken)
+    entry = process_pdf(SAMPLE_PDF, str(tmp_path))
+    assert entry['status'] == 'error'
+    assert 'page pool crashed' in entry['error']
+    assert entry['status'] not in DONE_STATUSES
+    assert os.listdir(tmp_path) == []
+
+
+def test_import_creates_no_flask_app_or_folders(tmp_path):
+    code = ("import sys, watch_folder; "
+            "assert 'flask' not in sys.modules and 'tally_invoice_app' not in sys.modules")
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, check=True)
+    assert not (tmp_path / 'uploads').exists()
+    assert not (tmp_path / 'output_xml').exists()
@@ -0,0 +1,188 @@
+"""
+upload_buffer.py
+In-memory, collision-free handling of uploaded PDFs for both Flask apps.
+
+Uploads are written by Werkzeug's multipart parser straight into an
+UploadBuffer: a spooled temporary file that hashes the bytes as they arrive.
+Small uploads never touch the disk. Large ones roll over to an anonymous
+temporary file that is memory-mapped for reading. pdfplumber reads the
+buffer directly, so there is no save/re-open/delete round-trip, and the
+extraction cache gets the SHA-256 without reading the file again.
+
+When a real path is required (parallel OCR workers), as_path() writes the
+bytes once to a uniquely named file that is removed on close().
+
+Parsing the request body is timed as the file_save stage, and upload
+sizes are counted, in metrics.py.
+"""
+
+import io
+import os
+import mmap
+import time
+import hashlib
+import tempfile
+
+from flask import Request
+
+import metrics
+
+# Uploads up to this size stay in memory
+MAX_MEMORY_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadBuffer:
+    """Writable, then readable, file-like upload buffer with a running SHA-256"""
+
+    def __init__(self, spool_dir=None, max_memory=MAX_MEMORY_SIZE, name=None):
+        self.spool_dir = spool_dir
+        self.name = name
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory, dir=spool_dir)
+        self._mmap = None
+        self._path = None
+
+    @classmethod
+    def from_stream(cls, stream, spool_dir=None, max_memory=MAX_MEMORY_SIZE, name=None):
+        """Copy any readable stream into a new buffer"""
+        buf = cls(spool_dir, max_memory, name)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            buf.write(chunk)
+        buf.seek(0)
+        return buf
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def in_memory(self):
+        return not self._file._rolled
+
+    # -- writing (upload stream) --
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    # -- reading (pdfplumber / pdfminer / pypdfium2) --
+
+    def _reader(self):
+        if self._mmap is None and self._file._rolled and self.size:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # Carry over a position set on the file before the first read
+            self._mmap.seek(self._file.tell())
+        return self._mmap if self._mmap is not None else self._file
+
+    def read(self, size=-1):
+        return self._reader().read(size)
+
+    def readinto(self, b):
+        data = self._reader().read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        return self._reader().readline(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        reader = self._reader()
+        reader.seek(offset, whence)
+        return reader.tell()
+
+    def tell(self):
+        return self._reader().tell()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return self._mmap is None
+
+    def getvalue(self):
+        """Whole upload as bytes"""
+        pos = self.tell()
+        self.seek(0)
+        data = self.read()
+        self.seek(pos)
+        return data
+
+    def as_path(self):
+        """Uniquely named file with the upload's bytes, for code that needs a path"""
+        if self._path is None:
+            fd, path = tempfile.mkstemp(prefix=f"{self.sha256[:12]}_", suffix='.pdf', dir=self.spool_dir)
+            pos = self.tell()
+            self.seek(0)
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: self.read(CHUNK_SIZE), b''):
+                    f.write(chunk)
+            self.seek(pos)
+            self._path = path
+        return self._path
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UploadRequest(Request):
+    """Flask request whose file uploads stream into UploadBuffers"""
+
+    spool_dir = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(spool_dir=self.spool_dir, name=filename)
+
+    def _load_form_data(self):
+        """Parse the body; time it as the file_save stage and count upload bytes"""
+        start = time.perf_counter()
+        super()._load_form_data()
+        uploads = [f.stream for f in self.files.values() if isinstance(f.stream, UploadBuffer)]
+        if uploads:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage='file_save')
+            for upload in uploads:
+                metrics.record_upload(upload.size)
+
+
+def upload_buffer(file_storage, spool_dir=None):
+    """UploadBuffer for a Werkzeug FileStorage, reusing its stream when it already is one"""
+    stream = file_storage.stream
+    if isinstance(stream, UploadBuffer):
+        stream.seek(0)
+        return stream
+    return UploadBuffer.from_stream(stream, spool_dir=spool_dir, name=file_storage.filename)
+
+
+def take_upload(file_storage, spool_dir=None):
+    """
+    Like upload_buffer(), but the caller owns the buffer: Werkzeug will not
+    close it at the end of the request, so a background job can keep reading it.
+    """
+    buf = upload_buffer(file_storage, spool_dir)
+    file_storage.stream = io.BytesIO()
+    return buf
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+watch_folder.py
+Watch a shared folder for DR PDFs and turn each one into Tally XML.
+
+New PDFs are noticed through inotify on Linux, and by polling elsewhere
+(or with --poll). The folder is also rescanned every RESCAN_SECONDS, since
+inotify does not see files written from other machines to a network share.
+A PDF is read only once it is complete: its size and modification time
+have not changed for --settle seconds, and it ends with %%EOF, which a
+half-copied PDF does not.
+
+Complete files go through the desktop app's pipeline (tally_invoice.py:
+PDFExtractor, then TallyInvoiceGenerator) on --workers processes, each reading its file's
+pages itself (no page pool per worker). The XML is written to
+output_xml/INV_<DR No>.xml through a temporary file and a rename, and the
+DR and voucher are recorded in the ledger.
+
+Each file's outcome is appended to a checkpoint journal keyed by content
+hash, so a restart skips everything already done. A file that was still
+being processed when the watcher stopped has no entry and is processed
+again. Failed files are retried after a restart, or when they change.
+
+Usage:
+  python watch_folder.py incoming [--workers 2] [--output output_xml] [--journal data/watch_journal.jsonl]
+  python watch_folder.py incoming --once      # process what is there now, then exit
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import argparse
+import threading
+import ctypes
+import ctypes.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+import ledger
+from extraction_cache import file_sha256
+from tally_xml import write_pretty_xml, atomic_output
+from tally_invoice import PDFExtractor, TallyInvoiceGenerator, OUTPUT_FOLDER
+
+DEFAULT_JOURNAL = os.path.join('data', 'watch_journal.jsonl')
+RESCAN_SECONDS = 30
+# A PDF that never gets its %%EOF is processed anyway after settle x this factor
+EOF_WAIT_FACTOR = 10
+# Outcomes that are not retried after a restart
+DONE_STATUSES = ('ok', 'no dr')
+
+
+# =====================================================
+# PROCESSING (worker processes)
+# =====================================================
+
+def process_pdf(path, output_dir=OUTPUT_FOLDER):
+    """
+    Extract one DR PDF and write its invoice XML to output_dir.
+    Returns the journal entry: file, status ('ok', 'no dr', 'error'), dr_no, xml, items, seconds, error.
+    """
+    start = time.perf_counter()
+    entry = {'file': path, 'status': 'error', 'dr_no': '', 'xml': '', 'items': 0, 'error': ''}
+    try:
+        # Errors raise, so they are journaled as 'error' and retried rather than
+        # recorded as 'no dr'; pages are read in this process, since --workers
+        # already runs one process per file
+        details = PDFExtractor.extract_dr_details(path, workers=1, raise_errors=True)
+        dr_no = details.get('DR No')
+        if not dr_no:
+            entry['status'] = 'no dr'
+        else:
+            root = TallyInvoiceGenerator.generate_xml(details, {})
+            xml_path = os.path.join(output_dir, f"INV_{secure_filename(dr_no)}.xml")
+            with atomic_output(xml_path) as f:
+                write_pretty_xml(root, f)
+            items = details.get('Items') or [details]
+            ledger.record_dr(details, items, 'watch_folder', os.path.basename(path))
+            ledger.record_vouchers(root.iter('VOUCHER'), 'watch_folder')
+            entry.update(status='ok', dr_no=dr_no, xml=xml_path, items=len(items))
+    except Exception as e:
+        entry['error'] = str(e)
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+# =====================================================
+# CHECKPOINT JOURNAL
+# =====================================================
+
+class Journal:
+    """Append-only JSON-lines record of processed files, keyed by content hash"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    self.entries[entry['sha256']] = entry
+
+    def done(self, sha256):
+        entry = self.entries.get(sha256)
+        return entry is not None and entry['status'] in DONE_STATUSES
+
+    def append(self, entry):
+        """Record an outcome; flushed and synced so it survives a crash right after"""
+        entry = dict(entry, recorded_at=time.time())
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[entry['sha256']] = entry
+
+
+# =====================================================
+# CHANGE NOTIFICATION
+# =====================================================
+
+class PollingWatcher:
+    """Fallback: no notifications, the folder is rescanned every interval"""
+
+    name = 'polling'
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def wait(self, timeout):
+        """Block up to timeout; returns changed paths, or None when the folder must be rescanned"""
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify on one directory, through libc (no extra dependency)"""
+
+    name = 'inotify'
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, folder):
+        self.folder = folder
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Block up to timeout; returns changed paths, or None when the folder must be rescanned"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            _, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if name:
+                changed.add(os.path.join(self.folder, name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(folder, poll=False):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folder)
+        except OSError as e:
+            print(f"inotify unavailable, polling instead: {e}")
+    return PollingWatcher(folder)
+
+
+# =====================================================
+# WATCH LOOP
+# =====================================================
+
+def is_pdf(path):
+    return path.lower().endswith('.pdf') and os.path.isfile(path)
+
+
+def ends_with_eof(path):
+    """True if the last KB of the file holds the %%EOF marker every complete PDF ends with"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 1024, 0))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    """Finds complete, unprocessed PDFs in a folder and feeds them to a process pool"""
+
+    def __init__(self, folder, output_dir=OUTPUT_FOLDER, journal_path=DEFAULT_JOURNAL,
+                 workers=2, settle=2.0, poll_interval=1.0, poll=False):
+        self.folder = os.path.abspath(folder)
+        self.output_dir = output_dir
+        self.journal = Journal(journal_path)
+        self.workers = workers
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.watcher = make_watcher(self.folder, poll)
+        # path -> (size, mtime, stable since) for files still being written or waiting
+        self.candidates = {}
+        # path -> (size, mtime) already handled in this run
+        self.seen = {}
+        self.ready = deque()
+        self.in_flight = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def scan(self, paths=None):
+        """Add new or changed PDFs (all in the folder when paths is None) as candidates"""
+        if paths is None:
+            try:
+                paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder)]
+            except OSError as e:
+                print(f"Watch folder scan error: {e}")
+                return
+        for path in paths:
+            if not is_pdf(path) or path in self.candidates:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self.seen.get(path) != (st.st_size, st.st_mtime):
+                self.candidates[path] = (st.st_size, st.st_mtime, time.monotonic())
+
+    def check_candidates(self):
+        """Move candidates that have settled (and are not in the journal) to the ready queue"""
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self.candidates.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.candidates[path]  # moved away or deleted
+                continue
+            if (st.st_size, st.st_mtime) != (size, mtime):
+                self.candidates[path] = (st.st_size, st.st_mtime, now)
+                continue
+            waited = now - since
+            if waited < self.settle or not st.st_size:
+                continue
+            if not ends_with_eof(path) and waited < self.settle * EOF_WAIT_FACTOR:
+                continue
+
+            del self.candidates[path]
+            self.seen[path] = (size, mtime)
+            try:
+                sha256 = file_sha256(path)
+            except OSError as e:
+                print(f"{os.path.basename(path)}: read error: {e}")
+                continue
+            if self.journal.done(sha256):
+                done_file = self.journal.entries[sha256]['file']
+                if done_file != path:
+                    print(f"{os.path.basename(path)}: skipped, same content as {os.path.basename(done_file)}")
+                continue
+            self.ready.append((path, sha256))
+
+    def collect(self):
+        """Record finished files in the journal"""
+        for future, (path, sha256) in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {'file': path, 'status': 'error', 'error': str(e)}
+            entry['sha256'] = sha256
+            self.journal.append(entry)
+            detail = entry.get('xml') or entry.get('error') or ''
+            print(f"{os.path.basename(path)}: {entry['status']} {detail}".rstrip())
+
+    def dispatch(self, pool):
+        """Keep at most `workers` files in flight"""
+        while self.ready and len(self.in_flight) < self.workers:
+            path, sha256 = self.ready.popleft()
+            self.in_flight[pool.submit(process_pdf, path, self.output_dir)] = (path, sha256)
+
+    @property
+    def idle(self):
+        return not (self.candidates or self.ready or self.in_flight)
+
+    def run(self, once=False):
+        """Watch until interrupted (or, with once, until the files present now are done)"""
+        print(f"Watching {self.folder} ({self.watcher.name}, {self.workers} worker(s)); "
+              f"XML to {self.output_dir}, journal {self.journal.path}")
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            self.scan()
+            last_scan = time.monotonic()
+            while True:
+                self.check_candidates()
+                self.collect()
+                self.dispatch(pool)
+                if once and self.idle:
+                    break
+                changed = self.watcher.wait(self.poll_interval)
+                if once:
+                    continue
+                if changed is None or time.monotonic() - last_scan >= RESCAN_SECONDS:
+                    self.scan()
+                    last_scan = time.monotonic()
+                elif changed:
+                    self.scan(changed)
+        except KeyboardInterrupt:
+            print("Stopping; waiting for files in progress...")
+        finally:
+            pool.shutdown(wait=True)
+            self.collect()
+            self.watcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn DR PDFs dropped into a folder into Tally XML")
+    parser.add_argument("folder", help="folder the DR PDFs are dropped into")
+    parser.add_argument("--output", default=OUTPUT_FOLDER, help=f"XML output folder (default: {OUTPUT_FOLDER})")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL,
+                        help=f"checkpoint journal (default: {DEFAULT_JOURNAL})")
+    parser.add_argument("--workers", type=int, default=2, help="files processed concurrently (default: 2)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a file must stay unchanged before it is read (default: 2)")
+    parser.add_argument("--interval", type=float, default=1.0, help="check interval in seconds (default: 1)")
+    parser.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    parser.add_argument("--once", action="store_true", help="process the PDFs present now, then exit")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        parser.error(f"not a folder: {args.folder}")
+    FolderWatcher(args.folder, args.output, args.journal, args.workers,
+                  args.settle, args.interval, args.poll).run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()